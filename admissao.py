@@ -0,0 +1,219 @@
+"""Controle de admissão das rotas de escrita e de autenticação.
+
+Num pico, cada envio de pegada, quiz, feedback, login ou cadastro era aceito
+e ficava esperando o lock de escrita do SQLite ou o pool de senhas; com as
+threads do gunicorn presas nelas, até o /health deixava de responder. Aqui
+cada rota coberta tem uma `Regra`:
+
+- `em_andamento`: máximo de requisições da rota ao mesmo tempo no nó (somando
+  todos os workers); acima disso a resposta é 503 na hora;
+- `taxa` e `rajada`: balde de fichas por cliente, que ganha `taxa` fichas por
+  segundo até `rajada`; cada requisição gasta uma e, sem ficha, a resposta é
+  429 com o tempo até a próxima.
+
+Além disso cada processo admite no máximo `limite_processo` requisições das
+rotas cobertas ao mesmo tempo, para que sobrem threads do gunicorn para o
+/health e as rotas baratas, que não passam por aqui.
+
+O estado fica em um SQLite que todos os workers do nó enxergam, como o cache
+de respostas. As vagas ocupadas são contadas por pid, e as de processos que
+morreram sem liberá-las são descartadas de tempos em tempos. O arquivo é
+descartável; se ele falhar, a requisição é admitida sem controle (o controle
+não pode derrubar as escritas).
+"""
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+Regra = namedtuple('Regra', 'em_andamento taxa rajada')
+
+
+class Recusada(Exception):
+    """Requisição recusada: 429 (cliente sem fichas) ou 503 (vagas esgotadas)."""
+
+    def __init__(self, status, motivo, retry_after):
+        super().__init__(f'Requisição recusada ({motivo})')
+        self.status = status
+        self.motivo = motivo
+        self.retry_after = retry_after
+
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ControleAdmissao:
+    def __init__(self, caminho, regras, limite_processo=3, retry_after=1, intervalo_limpeza=10.0):
+        self.caminho = caminho
+        self.regras = regras
+        self.limite_processo = limite_processo
+        self.retry_after = retry_after
+        self.intervalo_limpeza = intervalo_limpeza
+        # Um balde cheio equivale a nenhum: some depois de ficar parado esse tempo
+        self._validade_balde = max((r.rajada / r.taxa for r in regras.values()), default=0)
+        self._local = threading.local()
+        self._trava = threading.Lock()
+        self._reiniciar()
+        self._esquema_criado = False
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+
+    def _reiniciar(self):
+        # Contagem deste processo; depois de um fork o filho começa do zero
+        self._pid = os.getpid()
+        self._admitidas = 0
+        self._limpo_em = 0.0
+        self._vagas_antigas = True
+
+    def _estado(self):
+        if self._pid != os.getpid():
+            self._reiniciar()
+
+    def _conexao(self):
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None or self._local.pid != os.getpid():
+            conexao = sqlite3.connect(self.caminho, timeout=1, isolation_level=None, check_same_thread=False)
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.execute('PRAGMA synchronous=OFF')
+            self._local.conexao, self._local.pid = conexao, os.getpid()
+            if not self._esquema_criado:
+                # Tabelas criadas na primeira conexão, não no construtor
+                self._criar_esquema(conexao)
+                self._esquema_criado = True
+        return conexao
+
+    def _criar_esquema(self, conexao):
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            conexao.execute('''
+                CREATE TABLE IF NOT EXISTS vaga (
+                    pid INTEGER NOT NULL,
+                    rota TEXT NOT NULL,
+                    quantidade INTEGER NOT NULL,
+                    PRIMARY KEY (pid, rota)
+                )
+            ''')
+            conexao.execute('''
+                CREATE TABLE IF NOT EXISTS balde (
+                    chave TEXT PRIMARY KEY,
+                    fichas REAL NOT NULL,
+                    atualizado_em REAL NOT NULL
+                )
+            ''')
+            conexao.execute('CREATE INDEX IF NOT EXISTS ix_balde_atualizado_em ON balde (atualizado_em)')
+            conexao.execute('COMMIT')
+        except Exception:
+            conexao.execute('ROLLBACK')
+            raise
+
+    def admitir(self, rota, cliente):
+        """Ocupa uma vaga da rota e gasta uma ficha do cliente, ou lança `Recusada`.
+
+        Retorna se a vaga ficou registrada no arquivo; o valor vai para `liberar`.
+        """
+        regra = self.regras[rota]
+        self._estado()
+        with self._trava:
+            if self._admitidas >= self.limite_processo:
+                raise Recusada(503, 'processo', self.retry_after)
+            self._admitidas += 1
+            # Vagas de um processo antigo com o mesmo pid: apagadas antes da primeira admissão
+            vagas_antigas, self._vagas_antigas = self._vagas_antigas, False
+        try:
+            self._reservar(rota, regra, cliente, vagas_antigas)
+        except Recusada:
+            self._soltar()
+            raise
+        except sqlite3.Error as e:
+            logger.error(f"Erro no controle de admissão ({rota}): {e}")
+            return False
+        return True
+
+    def _reservar(self, rota, regra, cliente, vagas_antigas):
+        conexao = self._conexao()
+        pid = os.getpid()
+        if vagas_antigas:
+            conexao.execute('DELETE FROM vaga WHERE pid = ?', (pid,))
+        if time.monotonic() - self._limpo_em >= self.intervalo_limpeza:
+            self._limpar(conexao)
+        agora = time.time()
+        chave = f'{rota} {cliente}'
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            (ocupadas,) = conexao.execute(
+                'SELECT COALESCE(SUM(quantidade), 0) FROM vaga WHERE rota = ?', (rota,)
+            ).fetchone()
+            if ocupadas >= regra.em_andamento:
+                raise Recusada(503, 'em_andamento', self.retry_after)
+            linha = conexao.execute('SELECT fichas, atualizado_em FROM balde WHERE chave = ?', (chave,)).fetchone()
+            fichas = regra.rajada
+            if linha is not None:
+                fichas = min(regra.rajada, linha[0] + max(0.0, agora - linha[1]) * regra.taxa)
+            if fichas < 1:
+                raise Recusada(429, 'taxa', math.ceil((1 - fichas) / regra.taxa))
+            conexao.execute('INSERT OR REPLACE INTO balde (chave, fichas, atualizado_em) VALUES (?, ?, ?)',
+                            (chave, fichas - 1, agora))
+            conexao.execute(
+                'INSERT INTO vaga (pid, rota, quantidade) VALUES (?, ?, 1) '
+                'ON CONFLICT (pid, rota) DO UPDATE SET quantidade = quantidade + 1',
+                (pid, rota)
+            )
+            conexao.execute('COMMIT')
+        except Exception:
+            conexao.execute('ROLLBACK')
+            raise
+
+    def _limpar(self, conexao):
+        """Descarta as vagas de processos que morreram e os baldes que já encheram de novo."""
+        self._limpo_em = time.monotonic()
+        for (pid,) in conexao.execute('SELECT DISTINCT pid FROM vaga WHERE pid != ?', (os.getpid(),)).fetchall():
+            if not _vivo(pid):
+                conexao.execute('DELETE FROM vaga WHERE pid = ?', (pid,))
+        conexao.execute('DELETE FROM balde WHERE atualizado_em < ?', (time.time() - self._validade_balde,))
+
+    def _soltar(self):
+        with self._trava:
+            if self._admitidas > 0:
+                self._admitidas -= 1
+
+    def liberar(self, rota, registrada):
+        """Devolve a vaga ocupada por `admitir` (chamada no fim da requisição)."""
+        self._estado()
+        self._soltar()
+        if not registrada:
+            return
+        try:
+            self._conexao().execute(
+                'UPDATE vaga SET quantidade = quantidade - 1 WHERE pid = ? AND rota = ? AND quantidade > 0',
+                (os.getpid(), rota)
+            )
+        except sqlite3.Error as e:
+            logger.error(f"Erro ao liberar vaga do controle de admissão ({rota}): {e}")
+
+    def em_andamento(self):
+        """Requisições admitidas e ainda em andamento no nó, por rota."""
+        ocupadas = dict(self._conexao().execute('SELECT rota, SUM(quantidade) FROM vaga GROUP BY rota').fetchall())
+        return {rota: ocupadas.get(rota, 0) for rota in self.regras}
+
+    def resumo(self):
+        """Vagas ocupadas e limites por rota e clientes com balde ativo."""
+        em_andamento = self.em_andamento()
+        (clientes,) = self._conexao().execute('SELECT COUNT(*) FROM balde').fetchone()
+        return {
+            'limite_processo': self.limite_processo,
+            'clientes': clientes,
+            'rotas': {rota: {'em_andamento': em_andamento[rota], 'limite': regra.em_andamento,
+                             'taxa': regra.taxa, 'rajada': regra.rajada}
+                      for rota, regra in self.regras.items()},
+        }
@@ -1,82 +1,113 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, session
+from flask import Blueprint, Flask, current_app, render_template, request, redirect, url_for, jsonify, session, Response, stream_with_context, abort, send_file, g
+import atexit
 import csv
+import gzip
+import hashlib
+import hmac
 import io
+import itertools
+import math
+import mimetypes
 import os
 import re
+import sqlite3
+import time
+import zlib
 import logging
-from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+import threading
+from functools import lru_cache, partial
+from types import SimpleNamespace
+import numpy as np
+try:
+    import brotli
+except ImportError:
+    brotli = None
+import click
+from sqlalchemy import Integer, and_, bindparam, cast, column, delete, func, insert, literal_column, select, table, tuple_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+from werkzeug.http import is_resource_modified
+from werkzeug.security import safe_join
 
-app = Flask(__name__, template_folder='fecart', static_folder='fecart', static_url_path='')
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
+import admissao
+import arquivamento
+import banco
+import cache_compartilhado
+import colunar
+import estatisticas
+import filtro_conteudo
+import gamificacao
+import metricas
+import migracoes
+import senhas
+from expurgo import ExpurgoEmSegundoPlano
+from ingestao import IngestaoEmLote
+from models import (
+    AgregadoMensal, Auth, DistribuicaoPontos, EstatisticaDiaria, FatorEmissao, Feedback, HistogramaDiario,
+    PegadaCarbono, PontuacaoUsuario, ResultadoQuiz, Usuario, db,
+)
 
-# Configuração do banco de dados para produção
-if os.environ.get('RENDER'):
-    # Em produção no Render
-    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///verdetch.db')
-else:
-    # Em desenvolvimento
-    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(os.path.dirname(__file__), "fecart", "instance", "verdetch.db")}'
+# Com o build do front (gerar_assets.py) páginas e estáticos vêm de fecart/dist;
+# FRONT_BUILD=0 ignora o build, para editar o fecart/ em desenvolvimento
+PASTA_FRONT = 'fecart'
+if os.environ.get('FRONT_BUILD', '1') == '1' and os.path.exists(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fecart', 'dist', 'manifest.json')):
+    PASTA_FRONT = 'fecart/dist'
 
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Rotas, hooks e comandos do app; o create_app (no fim do arquivo) registra tudo
+site = Blueprint('site', __name__, cli_group=None)
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-db = SQLAlchemy(app)
+def configuracao_ambiente():
+    """Configuração do app lida das variáveis de ambiente; o `config` do create_app sobrepõe."""
+    if os.environ.get('RENDER'):
+        # Em produção no Render
+        uri = os.environ.get('DATABASE_URL', 'sqlite:///verdetch.db')
+    else:
+        # Em desenvolvimento
+        uri = f'sqlite:///{os.path.join(os.path.dirname(__file__), "fecart", "instance", "verdetch.db")}'
+    return {
+        'SECRET_KEY': os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production'),
+        'SQLALCHEMY_DATABASE_URI': uri,
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        # Perfil de conexão do SQLite (ver banco.py): 'padrao' ou 'producao'
+        'DB_PERFIL': os.environ.get('DB_PERFIL', 'padrao'),
+    }
 
-class Usuario(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    nome = db.Column(db.String(100), nullable=False)
-    email = db.Column(db.String(100), unique=True, nullable=False)
-    data_cadastro = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    def __repr__(self):
-        return f'<Usuario {self.nome}>'
-
-class Auth(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
-    username = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(255), nullable=False)
-    usuario = db.relationship('Usuario', backref=db.backref('auth', uselist=False))
-
-class PegadaCarbono(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'))
-    transporte = db.Column(db.Float, nullable=False)
-    energia = db.Column(db.Float, nullable=False)
-    alimentacao = db.Column(db.Integer, nullable=False)
-    lixo = db.Column(db.Integer, nullable=False)
-    total_co2 = db.Column(db.Float, nullable=False)
-    data_calculo = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    def __repr__(self):
-        return f'<PegadaCarbono {self.total_co2} kg CO2>'
-
-class ResultadoQuiz(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'))
-    pontuacao = db.Column(db.Integer, nullable=False)
-    total_perguntas = db.Column(db.Integer, nullable=False)
-    data_realizacao = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    def __repr__(self):
-        return f'<ResultadoQuiz {self.pontuacao}/{self.total_perguntas}>'
-
-class Feedback(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'))
-    rating = db.Column(db.Integer, nullable=False)  # 1-5
-    text = db.Column(db.Text)
-    quiz_score = db.Column(db.Integer)
-    quiz_total = db.Column(db.Integer)
-    data_feedback = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    def __repr__(self):
-        return f'<Feedback {self.rating}/5 - {self.data_feedback}>'
+def _estado():
+    """Recursos do app atual criados pelo create_app (engine de leitura, ingestão, expurgo)."""
+    return current_app.extensions['verdetech']
+
+def leitura():
+    """bind_arguments das consultas de leitura do admin: usa o pool somente leitura, se houver."""
+    engine_leitura = _estado().engine_leitura
+    return {'bind': engine_leitura} if engine_leitura is not None else {}
+
+# Latência, tamanho da resposta e consultas SQL por rota, somados entre os
+# workers do gunicorn e expostos em /metrics (ver metricas.py)
+metricas_app = metricas.Metricas(
+    metricas.PASTA,
+    sql_lenta=float(os.environ.get('METRICAS_SQL_LENTA', 0.1))
+)
+
+# Respostas dos relatórios do admin, guardadas em um SQLite que todos os
+# workers enxergam e invalidadas pelas escritas (ver cache_compartilhado.py)
+cache_respostas = cache_compartilhado.CacheCompartilhado(
+    os.environ.get('CACHE_DB', os.path.join(os.path.dirname(__file__), 'fecart', 'instance', 'cache.db')),
+    ttl=float(os.environ.get('CACHE_TTL', 300)),
+    capacidade=int(os.environ.get('CACHE_CAPACIDADE', 256))
+)
+
+def invalidar_cache(*fontes):
+    """Chamada depois do commit de cada escrita; uma falha no cache não desfaz a escrita."""
+    try:
+        cache_respostas.invalidar(*fontes)
+    except sqlite3.Error as e:
+        logger.error(f"Erro ao invalidar o cache ({', '.join(fontes)}): {e}")
 
 # Lista de palavras proibidas (nomes preconceituosos e +18)
 PROHIBITED_WORDS = [
@@ -91,75 +122,788 @@ PROHIBITED_WORDS = [
     'drogas', 'maconha', 'cocaina', 'heroina', 'lsd', 'ecstasy'
 ]
 
+# Subconjunto ofensivo usado no texto livre do feedback, onde palavras como
+# "teste" ou "branco" são legítimas; aqui só vale a palavra inteira
+PALAVRAS_OFENSIVAS = [
+    'fuck', 'shit', 'bitch', 'asshole', 'idiot', 'stupid',
+    'puta', 'puto', 'merda', 'caralho', 'porra', 'foda', 'foder',
+    'idiota', 'estupido', 'imbecil', 'retardado', 'mongol', 'viado', 'bicha', 'prostituta'
+]
+
+# Compilados uma vez; FILTRO_NOMES_ARQUIVO/FILTRO_FEEDBACK_ARQUIVO trocam as listas sem reiniciar
+filtro_nomes = filtro_conteudo.FiltroConteudo(PROHIBITED_WORDS, arquivo=os.environ.get('FILTRO_NOMES_ARQUIVO'))
+filtro_feedback = filtro_conteudo.FiltroConteudo(
+    PALAVRAS_OFENSIVAS, arquivo=os.environ.get('FILTRO_FEEDBACK_ARQUIVO'), palavra_inteira=True
+)
+NOME_VALIDO = re.compile(r'^[a-zA-ZÀ-ÿ\s]+$')
+
 def validate_name(name):
     """Valida se o nome não contém palavras proibidas"""
-    name_lower = name.lower().strip()
-    
-    # Verificar palavras proibidas
-    for word in PROHIBITED_WORDS:
-        if word in name_lower:
-            return False, f"Nome contém palavra inadequada: '{word}'"
+    # Verificar palavras proibidas (também com acentos e leetspeak)
+    word = filtro_nomes.primeira(name.strip())
+    if word:
+        return False, f"Nome contém palavra inadequada: '{word}'"
     
     # Verificar se é muito curto
     if len(name.strip()) < 2:
         return False, "Nome deve ter pelo menos 2 caracteres"
     
     # Verificar se contém apenas letras e espaços
-    if not re.match(r'^[a-zA-ZÀ-ÿ\s]+$', name):
+    if not NOME_VALIDO.match(name):
         return False, "Nome deve conter apenas letras e espaços"
     
     return True, "Nome válido"
 
-# Inicializar banco de dados com tratamento de erro
-try:
+# Categorias da calculadora e fatores usados enquanto não há versão no banco
+CATEGORIAS_PEGADA = ('transporte', 'energia', 'alimentacao', 'lixo')
+FATORES_PADRAO = {'transporte': 0.21, 'energia': 0.5, 'alimentacao': 2.5, 'lixo': 10}
+
+# Métricas agregadas por dia; as de pegada também ganham histograma logarítmico
+METRICAS_PEGADA = CATEGORIAS_PEGADA + ('total_co2',)
+
+def _valores_metricas(tipo, r):
+    """Data e valor de cada métrica agregada de um registro (dict) de pegada ou quiz."""
+    if tipo == 'pegada':
+        return r['data_calculo'], {f'pegada.{m}': r[m] for m in METRICAS_PEGADA}
+    total = r['total_perguntas']
+    return r['data_realizacao'], {
+        'quiz.pontuacao': r['pontuacao'],
+        'quiz.percentual': 100.0 * r['pontuacao'] / total if total else 0.0
+    }
+
+def _acumular_estatisticas(tipo, registros, sinal, agregados, baldes):
+    """Soma em `agregados`/`baldes` a contribuição dos registros (dicts) de um tipo."""
+    for r in registros:
+        data, valores = _valores_metricas(tipo, r)
+        if tipo == 'pegada':
+            histograma = {f'pegada.{m}': estatisticas.balde(r[m]) for m in METRICAS_PEGADA}
+        else:
+            histograma = {'quiz.percentual': estatisticas.faixa_percentual(r['pontuacao'], r['total_perguntas'])}
+        if data is None:
+            continue
+        dia = data.date()
+        for metrica, valor in valores.items():
+            agregado = agregados.setdefault((dia, metrica), [0, 0.0, 0.0])
+            agregado[0] += sinal
+            agregado[1] += sinal * valor
+            agregado[2] += sinal * valor * valor
+        for metrica, balde in histograma.items():
+            chave = (dia, metrica, balde)
+            baldes[chave] = baldes.get(chave, 0) + sinal
+
+def _gravar_estatisticas(agregados, baldes):
+    tabela = EstatisticaDiaria.__table__
+    if agregados:
+        stmt = sqlite_insert(tabela)
+        stmt = stmt.on_conflict_do_update(index_elements=['dia', 'metrica'], set_={
+            'quantidade': tabela.c.quantidade + stmt.excluded.quantidade,
+            'soma': tabela.c.soma + stmt.excluded.soma,
+            'soma_quadrados': tabela.c.soma_quadrados + stmt.excluded.soma_quadrados
+        })
+        db.session.execute(stmt, [
+            {'dia': dia, 'metrica': metrica, 'quantidade': q, 'soma': soma, 'soma_quadrados': quadrados}
+            for (dia, metrica), (q, soma, quadrados) in agregados.items()
+        ])
+    tabela = HistogramaDiario.__table__
+    if baldes:
+        stmt = sqlite_insert(tabela)
+        stmt = stmt.on_conflict_do_update(index_elements=['dia', 'metrica', 'balde'], set_={
+            'quantidade': tabela.c.quantidade + stmt.excluded.quantidade
+        })
+        db.session.execute(stmt, [
+            {'dia': dia, 'metrica': metrica, 'balde': balde, 'quantidade': q}
+            for (dia, metrica, balde), q in baldes.items()
+        ])
+
+def atualizar_estatisticas(tipo, registros, sinal=1):
+    """Aplica registros novos (sinal=1) ou apagados (sinal=-1) aos agregados diários.
+
+    Roda na transação de quem grava os registros; o commit fica com o chamador.
+    """
+    agregados, baldes = {}, {}
+    _acumular_estatisticas(tipo, registros, sinal, agregados, baldes)
+    _gravar_estatisticas(agregados, baldes)
+
+def _descontar_estatisticas_usuarios(usuarios):
+    """Retira dos agregados as atividades dos usuários que serão apagadas.
+
+    Inclui as que já tinham saído do banco para o arquivo de histórico; elas
+    só são apagadas de lá depois do commit (_retirar_do_arquivo).
+    """
+    arquivadas = _linhas_arquivadas(usuarios)
+    for tipo, (modelo, _) in TIPOS_INGESTAO.items():
+        linhas = db.session.execute(
+            select(modelo.__table__).where(modelo.usuario_id.in_(usuarios))
+        ).mappings().all()
+        atualizar_estatisticas(tipo, list(linhas) + arquivadas.get(tipo, []), sinal=-1)
+
+def reconstruir_estatisticas():
+    """Recalcula os agregados diários (e os mensais do arquivo) a partir dos registros.
+
+    Os registros são as pegadas e quizzes do banco mais os do arquivo de histórico.
+    """
+    agregados, baldes, mensais = {}, {}, {}
+    for tipo, (modelo, _) in TIPOS_INGESTAO.items():
+        resultado = db.session.execute(
+            select(modelo.__table__).execution_options(yield_per=5000)
+        ).mappings()
+        for lote in resultado.partitions():
+            _acumular_estatisticas(tipo, lote, 1, agregados, baldes)
+        for lote in _registros_arquivados(tipo):
+            _acumular_estatisticas(tipo, lote, 1, agregados, baldes)
+            _acumular_mensal(tipo, lote, mensais)
+    db.session.execute(delete(EstatisticaDiaria))
+    db.session.execute(delete(HistogramaDiario))
+    db.session.execute(delete(AgregadoMensal))
+    _gravar_estatisticas(agregados, baldes)
+    _gravar_agregados_mensais(mensais)
+    db.session.commit()
+    return len(agregados), len(baldes)
+
+@site.cli.command('reconstruir-estatisticas')
+def reconstruir_estatisticas_comando():
+    """Recalcula /admin/estatisticas a partir dos registros brutos."""
+    agregados, baldes = reconstruir_estatisticas()
+    invalidar_cache('atividades')
+    print(f"Estatísticas reconstruídas: {agregados} agregados diários, {baldes} baldes de histograma")
+
+def _gravar_pontuacoes(estados, atuais):
+    """Grava os novos estados {usuario_id: (conquistas, secoes)} e ajusta a distribuição.
+
+    `atuais` tem o estado anterior {usuario_id: (conquistas, secoes, pontos)}
+    de quem já tinha linha. Roda na transação de quem chama.
+    """
+    agora = datetime.utcnow()
+    linhas, deltas = [], {}
+    for usuario_id, (mascara, secoes) in estados.items():
+        anterior = atuais.get(usuario_id)
+        pontos = gamificacao.pontos(mascara)
+        if anterior is not None:
+            if anterior[:2] == (mascara, secoes):
+                continue
+            deltas[anterior[2]] = deltas.get(anterior[2], 0) - 1
+        deltas[pontos] = deltas.get(pontos, 0) + 1
+        linhas.append({'usuario_id': usuario_id, 'conquistas': mascara, 'secoes': secoes,
+                       'pontos': pontos, 'atualizado_em': agora})
+    if linhas:
+        stmt = sqlite_insert(PontuacaoUsuario.__table__)
+        db.session.execute(stmt.on_conflict_do_update(index_elements=['usuario_id'], set_={
+            c: stmt.excluded[c] for c in ('conquistas', 'secoes', 'pontos', 'atualizado_em')
+        }), linhas)
+    deltas = {p: d for p, d in deltas.items() if d}
+    if deltas:
+        tabela = DistribuicaoPontos.__table__
+        stmt = sqlite_insert(tabela)
+        db.session.execute(stmt.on_conflict_do_update(index_elements=['pontos'], set_={
+            'quantidade': tabela.c.quantidade + stmt.excluded.quantidade
+        }), [{'pontos': p, 'quantidade': d} for p, d in deltas.items()])
+
+def _pontuacoes_atuais(usuarios):
+    return {
+        linha.usuario_id: (linha.conquistas, linha.secoes, linha.pontos)
+        for linha in db.session.execute(
+            select(PontuacaoUsuario.usuario_id, PontuacaoUsuario.conquistas,
+                   PontuacaoUsuario.secoes, PontuacaoUsuario.pontos)
+            .where(PontuacaoUsuario.usuario_id.in_(usuarios))
+        )
+    }
+
+def desbloquear_conquistas(novas, secoes=None):
+    """Liga bits de conquistas ({usuario_id: máscara}) e de seções visitadas."""
+    secoes = secoes or {}
+    usuarios = set(novas) | set(secoes)
+    if not usuarios:
+        return
+    atuais = _pontuacoes_atuais(usuarios)
+    estados = {}
+    for usuario_id in usuarios:
+        mascara, visitadas, _ = atuais.get(usuario_id, (0, 0, 0))
+        visitadas |= secoes.get(usuario_id, 0)
+        mascara |= novas.get(usuario_id, 0) | gamificacao.avaliar_secoes(visitadas)
+        estados[usuario_id] = (mascara, visitadas)
+    _gravar_pontuacoes(estados, atuais)
+
+def atualizar_conquistas(tipo, registros):
+    """Avalia as conquistas só com os registros novos de pegada ou quiz.
+
+    Roda na transação de quem grava os registros; o commit fica com o chamador.
+    """
+    novas = {}
+    for r in registros:
+        if r['usuario_id'] is not None:
+            novas[r['usuario_id']] = novas.get(r['usuario_id'], 0) | gamificacao.avaliar(tipo, r)
+    desbloquear_conquistas(novas)
+
+def _conquistas_dos_registros(usuario_id=None, sem_arquivo=()):
+    """Máscara por usuário recalculada de todas as pegadas e quizzes (ou de um usuário).
+
+    As linhas arquivadas dos usuários em `sem_arquivo` ficam de fora: numa
+    exclusão elas só saem do arquivo depois do commit (_retirar_do_arquivo).
+    """
+    sem_arquivo = set(sem_arquivo)
+    mascaras = {}
+    for tipo, (modelo, _) in TIPOS_INGESTAO.items():
+        consulta = select(modelo.__table__).where(modelo.usuario_id.is_not(None))
+        if usuario_id is not None:
+            consulta = consulta.where(modelo.usuario_id == usuario_id)
+        lotes = db.session.execute(consulta.execution_options(yield_per=5000)).mappings().partitions()
+        arquivados = ()
+        if usuario_id is None or usuario_id not in sem_arquivo:
+            arquivados = ([r for r in lote if r['usuario_id'] not in sem_arquivo]
+                          for lote in _registros_arquivados(tipo, usuario_id))
+        for lote in itertools.chain(lotes, arquivados):
+            for r in lote:
+                if r['usuario_id'] is not None:
+                    mascaras[r['usuario_id']] = mascaras.get(r['usuario_id'], 0) | gamificacao.avaliar(tipo, r)
+    return mascaras
+
+def recalcular_conquistas(usuario_id):
+    """Refaz as conquistas de um usuário depois que as atividades dele foram apagadas.
+
+    Na mesma transação da exclusão: as linhas arquivadas dele ainda estão no
+    arquivo, mas já não contam.
+    """
+    atuais = _pontuacoes_atuais([usuario_id])
+    if usuario_id not in atuais:
+        return
+    secoes = atuais[usuario_id][1]
+    mascara = _conquistas_dos_registros(usuario_id, sem_arquivo=[usuario_id]).get(usuario_id, 0) | gamificacao.avaliar_secoes(secoes)
+    _gravar_pontuacoes({usuario_id: (mascara, secoes)}, atuais)
+
+def remover_pontuacoes(usuarios):
+    """Tira os usuários do ranking e da distribuição de pontos."""
+    atuais = _pontuacoes_atuais(usuarios)
+    if not atuais:
+        return
+    db.session.execute(delete(PontuacaoUsuario).where(PontuacaoUsuario.usuario_id.in_(list(atuais))))
+    deltas = {}
+    for _, _, pontos in atuais.values():
+        deltas[pontos] = deltas.get(pontos, 0) + 1
+    db.session.execute(
+        DistribuicaoPontos.__table__.update().where(DistribuicaoPontos.pontos == bindparam('b_pontos'))
+        .values(quantidade=DistribuicaoPontos.quantidade - bindparam('b_quantidade')),
+        [{'b_pontos': p, 'b_quantidade': d} for p, d in deltas.items()]
+    )
+
+def reconstruir_conquistas():
+    """Recalcula conquistas, pontos e distribuição; mantém as seções visitadas."""
+    secoes = dict(db.session.execute(select(PontuacaoUsuario.usuario_id, PontuacaoUsuario.secoes)).all())
+    mascaras = _conquistas_dos_registros()
+    estados = {
+        usuario_id: (mascaras.get(usuario_id, 0) | gamificacao.avaliar_secoes(secoes.get(usuario_id, 0)),
+                     secoes.get(usuario_id, 0))
+        for usuario_id in set(mascaras) | set(secoes)
+    }
+    db.session.execute(delete(PontuacaoUsuario))
+    db.session.execute(delete(DistribuicaoPontos))
+    _gravar_pontuacoes(estados, {})
+    db.session.commit()
+    return len(estados)
+
+@site.cli.command('reconstruir-conquistas')
+def reconstruir_conquistas_comando():
+    """Recalcula conquistas e ranking a partir das pegadas e quizzes gravados."""
+    print(f"Conquistas reconstruídas para {reconstruir_conquistas()} usuários")
+
+# Tabela e coluna de data de cada tipo de registro aceito pela ingestão em lote
+TIPOS_INGESTAO = {
+    'pegada': (PegadaCarbono, 'data_calculo'),
+    'quiz': (ResultadoQuiz, 'data_realizacao')
+}
+
+# Arquivo colunar das atividades antigas, fora do banco (ver arquivamento.py)
+arquivo_historico = arquivamento.ArquivoColunar(
+    os.environ.get('ARQUIVO_DIR', os.path.join(os.path.dirname(__file__), 'fecart', 'instance', 'arquivo'))
+)
+# Colunas de cada tipo no arquivo e o dtype do .npy
+COLUNAS_ARQUIVO = {
+    'pegada': {'id': 'i8', 'usuario_id': 'i8', 'transporte': 'f8', 'energia': 'f8', 'alimentacao': 'i4',
+               'lixo': 'i4', 'total_co2': 'f8', 'data_calculo': 'M8[us]'},
+    'quiz': {'id': 'i8', 'usuario_id': 'i8', 'pontuacao': 'i4', 'total_perguntas': 'i4',
+             'data_realizacao': 'M8[us]'},
+}
+
+def _para_colunas(tipo, linhas):
+    colunas = {}
+    for nome, dtype in COLUNAS_ARQUIVO[tipo].items():
+        valores = [linha[nome] for linha in linhas]
+        if nome == 'usuario_id':
+            valores = [arquivamento.SEM_USUARIO if v is None else v for v in valores]
+        colunas[nome] = np.array(valores, dtype=dtype)
+    return colunas
+
+def _para_linhas(colunas):
+    # tolist() devolve int, float e datetime do Python, como as linhas do banco
+    listas = {nome: valores.tolist() for nome, valores in colunas.items()}
+    listas['usuario_id'] = [None if u == arquivamento.SEM_USUARIO else u for u in listas['usuario_id']]
+    return [dict(zip(listas, valores)) for valores in zip(*listas.values())]
+
+def _registros_arquivados(tipo, usuario_id=None):
+    """Gera, por segmento, as linhas arquivadas (dicts) de um tipo, de todos ou de um usuário."""
+    for colunas in arquivo_historico.ler(tipo):
+        if usuario_id is not None:
+            filtro = colunas['usuario_id'] == usuario_id
+            colunas = {nome: valores[filtro] for nome, valores in colunas.items()}
+        if len(colunas['id']):
+            yield _para_linhas(colunas)
+
+def _linhas_arquivadas(usuarios):
+    """As linhas dos usuários no arquivo de histórico ({tipo: [dicts]}), sem apagar."""
+    linhas = {}
+    for tipo in TIPOS_INGESTAO:
+        colunas = arquivo_historico.ler_usuarios(tipo, usuarios)
+        if colunas:
+            linhas[tipo] = _para_linhas(colunas)
+    return linhas
+
+def _retirar_do_arquivo(usuarios):
+    """Apaga do arquivo de histórico as linhas dos usuários.
+
+    O arquivo não participa da transação do banco: chame depois do commit,
+    para que uma falha no banco não leve junto linhas que continuam valendo.
+    Uma falha aqui só deixa as linhas sobrando no arquivo, e fica no log.
+    """
+    try:
+        for tipo in TIPOS_INGESTAO:
+            arquivo_historico.remover_usuarios(tipo, usuarios)
+    except Exception as e:
+        logger.error(f"Erro ao retirar do arquivo de histórico as linhas dos usuários {list(usuarios)}: {e}")
+
+# Métrica de cada tipo no resumo mensal; o detalhe por categoria continua na EstatisticaDiaria
+METRICA_MENSAL = {'pegada': 'pegada.total_co2', 'quiz': 'quiz.percentual'}
+
+def _acumular_mensal(tipo, registros, agregados):
+    """Soma em `agregados` {(usuario_id, mês, métrica): [n, soma, quadrados, mín, máx]}."""
+    metrica = METRICA_MENSAL[tipo]
+    for r in registros:
+        data, valores = _valores_metricas(tipo, r)
+        if data is None:
+            continue
+        chave = (r['usuario_id'], data.date().replace(day=1), metrica)
+        valor = valores[metrica]
+        agregado = agregados.get(chave)
+        if agregado is None:
+            agregados[chave] = [1, valor, valor * valor, valor, valor]
+            continue
+        agregado[0] += 1
+        agregado[1] += valor
+        agregado[2] += valor * valor
+        agregado[3] = min(agregado[3], valor)
+        agregado[4] = max(agregado[4], valor)
+
+def _gravar_agregados_mensais(agregados):
+    tabela = AgregadoMensal.__table__
+    linhas = [
+        {'usuario_id': usuario_id, 'mes': mes, 'metrica': metrica, 'quantidade': q, 'soma': soma,
+         'soma_quadrados': quadrados, 'minimo': minimo, 'maximo': maximo}
+        for (usuario_id, mes, metrica), (q, soma, quadrados, minimo, maximo) in agregados.items()
+    ]
+    com_usuario = [linha for linha in linhas if linha['usuario_id'] is not None]
+    if com_usuario:
+        stmt = sqlite_insert(tabela)
+        db.session.execute(stmt.on_conflict_do_update(index_elements=['usuario_id', 'mes', 'metrica'], set_={
+            'quantidade': tabela.c.quantidade + stmt.excluded.quantidade,
+            'soma': tabela.c.soma + stmt.excluded.soma,
+            'soma_quadrados': tabela.c.soma_quadrados + stmt.excluded.soma_quadrados,
+            'minimo': func.min(tabela.c.minimo, stmt.excluded.minimo),
+            'maximo': func.max(tabela.c.maximo, stmt.excluded.maximo)
+        }), com_usuario)
+    # Anônimos: NULL nunca conflita no índice único, então é UPDATE ou INSERT
+    for linha in linhas:
+        if linha['usuario_id'] is not None:
+            continue
+        atualizadas = db.session.execute(
+            tabela.update()
+            .where(tabela.c.usuario_id.is_(None), tabela.c.mes == linha['mes'], tabela.c.metrica == linha['metrica'])
+            .values(quantidade=tabela.c.quantidade + linha['quantidade'], soma=tabela.c.soma + linha['soma'],
+                    soma_quadrados=tabela.c.soma_quadrados + linha['soma_quadrados'],
+                    minimo=func.min(tabela.c.minimo, linha['minimo']),
+                    maximo=func.max(tabela.c.maximo, linha['maximo']))
+        ).rowcount
+        if not atualizadas:
+            db.session.execute(insert(tabela), linha)
+
+# Compactação: atividades de meses inteiros mais antigos que HISTORICO_RETENCAO_DIAS
+# saem do banco para o arquivo, ficando o resumo mensal por usuário
+RETENCAO_HISTORICO_DIAS = int(os.environ.get('HISTORICO_RETENCAO_DIAS', 365))
+TAMANHO_LOTE_COMPACTACAO = 10000
+
+def _limite_retencao(retencao_dias):
+    """Início do mês que contém a data de corte: só meses completos são arquivados."""
+    corte = datetime.utcnow() - timedelta(days=retencao_dias)
+    return datetime(corte.year, corte.month, 1)
+
+def _consulta_compactacao(modelo, coluna_data, limite, tamanho_lote):
+    # Em ordem de id, as linhas antigas vêm primeiro e a leitura para no LIMIT
+    coluna = getattr(modelo, coluna_data)
+    return select(modelo.__table__).where(coluna < limite).order_by(modelo.id).limit(tamanho_lote)
+
+def compactar_historico(retencao_dias=RETENCAO_HISTORICO_DIAS, tamanho_lote=TAMANHO_LOTE_COMPACTACAO,
+                        paginas_vacuum=2000):
+    """Move para o arquivo as pegadas e quizzes anteriores à retenção; retorna {tipo: linhas}.
+
+    Cada lote é uma transação curta: grava o segmento no arquivo, soma as
+    linhas no resumo mensal e as apaga do banco. Repetir um lote interrompido
+    não duplica nada (o arquivo ignora ids já gravados). Depois de cada lote
+    até `paginas_vacuum` páginas livres voltam ao sistema (auto_vacuum incremental).
+    """
+    limite = _limite_retencao(retencao_dias)
+    movidas = {}
+    for tipo, (modelo, coluna_data) in TIPOS_INGESTAO.items():
+        def lote():
+            linhas = db.session.execute(
+                _consulta_compactacao(modelo, coluna_data, limite, tamanho_lote)
+            ).mappings().all()
+            if not linhas:
+                return 0
+            por_mes = {}
+            for linha in linhas:
+                por_mes.setdefault(linha[coluna_data].strftime('%Y-%m'), []).append(linha)
+            for mes, do_mes in por_mes.items():
+                arquivo_historico.gravar(tipo, mes, _para_colunas(tipo, do_mes))
+            mensais = {}
+            _acumular_mensal(tipo, linhas, mensais)
+            _gravar_agregados_mensais(mensais)
+            # As linhas do lote são exatamente as antigas até o maior id lido
+            db.session.execute(delete(modelo).where(
+                modelo.id <= linhas[-1]['id'], getattr(modelo, coluna_data) < limite
+            ))
+            return len(linhas)
+
+        movidas[tipo] = 0
+        while quantidade := banco.executar_com_retentativa(db.session, lote):
+            movidas[tipo] += quantidade
+            invalidar_cache('atividades')
+            banco.vacuum_incremental(db.engine, paginas_vacuum)
+    return movidas
+
+@site.cli.command('compactar-historico')
+@click.option('--dias', type=int, default=RETENCAO_HISTORICO_DIAS, show_default=True,
+              help='Idade mínima, em dias, das atividades arquivadas.')
+@click.option('--converter-vacuum', is_flag=True,
+              help='Passa o banco para auto_vacuum incremental (VACUUM completo, uma vez só).')
+def compactar_historico_comando(dias, converter_vacuum):
+    """Arquiva as pegadas e quizzes antigos e devolve o espaço ao sistema."""
+    if converter_vacuum:
+        banco.ativar_vacuum_incremental(db.engine)
+    movidas = compactar_historico(dias)
+    banco.vacuum_incremental(db.engine)
+    for tipo, quantidade in movidas.items():
+        print(f"{tipo}: {quantidade} linhas arquivadas")
+    for tipo, resumo in arquivo_historico.resumo().items():
+        print(f"arquivo {tipo}: {resumo['linhas']} linhas em {resumo['segmentos']} segmentos, "
+              f"{resumo['bytes'] / 1024 / 1024:.1f} MiB")
+
+def _gravar_registros(registros):
+    """Grava um lote da ingestão, lista de (tipo, dados), em uma única transação."""
+    por_tipo = {}
+    for tipo, dados in registros:
+        coluna_data = TIPOS_INGESTAO[tipo][1]
+        dados = dict(dados, **{coluna_data: datetime.fromisoformat(dados[coluna_data])})
+        por_tipo.setdefault(tipo, []).append(dados)
+    def gravar():
+        # Usuário excluído depois do envio: o registro fica anônimo em vez de
+        # derrubar o lote inteiro na chave estrangeira
+        usuarios = {d['usuario_id'] for linhas in por_tipo.values() for d in linhas} - {None}
+        ativos = set(db.session.execute(
+            select(Usuario.id).where(Usuario.id.in_(usuarios), Usuario.excluido_em.is_(None))
+        ).scalars()) if usuarios else set()
+        for linhas in por_tipo.values():
+            for d in linhas:
+                if d['usuario_id'] not in ativos:
+                    d['usuario_id'] = None
+        for tipo, linhas in por_tipo.items():
+            db.session.execute(insert(TIPOS_INGESTAO[tipo][0]), linhas)
+            atualizar_estatisticas(tipo, linhas)
+            atualizar_conquistas(tipo, linhas)
+
+    banco.executar_com_retentativa(db.session, gravar)
+    invalidar_cache('atividades')
+
+def _no_contexto(app, funcao, *args):
+    """Roda `funcao` no contexto do app: é como as threads de fundo (ingestão, expurgo) usam o banco."""
     with app.app_context():
-        db.create_all()
-        logger.info("Banco de dados inicializado com sucesso")
-except Exception as e:
-    logger.error(f"Erro ao inicializar banco de dados: {e}")
-    # Continuar mesmo com erro no banco
+        return funcao(*args)
+
+# Campos numéricos de cada tipo de atividade e se são inteiros no banco
+CAMPOS_ATIVIDADE = {
+    'pegada': {'transporte': False, 'energia': False, 'alimentacao': True, 'lixo': True, 'total_co2': False},
+    'quiz': {'pontuacao': True, 'total_perguntas': True},
+}
+
+def _validar_atividade(tipo, dados):
+    """Confere e converte os campos numéricos; ValueError com a mensagem para o usuário."""
+    dados = dict(dados)
+    for campo, inteiro in CAMPOS_ATIVIDADE[tipo].items():
+        valor = dados.get(campo)
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not math.isfinite(valor):
+            raise ValueError(f'{campo} deve ser numérico')
+        if inteiro and valor != int(valor):
+            raise ValueError(f'{campo} deve ser inteiro')
+        dados[campo] = int(valor) if inteiro else float(valor)
+    return dados
+
+def _registrar_atividade(tipo, dados):
+    """Grava uma pegada ou resultado de quiz.
+
+    No modo de ingestão em lote o registro vai para a fila e a função retorna
+    None (o id só existe depois da gravação do lote). Com a fila cheia, ou fora
+    desse modo, grava na hora e retorna o id. Os campos são validados antes,
+    nos dois caminhos: um registro inválido nunca entra na fila.
+    """
+    modelo, coluna_data = TIPOS_INGESTAO[tipo]
+    dados = dict(_validar_atividade(tipo, dados), **{coluna_data: datetime.utcnow()})
+    ingestao = _estado().ingestao
+    if ingestao is not None:
+        if ingestao.enfileirar(tipo, dict(dados, **{coluna_data: dados[coluna_data].isoformat()})):
+            return None
+
+    def gravar():
+        registro = modelo(**dados)
+        db.session.add(registro)
+        atualizar_estatisticas(tipo, [dados])
+        atualizar_conquistas(tipo, [dados])
+        return registro
+
+    registro_id = banco.executar_com_retentativa(db.session, gravar).id
+    invalidar_cache('atividades')
+    return registro_id
+
+def _purgar_usuarios(usuarios):
+    """Apaga de vez os usuários; o ON DELETE CASCADE leva atividades, feedback e login.
+
+    Roda na transação de quem chama; o commit fica com o chamador, que depois
+    dele retira as linhas do arquivo de histórico (_retirar_do_arquivo).
+    """
+    _descontar_estatisticas_usuarios(usuarios)
+    remover_pontuacoes(usuarios)
+    db.session.execute(delete(Usuario).where(Usuario.id.in_(usuarios)))
+
+def purgar_excluidos(tamanho_lote=None):
+    """Apaga um lote de usuários marcados como excluídos e retorna quantos.
+
+    Cada worker pode estar rodando o expurgo (ver preparar_processo): o lote
+    é escolhido dentro da transação que apaga, depois de ela já ter a
+    escrita, então um usuário só é descontado das estatísticas e apagado
+    por quem o apagou de fato.
+    """
+    def purgar():
+        pendentes = (select(Usuario.id).where(Usuario.excluido_em.is_not(None))
+                     .order_by(Usuario.id).limit(tamanho_lote or TAMANHO_LOTE_EXPURGO))
+        # Escrita que não muda nada, só para reservar o banco: outro worker no
+        # mesmo ponto espera o commit deste e relê os pendentes sem estes ids
+        db.session.execute(update(Usuario).where(Usuario.id.in_(pendentes.scalar_subquery()))
+                           .values(excluido_em=Usuario.excluido_em)
+                           .execution_options(synchronize_session=False))
+        ids = db.session.execute(pendentes).scalars().all()
+        if ids:
+            _purgar_usuarios(ids)
+        return ids
+
+    try:
+        ids = banco.executar_com_retentativa(db.session, purgar)
+        if ids:
+            _retirar_do_arquivo(ids)
+            invalidar_cache('usuarios', 'atividades', 'feedbacks')
+        return len(ids)
+    finally:
+        db.session.remove()
+
+# Usuários apagados por lote do expurgo em segundo plano (ver create_app)
+TAMANHO_LOTE_EXPURGO = int(os.environ.get('EXPURGO_TAMANHO_LOTE', 200))
+
+@site.cli.command('purgar-excluidos')
+def purgar_excluidos_comando():
+    """Apaga agora todos os usuários marcados como excluídos."""
+    total = 0
+    while removidos := purgar_excluidos():
+        total += removidos
+    print(f"{total} usuários apagados")
+
+# Threads de requisição de cada worker (o gunicorn.conf.py põe no ambiente)
+THREADS_REQUISICAO = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Hash de senhas em pool limitado; SENHA_METODO define o algoritmo e o fator de trabalho.
+# Rodando e na fila, no máximo THREADS_REQUISICAO - 1 requisições ficam presas
+# esperando hash: sobra sempre uma thread para as outras rotas do worker.
+VAGAS_SENHAS = max(THREADS_REQUISICAO - 1, 1)
+_trabalhadores_senhas = min(int(os.environ.get('SENHA_TRABALHADORES', os.cpu_count() or 2)), VAGAS_SENHAS)
+servico_senhas = senhas.ServicoSenhas(
+    os.environ.get('SENHA_METODO', 'scrypt:32768:8:1'),
+    trabalhadores=_trabalhadores_senhas,
+    fila=min(int(os.environ.get('SENHA_FILA', VAGAS_SENHAS)), VAGAS_SENHAS - _trabalhadores_senhas),
+    retry_after=int(os.environ.get('SENHA_RETRY_AFTER', 2))
+)
+
+def _senhas_ocupadas(template, erro, **contexto):
+    resposta = current_app.make_response((render_template(template, error=erro, **contexto), 503))
+    resposta.headers['Retry-After'] = str(servico_senhas.retry_after)
+    return resposta
+
+# Controle de admissão (ver admissao.py): só os POST destas rotas passam por
+# ele. Vagas simultâneas no nó e balde de fichas por cliente (taxa por
+# segundo, rajada); o /health e as leituras ficam de fora.
+REGRAS_ADMISSAO = {
+    '/api/calcular-pegada': admissao.Regra(em_andamento=16, taxa=2.0, rajada=20),
+    '/api/calcular-pegada/lote': admissao.Regra(em_andamento=2, taxa=0.2, rajada=3),
+    '/api/salvar-quiz': admissao.Regra(em_andamento=16, taxa=1.0, rajada=10),
+    '/api/feedback': admissao.Regra(em_andamento=8, taxa=0.2, rajada=5),
+    '/login': admissao.Regra(em_andamento=8, taxa=0.2, rajada=10),
+    '/register': admissao.Regra(em_andamento=4, taxa=0.05, rajada=5),
+}
+controle_admissao = None
+if os.environ.get('ADMISSAO_ATIVA', '1') != '0':
+    controle_admissao = admissao.ControleAdmissao(
+        os.environ.get('ADMISSAO_DB', os.path.join(os.path.dirname(__file__), 'fecart', 'instance', 'admissao.db')),
+        REGRAS_ADMISSAO,
+        # Como no pool de senhas: sobra uma thread por worker para o /health e as leituras
+        limite_processo=int(os.environ.get('ADMISSAO_LIMITE_PROCESSO', max(THREADS_REQUISICAO - 1, 1))),
+        retry_after=int(os.environ.get('ADMISSAO_RETRY_AFTER', 1))
+    )
+    metricas_app.medir('verdetech_admissao_em_andamento', controle_admissao.em_andamento)
+# Proxies na frente do app que acrescentam o IP do cliente ao X-Forwarded-For (o do Render)
+PROXIES_CONFIAVEIS = int(os.environ.get('ADMISSAO_PROXIES', 1 if os.environ.get('RENDER') else 0))
+
+def _cliente_admissao():
+    """Dono do balde: o usuário logado ou, sem sessão, o IP de origem."""
+    if session.get('user_id'):
+        return f"usuario:{session['user_id']}"
+    encaminhado = [ip.strip() for ip in request.headers.get('X-Forwarded-For', '').split(',') if ip.strip()]
+    if PROXIES_CONFIAVEIS and len(encaminhado) >= PROXIES_CONFIAVEIS:
+        return encaminhado[-PROXIES_CONFIAVEIS]
+    return request.remote_addr or '-'
+
+def _resposta_recusada(recusa):
+    if recusa.status == 429:
+        erro = 'Muitas tentativas, aguarde alguns segundos e tente novamente'
+    else:
+        erro = 'Servidor ocupado, tente novamente em instantes'
+    rota = request.url_rule.rule
+    if rota == '/login':
+        resposta = current_app.make_response((render_template('login.html', error=erro,
+                                                      email=request.form.get('email', '').strip().lower()),
+                                      recusa.status))
+    elif rota == '/register':
+        resposta = current_app.make_response((render_template('cadastro.html', error=erro), recusa.status))
+    else:
+        resposta = current_app.make_response((jsonify({'error': erro}), recusa.status))
+    resposta.headers['Retry-After'] = str(recusa.retry_after)
+    return resposta
+
+@site.before_app_request
+def admitir_requisicao():
+    if controle_admissao is None or request.method != 'POST' or request.url_rule is None:
+        return None
+    rota = request.url_rule.rule
+    if rota not in REGRAS_ADMISSAO:
+        return None
+    try:
+        g.vaga_admissao = (rota, controle_admissao.admitir(rota, _cliente_admissao()))
+    except admissao.Recusada as recusa:
+        metricas_app.incrementar('verdetech_admissao_recusas_total', rota=rota, motivo=recusa.motivo)
+        return _resposta_recusada(recusa)
+    return None
+
+@site.teardown_app_request
+def liberar_admissao(_excecao):
+    vaga = g.pop('vaga_admissao', None)
+    if vaga is not None:
+        controle_admissao.liberar(*vaga)
 
 def login_required(fn):
     def wrapper(*args, **kwargs):
         if not session.get('user_id'):
-            return redirect(url_for('login'))
+            return redirect(url_for('site.login'))
         return fn(*args, **kwargs)
     wrapper.__name__ = fn.__name__
     return wrapper
 
-@app.route('/')
+# Páginas que não dependem da requisição: renderizadas uma vez por versão do
+# template no disco, com ETag forte e corpos já comprimidos
+_paginas_cache = {}
+_paginas_lock = threading.Lock()
+
+def _renderizar_pagina(template, mtime):
+    # Sem TEMPLATES_AUTO_RELOAD o Jinja não relê o arquivo sozinho
+    if not current_app.jinja_env.get_template(template).is_up_to_date:
+        current_app.jinja_env.cache.clear()
+    corpo = render_template(template).encode('utf-8')
+    etag = hashlib.sha256(corpo).hexdigest()[:32]
+    corpos = {None: corpo, 'gzip': gzip.compress(corpo, 9, mtime=0)}
+    if brotli is not None:
+        corpos['br'] = brotli.compress(corpo, quality=11)
+    return {'mtime': mtime, 'etag': etag, 'corpos': corpos}
+
+def pagina_estatica(template):
+    """Resposta de `template` a partir do cache, revalidado pelo mtime do arquivo."""
+    mtime = os.stat(os.path.join(current_app.root_path, current_app.template_folder, template)).st_mtime_ns
+    entrada = _paginas_cache.get(template)
+    if entrada is None or entrada['mtime'] != mtime:
+        with _paginas_lock:
+            entrada = _paginas_cache.get(template)
+            if entrada is None or entrada['mtime'] != mtime:
+                entrada = _paginas_cache[template] = _renderizar_pagina(template, mtime)
+
+    codificacao = next((c for c in ('br', 'gzip') if c in entrada['corpos'] and request.accept_encodings[c]), None)
+    # Cada codificação é uma representação diferente, com ETag próprio
+    etag = entrada['etag'] + ('-' + codificacao if codificacao else '')
+    if request.if_none_match.contains(etag):
+        resposta = Response(status=304)
+    else:
+        resposta = Response(entrada['corpos'][codificacao], mimetype='text/html')
+        if codificacao:
+            resposta.headers['Content-Encoding'] = codificacao
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'no-cache'
+    resposta.headers['Vary'] = 'Accept-Encoding'
+    return resposta
+
+@site.route('/')
 def index():
     try:
-        return render_template('index.html')
+        return pagina_estatica('index.html')
     except Exception as e:
         logger.error(f"Erro ao renderizar index.html: {e}")
         return f"Erro ao carregar página: {str(e)}", 500
 
-@app.route('/cadastro')
+@site.route('/cadastro')
 def cadastro():
     try:
-        return render_template('cadastro.html')
+        return pagina_estatica('cadastro.html')
     except Exception as e:
         logger.error(f"Erro ao renderizar cadastro.html: {e}")
         return f"Erro ao carregar página: {str(e)}", 500
 
-@app.route('/login', methods=['GET', 'POST'])
+@site.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form.get('email', '').strip().lower()
         password = request.form.get('password', '').strip()
         auth = Auth.query.filter_by(username=username).first()
-        if not auth:
+        if not auth or auth.usuario.excluido_em is not None:
             return render_template('login.html', error='Conta ainda não existe', email=username)
-        if not check_password_hash(auth.password_hash, password):
-            return render_template('login.html', error='Senha incorreta', email=username)
+        try:
+            if not servico_senhas.verificar(auth.password_hash, password):
+                return render_template('login.html', error='Senha incorreta', email=username)
+            novo_hash = servico_senhas.atualizar(auth.password_hash, password)
+        except senhas.PoolSaturado:
+            return _senhas_ocupadas('login.html', 'Servidor ocupado, tente novamente em instantes', email=username)
+        if novo_hash:
+            # Hash gravado com parâmetros antigos: troca pelo método atual
+            def atualizar_hash():
+                auth.password_hash = novo_hash
+            try:
+                banco.executar_com_retentativa(db.session, atualizar_hash)
+            except Exception as e:
+                logger.error(f"Erro ao atualizar hash de senha: {e}")
+        session.pop('secoes', None)
         session['user_id'] = auth.usuario_id
         session['username'] = auth.username
         session['nome'] = auth.usuario.nome
-        return redirect(url_for('login_success'))
+        return redirect(url_for('site.login_success'))
     return render_template('login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@site.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         nome = request.form.get('nome', '').strip()
@@ -186,81 +930,166 @@ def register():
         if Usuario.query.filter_by(email=email).first():
             return render_template('cadastro.html', error='E-mail já cadastrado')
         
-        usuario = Usuario(nome=nome, email=email)
-        db.session.add(usuario)
-        db.session.flush()
-        auth = Auth(usuario_id=usuario.id, username=email, password_hash=generate_password_hash(password))
-        db.session.add(auth)
-        db.session.commit()
-        return redirect(url_for('register_success'))
-    return redirect(url_for('cadastro'))
+        try:
+            password_hash = servico_senhas.gerar(password)
+        except senhas.PoolSaturado:
+            return _senhas_ocupadas('cadastro.html', 'Servidor ocupado, tente novamente em instantes')
+        
+        def gravar():
+            usuario = Usuario(nome=nome, email=email)
+            db.session.add(usuario)
+            db.session.flush()
+            db.session.add(Auth(usuario_id=usuario.id, username=email, password_hash=password_hash))
+        
+        banco.executar_com_retentativa(db.session, gravar)
+        invalidar_cache('usuarios')
+        return redirect(url_for('site.register_success'))
+    return redirect(url_for('site.cadastro'))
 
-@app.route('/login-success')
+@site.route('/login-success')
 def login_success():
     if not session.get('user_id'):
-        return redirect(url_for('login'))
+        return redirect(url_for('site.login'))
     return render_template('login_success.html', nome=session.get('nome'), username=session.get('username'))
 
-@app.route('/register-success')
+@site.route('/register-success')
 def register_success():
     return render_template('register_success.html')
 
-@app.route('/logout')
+@site.route('/logout')
 def logout():
     session.clear()
-    return redirect(url_for('login'))
+    return redirect(url_for('site.login'))
 
-@app.route('/minha-conta')
+@site.route('/minha-conta')
 def minha_conta():
     if not session.get('user_id'):
-        return redirect(url_for('login'))
+        return redirect(url_for('site.login'))
     usuario_id = session.get('user_id')
     usuario = Usuario.query.get(usuario_id)
     return render_template('minha_conta.html', usuario=usuario, email=session.get('username'))
 
-@app.route('/api/me')
+@site.route('/api/me')
 def api_me():
     if not session.get('user_id'):
         return jsonify({'authenticated': False})
     return jsonify({'authenticated': True, 'id': session['user_id'], 'username': session.get('username'), 'nome': session.get('nome')})
 
-@app.route('/curiosidades')
+def _consulta_mais_recente(modelo, coluna_data, usuario_id, *colunas):
+    return (select(*colunas).where(modelo.usuario_id == usuario_id)
+            .order_by(coluna_data.desc(), modelo.id.desc()).limit(1))
+
+def _mais_recente(modelo, coluna_data, usuario_id, *colunas):
+    """Linha mais recente do usuário (pelo índice usuario_id, data), ou None."""
+    return db.session.execute(_consulta_mais_recente(modelo, coluna_data, usuario_id, *colunas),
+                              bind_arguments=leitura()).first()
+
+def _resumo_sessao(usuario_id):
+    pegada = _mais_recente(PegadaCarbono, PegadaCarbono.data_calculo, usuario_id,
+                           PegadaCarbono.id, PegadaCarbono.total_co2, PegadaCarbono.data_calculo)
+    quiz = _mais_recente(ResultadoQuiz, ResultadoQuiz.data_realizacao, usuario_id, ResultadoQuiz.id,
+                         ResultadoQuiz.pontuacao, ResultadoQuiz.total_perguntas, ResultadoQuiz.data_realizacao)
+    feedback = db.session.execute(select(Feedback).where(Feedback.usuario_id == usuario_id),
+                                  bind_arguments=leitura()).scalars().first()
+    pontuacao = db.session.execute(select(PontuacaoUsuario).where(PontuacaoUsuario.usuario_id == usuario_id),
+                                   bind_arguments=leitura()).scalars().first()
+    conquistas = gamificacao.listar(pontuacao.conquistas if pontuacao else 0)
+    return {
+        'ultima_pegada': {
+            'id': pegada.id,
+            'total_co2': pegada.total_co2,
+            'data_calculo': _formatar_data(pegada.data_calculo)
+        } if pegada else None,
+        'ultimo_quiz': {
+            'id': quiz.id,
+            'pontuacao': quiz.pontuacao,
+            'total_perguntas': quiz.total_perguntas,
+            'data_realizacao': _formatar_data(quiz.data_realizacao)
+        } if quiz else None,
+        'feedback': _feedback_json(feedback) if feedback else None,
+        'conquistas': {
+            'pontos': pontuacao.pontos if pontuacao else 0,
+            'desbloqueadas': sum(1 for c in conquistas if c['desbloqueada']),
+            'total': len(conquistas),
+            'ids': [c['id'] for c in conquistas if c['desbloqueada']]
+        }
+    }
+
+@site.route('/api/bootstrap')
+def api_bootstrap():
+    """O que os scripts de uma página pedem sobre a sessão, em uma requisição só.
+
+    A identidade (como /api/me) e, com login, a última pegada e o último quiz
+    ainda no banco (os arquivados não entram), o feedback (como GET
+    /api/feedback) e os pontos e as conquistas desbloqueadas. O corpo inclui a identidade,
+    então o ETag é por sessão; a resposta é `private` e o sessao.js a
+    reaproveita durante a página.
+    """
+    usuario_id = session.get('user_id')
+    dados = {'authenticated': False}
+    if usuario_id:
+        dados = {'authenticated': True, 'id': usuario_id, 'username': session.get('username'),
+                 'nome': session.get('nome'), **_resumo_sessao(usuario_id)}
+    resposta = jsonify(dados)
+    etag = hashlib.sha1(resposta.get_data()).hexdigest()
+    if not is_resource_modified(request.environ, etag=etag):
+        resposta = Response(status=304)
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    return resposta
+
+@site.route('/curiosidades')
 def curiosidades():
-    return render_template('curiosidades.html')
+    return pagina_estatica('curiosidades.html')
 
 ## Página maquete removida
 
-@app.route('/carbono')
+@site.route('/carbono')
 def carbono():
-    return render_template('carbono.html')
+    return pagina_estatica('carbono.html')
 
-@app.route('/quiz')
+@site.route('/quiz')
 def quiz():
-    return render_template('quiz.html')
+    return pagina_estatica('quiz.html')
+
+# Cache dos fatores de emissão vigentes; revalidado no banco a cada FATORES_TTL segundos
+FATORES_TTL = 60
+_fatores_cache = {'versao': None, 'fatores': None, 'verificado_em': 0.0}
 
-@app.route('/api/calcular-pegada', methods=['POST'])
+def fatores_emissao():
+    """Retorna (versao, fatores) vigentes, lidos uma vez e mantidos em cache."""
+    if _fatores_cache['fatores'] is None or time.monotonic() - _fatores_cache['verificado_em'] >= FATORES_TTL:
+        atual = db.session.execute(
+            select(FatorEmissao).order_by(FatorEmissao.versao.desc()).limit(1)
+        ).scalar()
+        if atual is None:
+            versao, fatores = 0, dict(FATORES_PADRAO)
+        else:
+            versao, fatores = atual.versao, {c: getattr(atual, c) for c in CATEGORIAS_PEGADA}
+        _fatores_cache.update(versao=versao, fatores=fatores, verificado_em=time.monotonic())
+    return _fatores_cache['versao'], _fatores_cache['fatores']
+
+@site.route('/api/calcular-pegada', methods=['POST'])
 def calcular_pegada():
     try:
         data = request.get_json()
         
-        co2_transporte = data['transporte'] * 0.21
-        co2_energia = data['energia'] * 0.5
-        co2_alimentacao = data['alimentacao'] * 2.5
-        co2_lixo = data['lixo'] * 10
+        _, fatores = fatores_emissao()
+        co2_transporte = data['transporte'] * fatores['transporte']
+        co2_energia = data['energia'] * fatores['energia']
+        co2_alimentacao = data['alimentacao'] * fatores['alimentacao']
+        co2_lixo = data['lixo'] * fatores['lixo']
         
         total_co2 = co2_transporte + co2_energia + co2_alimentacao + co2_lixo
         
-        usuario_id = session.get('user_id')
-        nova_pegada = PegadaCarbono(
-            usuario_id=usuario_id,
-            transporte=data['transporte'],
-            energia=data['energia'],
-            alimentacao=data['alimentacao'],
-            lixo=data['lixo'],
-            total_co2=total_co2
-        )
-        db.session.add(nova_pegada)
-        db.session.commit()
+        pegada_id = _registrar_atividade('pegada', {
+            'usuario_id': session.get('user_id'),
+            'transporte': data['transporte'],
+            'energia': data['energia'],
+            'alimentacao': data['alimentacao'],
+            'lixo': data['lixo'],
+            'total_co2': total_co2
+        })
         
         return jsonify({
             'transporte': round(co2_transporte, 2),
@@ -268,147 +1097,942 @@ def calcular_pegada():
             'alimentacao': round(co2_alimentacao, 2),
             'lixo': round(co2_lixo, 2),
             'total': round(total_co2, 2),
-            'id': nova_pegada.id
+            'id': pegada_id
         })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
-@app.route('/api/salvar-quiz', methods=['POST'])
+# Limite de linhas por envio em lote (JSON ou CSV)
+LIMITE_LOTE_PEGADAS = 50000
+
+def _ler_lote_pegadas():
+    """Lê o lote do corpo JSON (lista ou {'registros': [...]}) ou do CSV enviado em `arquivo`.
+
+    Retorna uma matriz (n, 4) na ordem de CATEGORIAS_PEGADA. Lança ValueError
+    com uma mensagem para o usuário quando a entrada é inválida.
+    """
+    arquivo = request.files.get('arquivo')
+    if arquivo is not None:
+        texto = arquivo.read().decode('utf-8-sig')
+        try:
+            dialeto = csv.Sniffer().sniff(texto[:4096], delimiters=';,')
+        except csv.Error:
+            dialeto = csv.excel
+        registros = csv.DictReader(io.StringIO(texto), dialect=dialeto)
+        # Planilhas brasileiras usam ';' como separador e ',' como decimal
+        decimal_virgula = dialeto.delimiter == ';'
+    else:
+        data = request.get_json(silent=True)
+        registros = data.get('registros') if isinstance(data, dict) else data
+        if not isinstance(registros, list):
+            raise ValueError("Envie uma lista de registros ou um CSV no campo 'arquivo'")
+        decimal_virgula = False
+
+    linhas = []
+    for numero, registro in enumerate(registros, start=1):
+        if numero > LIMITE_LOTE_PEGADAS:
+            raise ValueError(f'O lote pode ter no máximo {LIMITE_LOTE_PEGADAS} linhas')
+        try:
+            valores = [registro[c] for c in CATEGORIAS_PEGADA]
+            if decimal_virgula:
+                valores = [v.replace(',', '.') for v in valores]
+            linhas.append([float(v) for v in valores])
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ValueError(f'Linha {numero} inválida: informe {", ".join(CATEGORIAS_PEGADA)} numéricos')
+    if not linhas:
+        raise ValueError('O lote está vazio')
+
+    matriz = np.asarray(linhas, dtype=np.float64)
+    if not np.isfinite(matriz).all() or (matriz < 0).any():
+        raise ValueError('Os valores devem ser números não negativos')
+    # alimentacao e lixo são inteiros no banco; o cálculo usa o valor gravado
+    matriz[:, 2:] = np.rint(matriz[:, 2:])
+    return matriz
+
+def calcular_pegadas(matriz, fatores):
+    """Calcula as parcelas (n, 4) e os totais (n,) de uma matriz de entradas."""
+    vetor = np.array([fatores[c] for c in CATEGORIAS_PEGADA], dtype=np.float64)
+    parcelas = matriz * vetor
+    return parcelas, parcelas.sum(axis=1)
+
+@site.route('/api/calcular-pegada/lote', methods=['POST'])
+def calcular_pegada_lote():
+    """Calcula e grava várias pegadas de uma vez (JSON ou CSV de escolas e parceiros)."""
+    try:
+        matriz = _ler_lote_pegadas()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    versao, fatores = fatores_emissao()
+    parcelas, totais = calcular_pegadas(matriz, fatores)
+
+    try:
+        usuario_id = session.get('user_id')
+        agora = datetime.utcnow()
+        entradas = matriz.tolist()
+        linhas = [{
+            'usuario_id': usuario_id,
+            'transporte': transporte,
+            'energia': energia,
+            'alimentacao': int(alimentacao),
+            'lixo': int(lixo),
+            'total_co2': total,
+            'data_calculo': agora
+        } for (transporte, energia, alimentacao, lixo), total in zip(entradas, totais.tolist())]
+
+        def gravar():
+            db.session.execute(insert(PegadaCarbono), linhas)
+            atualizar_estatisticas('pegada', linhas)
+            atualizar_conquistas('pegada', linhas)
+
+        banco.executar_com_retentativa(db.session, gravar)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+    arredondadas = np.round(parcelas, 2).tolist()
+    return jsonify({
+        'versao_fatores': versao,
+        'quantidade': len(totais),
+        'resultados': [
+            dict(zip(CATEGORIAS_PEGADA, linha), total=total)
+            for linha, total in zip(arredondadas, np.round(totais, 2).tolist())
+        ],
+        'estatisticas': {
+            'soma': round(float(totais.sum()), 2),
+            'media': round(float(totais.mean()), 2),
+            'mediana': round(float(np.median(totais)), 2),
+            'desvio_padrao': round(float(totais.std()), 2),
+            'minimo': round(float(totais.min()), 2),
+            'maximo': round(float(totais.max()), 2),
+            'p90': round(float(np.percentile(totais, 90)), 2),
+            'media_por_categoria': dict(zip(CATEGORIAS_PEGADA, np.round(parcelas.mean(axis=0), 2).tolist()))
+        }
+    })
+
+@site.route('/admin/fatores-emissao', methods=['GET', 'POST'])
+@login_required
+def admin_fatores_emissao():
+    """Lista as versões dos fatores de emissão ou cria uma nova versão."""
+    # Verificar se é o admin autorizado
+    if session.get('username') != 'guinavasconi@gmail.com':
+        return jsonify({'error': 'Acesso negado'}), 403
+
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            fatores = {c: float(data[c]) for c in CATEGORIAS_PEGADA}
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': f'Informe {", ".join(CATEGORIAS_PEGADA)} numéricos'}), 400
+        if any(f < 0 for f in fatores.values()):
+            return jsonify({'error': 'Os fatores não podem ser negativos'}), 400
+        nova = FatorEmissao(**fatores)
+        db.session.add(nova)
+        db.session.commit()
+        # Os demais workers passam a usar a nova versão em até FATORES_TTL segundos
+        _fatores_cache.update(versao=nova.versao, fatores=fatores, verificado_em=time.monotonic())
+        return jsonify({'message': 'Fatores atualizados', 'versao': nova.versao})
+
+    versoes = db.session.execute(select(FatorEmissao).order_by(FatorEmissao.versao.desc())).scalars()
+    return jsonify([{
+        'versao': f.versao,
+        **{c: getattr(f, c) for c in CATEGORIAS_PEGADA},
+        'data_criacao': f.data_criacao.strftime('%Y-%m-%d %H:%M:%S')
+    } for f in versoes])
+
+@site.route('/api/salvar-quiz', methods=['POST'])
 def salvar_quiz():
     try:
         data = request.get_json()
         
-        usuario_id = session.get('user_id')
-        novo_resultado = ResultadoQuiz(
-            usuario_id=usuario_id,
-            pontuacao=data['pontuacao'],
-            total_perguntas=data['total_perguntas']
-        )
-        db.session.add(novo_resultado)
-        db.session.commit()
+        resultado_id = _registrar_atividade('quiz', {
+            'usuario_id': session.get('user_id'),
+            'pontuacao': data['pontuacao'],
+            'total_perguntas': data['total_perguntas']
+        })
         
         return jsonify({
             'message': 'Resultado salvo com sucesso!',
-            'id': novo_resultado.id
+            'id': resultado_id
         })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
-@app.route('/admin/dados')
-def admin_dados():
-    pegadas = PegadaCarbono.query.all()
-    resultados = ResultadoQuiz.query.all()
-    
-    dados = {
-        'pegadas_carbono': [{
-            'id': p.id,
-            'transporte': p.transporte,
-            'energia': p.energia,
-            'alimentacao': p.alimentacao,
-            'lixo': p.lixo,
-            'total_co2': p.total_co2,
-            'data_calculo': p.data_calculo.strftime('%Y-%m-%d %H:%M:%S')
-        } for p in pegadas],
-        'resultados_quiz': [{
-            'id': r.id,
-            'pontuacao': r.pontuacao,
-            'total_perguntas': r.total_perguntas,
-            'data_realizacao': r.data_realizacao.strftime('%Y-%m-%d %H:%M:%S')
-        } for r in resultados]
+def _parse_data(valor, fim_do_dia=False):
+    """Converte 'AAAA-MM-DD' em datetime; com fim_do_dia, retorna o início do dia seguinte."""
+    if not valor:
+        return None
+    data = datetime.strptime(valor, '%Y-%m-%d')
+    return data + timedelta(days=1) if fim_do_dia else data
+
+LIMITE_PAGINA_PADRAO = 100
+LIMITE_PAGINA_MAXIMO = 1000
+
+def _parametros_paginacao():
+    """Lê limit, de, ate e usuario_id da query string (ValueError se inválidos)."""
+    limite = int(request.args.get('limit', LIMITE_PAGINA_PADRAO))
+    if limite < 1:
+        raise ValueError('limit deve ser positivo')
+    usuario_id = request.args.get('usuario_id')
+    return {
+        'limite': min(limite, LIMITE_PAGINA_MAXIMO),
+        'de': _parse_data(request.args.get('de')),
+        'ate': _parse_data(request.args.get('ate'), fim_do_dia=True),
+        'usuario_id': int(usuario_id) if usuario_id else None
     }
-    
-    return jsonify(dados)
 
-@app.route('/admin/relatorio')
-def admin_relatorio():
-    relatorio = []
-    usuarios = Usuario.db.session.query(Usuario).all() if hasattr(Usuario, 'db') else Usuario.query.all()
-    for u in usuarios:
-        pegada = (
-            PegadaCarbono.query
-            .filter_by(usuario_id=u.id)
-            .order_by(PegadaCarbono.data_calculo.desc(), PegadaCarbono.id.desc())
-            .first()
-        )
-        quiz = (
-            ResultadoQuiz.query
-            .filter_by(usuario_id=u.id)
-            .order_by(ResultadoQuiz.data_realizacao.desc(), ResultadoQuiz.id.desc())
-            .first()
-        )
-        feedback = (
-            Feedback.query
-            .filter_by(usuario_id=u.id)
-            .order_by(Feedback.data_feedback.desc(), Feedback.id.desc())
-            .first()
-        )
-        relatorio.append({
-            'id': u.id,
-            'nome': u.nome,
-            'email': u.email,
-            'data_cadastro': u.data_cadastro.strftime('%Y-%m-%d %H:%M:%S') if u.data_cadastro else None,
-            'pegada_total_co2': round(pegada.total_co2, 2) if pegada else None,
-            'quiz_pontuacao': quiz.pontuacao if quiz else None,
-            'quiz_total_perguntas': quiz.total_perguntas if quiz else None,
-            'ultima_pegada': pegada.data_calculo.strftime('%Y-%m-%d %H:%M:%S') if pegada else None,
-            'ultimo_quiz': quiz.data_realizacao.strftime('%Y-%m-%d %H:%M:%S') if quiz else None,
-            'ultimo_feedback': feedback.data_feedback.strftime('%Y-%m-%d %H:%M:%S') if feedback else None
-        })
-    return jsonify(relatorio)
+def _consulta_pagina(modelo, coluna_data, apos_id, limite, de=None, ate=None, usuario_id=None, consulta=None):
+    consulta = consulta if consulta is not None else select(modelo)
+    if apos_id is not None:
+        consulta = consulta.where(modelo.id < apos_id)
+    if de is not None:
+        consulta = consulta.where(coluna_data >= de)
+    if ate is not None:
+        consulta = consulta.where(coluna_data < ate)
+    if usuario_id is not None:
+        consulta = consulta.where(modelo.usuario_id == usuario_id)
+    return consulta.order_by(modelo.id.desc()).limit(limite + 1)
 
-@app.route('/admin/relatorio.csv')
-def admin_relatorio_csv():
-    rows = []
-    usuarios = Usuario.query.all()
-    for u in usuarios:
-        pegada = (
-            PegadaCarbono.query
-            .filter_by(usuario_id=u.id)
-            .order_by(PegadaCarbono.data_calculo.desc(), PegadaCarbono.id.desc())
-            .first()
+def _pagina(modelo, coluna_data, apos_id, limite, **filtros):
+    """Busca uma página em ordem decrescente de id (mais recentes primeiro).
+
+    `apos_id` é o cursor: o último id da página anterior. Retorna as linhas e
+    o cursor da próxima página (None quando acabou).
+    """
+    linhas = db.session.execute(_consulta_pagina(modelo, coluna_data, apos_id, limite, **filtros),
+                                bind_arguments=leitura()).all()
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        # A primeira coluna é o registro do ORM ou, nas consultas colunares, o id
+        ultimo = linhas[-1][0]
+        return linhas, ultimo if isinstance(ultimo, int) else ultimo.id
+    return linhas, None
+
+def _pagina_arquivada(tipo, apos_id, limite, de=None, ate=None, usuario_id=None):
+    """Até limite+1 linhas arquivadas (dicts) com os filtros de _consulta_pagina, maiores ids primeiro."""
+    coluna_data = TIPOS_INGESTAO[tipo][1]
+    partes = []
+    for colunas in arquivo_historico.ler(tipo):
+        filtro = np.ones(len(colunas['id']), dtype=bool)
+        if apos_id is not None:
+            filtro &= colunas['id'] < apos_id
+        if de is not None:
+            filtro &= colunas[coluna_data] >= np.datetime64(de)
+        if ate is not None:
+            filtro &= colunas[coluna_data] < np.datetime64(ate)
+        if usuario_id is not None:
+            filtro &= colunas['usuario_id'] == usuario_id
+        indices = np.flatnonzero(filtro)
+        if indices.size:
+            indices = indices[np.argsort(colunas['id'][indices])[::-1][:limite + 1]]
+            partes.append({nome: valores[indices] for nome, valores in colunas.items()})
+    if not partes:
+        return []
+    juntas = {nome: np.concatenate([parte[nome] for parte in partes]) for nome in partes[0]}
+    ordem = np.argsort(juntas['id'])[::-1][:limite + 1]
+    return _para_linhas({nome: valores[ordem] for nome, valores in juntas.items()})
+
+def _pagina_com_arquivo(modelo, coluna_data, apos_id, limite, **filtros):
+    """Como _pagina, mas junta as linhas do banco com as do arquivo de histórico."""
+    tipo = next(t for t, (m, _) in TIPOS_INGESTAO.items() if m is modelo)
+    vivas = db.session.execute(_consulta_pagina(modelo, coluna_data, apos_id, limite, **filtros),
+                               bind_arguments=leitura()).scalars().all()
+    # Acesso por atributo, como nos registros do banco
+    arquivadas = [SimpleNamespace(**linha) for linha in _pagina_arquivada(tipo, apos_id, limite, **filtros)]
+    linhas = sorted(vivas + arquivadas, key=lambda linha: linha.id, reverse=True)
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        return [(linha,) for linha in linhas], linhas[-1].id
+    return [(linha,) for linha in linhas], None
+
+def _resposta_condicional(assinaturas, gerar):
+    """Responde 304 se o cliente já tem a versão atual; senão chama `gerar()`.
+
+    O ETag combina as assinaturas das tabelas com os parâmetros da consulta, e
+    o Last-Modified é a data mais recente entre elas.
+    """
+    parametros = sorted(request.args.items(multi=True))
+    etag = hashlib.sha1(repr((assinaturas, parametros)).encode('utf-8')).hexdigest()
+    ultima_modificacao = max((a[2] for a in assinaturas if a[2]), default=None)
+    if ultima_modificacao is not None:
+        ultima_modificacao = ultima_modificacao.replace(microsecond=0)
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=ultima_modificacao):
+        resposta = Response(status=304)
+    else:
+        resposta = gerar()
+    resposta.set_etag(etag)
+    resposta.last_modified = ultima_modificacao
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    return resposta
+
+def _resposta_em_cache(fontes, gerar):
+    """Como _resposta_condicional, mas guardando a resposta no cache compartilhado.
+
+    `fontes` são as partes do banco de que a resposta depende ('usuarios',
+    'atividades', 'feedbacks'). O ETag vem das gerações delas e o
+    Last-Modified da última invalidação, então validar (304) ou servir do
+    cache não consulta o banco; só uma falta chama `gerar()`. Com o cache
+    fora do ar a resposta é gerada normalmente. Acertos, faltas e validações
+    vão para /metrics.
+    """
+    chave = f'{request.path}?{urlencode(sorted(request.args.items(multi=True)))}'
+    try:
+        geracoes, alterado_em = cache_respostas.versao(*fontes)
+    except sqlite3.Error as e:
+        logger.error(f"Cache de respostas indisponível: {e}")
+        return gerar()
+    etag = hashlib.sha1(repr((chave, geracoes)).encode('utf-8')).hexdigest()
+    # Arredondada para cima, e só depois que o segundo termina: antes disso
+    # uma nova invalidação cairia na mesma data, e o If-Modified-Since de quem
+    # recebeu a versão anterior daria 304 (até lá vale só o ETag)
+    ultima_modificacao = math.ceil(alterado_em)
+    ultima_modificacao = datetime.utcfromtimestamp(ultima_modificacao) if ultima_modificacao <= time.time() else None
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=ultima_modificacao):
+        resposta, resultado = Response(status=304), 'validacao'
+    else:
+        try:
+            guardada = cache_respostas.obter(chave, geracoes)
+        except sqlite3.Error as e:
+            logger.error(f"Erro ao ler o cache de respostas: {e}")
+            guardada = None
+        if guardada is not None:
+            resposta, resultado = Response(guardada[1], content_type=guardada[0]), 'acerto'
+        else:
+            resposta, resultado = gerar(), 'falta'
+            if resposta.status_code == 200:
+                try:
+                    cache_respostas.gravar(chave, geracoes, resposta.content_type, resposta.get_data())
+                except sqlite3.Error as e:
+                    logger.error(f"Erro ao gravar no cache de respostas: {e}")
+    metricas_app.incrementar('verdetech_cache_consultas_total', rota=request.url_rule.rule, resultado=resultado)
+    resposta.set_etag(etag)
+    if ultima_modificacao is not None:
+        # Atribuir None não tira o cabeçalho: o Werkzeug grava a hora atual
+        resposta.last_modified = ultima_modificacao
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    return resposta
+
+def _formato_colunar():
+    """Se a resposta foi pedida com `format=columnar` (ver colunar.py); ValueError para outro formato."""
+    formato = request.args.get('format')
+    if formato not in (None, 'json', 'columnar'):
+        raise ValueError(f'Formato inválido: {formato}')
+    return formato == 'columnar'
+
+CAMPOS_PEGADA = ('id', 'usuario_id', 'transporte', 'energia', 'alimentacao', 'lixo', 'total_co2', 'data_calculo')
+CAMPOS_QUIZ = ('id', 'usuario_id', 'pontuacao', 'total_perguntas', 'data_realizacao')
+
+def _cursor_dados(valor):
+    """O cursor de /admin/dados é 'id_pegada:id_quiz'; 0 indica lista esgotada."""
+    if not valor:
+        return None, None
+    pegada, quiz = valor.split(':')
+    return (int(pegada) if pegada else None), (int(quiz) if quiz else None)
+
+@site.route('/admin/dados')
+def admin_dados():
+    """Lista pegadas e resultados de quiz, paginados (mais recentes primeiro).
+
+    Parâmetros: `limit`, `after` (cursor devolvido em `proximo`), `de`/`ate`
+    (AAAA-MM-DD), `usuario_id`, `arquivo=1` para incluir as atividades já
+    movidas para o arquivo de histórico e `format=columnar` para receber as
+    listas no formato colunar.
+    """
+    try:
+        filtros = _parametros_paginacao()
+        apos_pegada, apos_quiz = _cursor_dados(request.args.get('after'))
+    except ValueError:
+        return jsonify({'error': 'Parâmetros de paginação inválidos'}), 400
+    try:
+        formato_colunar = _formato_colunar()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    pagina = _pagina_com_arquivo if request.args.get('arquivo') == '1' else _pagina
+
+    def ler_colunar(modelo, coluna_data, apos_id, campos):
+        datas = (coluna_data.key,)
+        if pagina is _pagina:
+            linhas, proximo = _pagina(modelo, coluna_data, apos_id,
+                                      consulta=colunar.selecionar(modelo, campos, datas), **filtros)
+        else:
+            registros, proximo = pagina(modelo, coluna_data, apos_id, **filtros)
+            linhas = colunar.de_registros((r for (r,) in registros), campos, datas)
+        return colunar.codificar(linhas, campos, datas), proximo
+
+    def gerar():
+        if formato_colunar:
+            pegadas, proxima_pegada = ler_colunar(PegadaCarbono, PegadaCarbono.data_calculo, apos_pegada,
+                                                  CAMPOS_PEGADA)
+            resultados, proximo_quiz = ler_colunar(ResultadoQuiz, ResultadoQuiz.data_realizacao, apos_quiz,
+                                                   CAMPOS_QUIZ)
+        else:
+            linhas, proxima_pegada = pagina(PegadaCarbono, PegadaCarbono.data_calculo, apos_pegada, **filtros)
+            pegadas = [{
+                'id': p.id,
+                'usuario_id': p.usuario_id,
+                'transporte': p.transporte,
+                'energia': p.energia,
+                'alimentacao': p.alimentacao,
+                'lixo': p.lixo,
+                'total_co2': p.total_co2,
+                'data_calculo': p.data_calculo.strftime('%Y-%m-%d %H:%M:%S')
+            } for (p,) in linhas]
+            linhas, proximo_quiz = pagina(ResultadoQuiz, ResultadoQuiz.data_realizacao, apos_quiz, **filtros)
+            resultados = [{
+                'id': r.id,
+                'usuario_id': r.usuario_id,
+                'pontuacao': r.pontuacao,
+                'total_perguntas': r.total_perguntas,
+                'data_realizacao': r.data_realizacao.strftime('%Y-%m-%d %H:%M:%S')
+            } for (r,) in linhas]
+        proximo = None
+        if proxima_pegada or proximo_quiz:
+            proximo = f'{proxima_pegada or 0}:{proximo_quiz or 0}'
+        return jsonify({'pegadas_carbono': pegadas, 'resultados_quiz': resultados, 'proximo': proximo})
+
+    return _resposta_em_cache(('atividades',), gerar)
+
+def _ultimo_por_usuario(modelo, coluna_data, *colunas, apos_id=None, ate_id=None):
+    """Subconsulta com o registro mais recente de `modelo` para cada usuário.
+
+    Usa ROW_NUMBER() particionado por usuário, na mesma ordem das consultas
+    antigas (data desc, id desc); a linha mais recente fica com ordem = 1.
+    `apos_id`/`ate_id` restringem a janela a uma faixa de usuários.
+    """
+    ordem = func.row_number().over(
+        partition_by=modelo.usuario_id,
+        order_by=(coluna_data.desc(), modelo.id.desc())
+    ).label('ordem')
+    consulta = select(modelo.usuario_id, *colunas, ordem).where(modelo.usuario_id.isnot(None))
+    if apos_id is not None:
+        consulta = consulta.where(modelo.usuario_id > apos_id)
+    if ate_id is not None:
+        consulta = consulta.where(modelo.usuario_id <= ate_id)
+    return consulta.subquery()
+
+def _filtrar_usuarios(consulta, apos_id=None, ate_id=None, cadastro_de=None, cadastro_ate=None):
+    # Usuários marcados para exclusão já não aparecem, mesmo antes do expurgo
+    consulta = consulta.where(Usuario.excluido_em.is_(None))
+    if apos_id is not None:
+        consulta = consulta.where(Usuario.id > apos_id)
+    if ate_id is not None:
+        consulta = consulta.where(Usuario.id <= ate_id)
+    if cadastro_de is not None:
+        consulta = consulta.where(Usuario.data_cadastro >= cadastro_de)
+    if cadastro_ate is not None:
+        consulta = consulta.where(Usuario.data_cadastro < cadastro_ate)
+    return consulta
+
+def consulta_relatorio(apos_id=None, ate_id=None, cadastro_de=None, cadastro_ate=None, formato_colunar=False):
+    """Monta a consulta única do relatório de usuários.
+
+    Antes eram 3 consultas por usuário (N+1); agora cada tabela de atividade
+    é lida uma vez e juntada ao usuário pela linha mais recente. Os filtros
+    permitem paginar por faixa de id (keyset) e por data de cadastro. Com
+    `formato_colunar` as colunas saem na ordem de CAMPOS_RELATORIO, com as
+    datas em segundos.
+    """
+    faixa = {'apos_id': apos_id, 'ate_id': ate_id}
+    pegada = _ultimo_por_usuario(PegadaCarbono, PegadaCarbono.data_calculo,
+                                 PegadaCarbono.total_co2, PegadaCarbono.data_calculo, **faixa)
+    quiz = _ultimo_por_usuario(ResultadoQuiz, ResultadoQuiz.data_realizacao,
+                               ResultadoQuiz.pontuacao, ResultadoQuiz.total_perguntas,
+                               ResultadoQuiz.data_realizacao, **faixa)
+    feedback = _ultimo_por_usuario(Feedback, Feedback.data_feedback, Feedback.data_feedback, **faixa)
+
+    if formato_colunar:
+        colunas = (
+            Usuario.id, Usuario.nome, Usuario.email, colunar.epoch(Usuario.data_cadastro),
+            pegada.c.total_co2, quiz.c.pontuacao, quiz.c.total_perguntas,
+            colunar.epoch(pegada.c.data_calculo), colunar.epoch(quiz.c.data_realizacao),
+            colunar.epoch(feedback.c.data_feedback)
         )
-        quiz = (
-            ResultadoQuiz.query
-            .filter_by(usuario_id=u.id)
-            .order_by(ResultadoQuiz.data_realizacao.desc(), ResultadoQuiz.id.desc())
-            .first()
+    else:
+        colunas = (
+            Usuario.id, Usuario.nome, Usuario.email, Usuario.data_cadastro,
+            pegada.c.total_co2, pegada.c.data_calculo,
+            quiz.c.pontuacao, quiz.c.total_perguntas, quiz.c.data_realizacao,
+            feedback.c.data_feedback
         )
-        rows.append({
-            'id': u.id,
-            'nome': u.nome,
-            'email': u.email,
-            'pegada_total_co2': round(pegada.total_co2, 2) if pegada else '',
-            'quiz_pontuacao': quiz.pontuacao if quiz else '',
-            'quiz_total_perguntas': quiz.total_perguntas if quiz else ''
-        })
+    consulta = (
+        select(*colunas)
+        .outerjoin(pegada, and_(pegada.c.usuario_id == Usuario.id, pegada.c.ordem == 1))
+        .outerjoin(quiz, and_(quiz.c.usuario_id == Usuario.id, quiz.c.ordem == 1))
+        .outerjoin(feedback, and_(feedback.c.usuario_id == Usuario.id, feedback.c.ordem == 1))
+        .order_by(Usuario.id)
+    )
+    return _filtrar_usuarios(consulta, cadastro_de=cadastro_de, cadastro_ate=cadastro_ate, **faixa)
+
+def consultar_relatorio(**filtros):
+    return db.session.execute(consulta_relatorio(**filtros), bind_arguments=leitura())
+
+def _formatar_data(valor):
+    return valor.strftime('%Y-%m-%d %H:%M:%S') if valor else None
+
+def _linha_relatorio(linha):
+    return {
+        'id': linha.id,
+        'nome': linha.nome,
+        'email': linha.email,
+        'data_cadastro': _formatar_data(linha.data_cadastro),
+        'pegada_total_co2': round(linha.total_co2, 2) if linha.total_co2 is not None else None,
+        'quiz_pontuacao': linha.pontuacao,
+        'quiz_total_perguntas': linha.total_perguntas,
+        'ultima_pegada': _formatar_data(linha.data_calculo),
+        'ultimo_quiz': _formatar_data(linha.data_realizacao),
+        'ultimo_feedback': _formatar_data(linha.data_feedback)
+    }
+
+@site.route('/admin/relatorio')
+def admin_relatorio():
+    """Relatório de todos os usuários; `format=columnar` devolve o formato colunar (ver colunar.py)."""
+    try:
+        formato_colunar = _formato_colunar()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def gerar():
+        if formato_colunar:
+            resposta = colunar.codificar(consultar_relatorio(formato_colunar=True).all(),
+                                         CAMPOS_RELATORIO, DATAS_RELATORIO)
+            # Arredondado no Python, como no formato de linhas (o round do SQLite difere nos empates)
+            resposta['colunas']['pegada_total_co2'] = [
+                round(co2, 2) if co2 is not None else None for co2 in resposta['colunas']['pegada_total_co2']
+            ]
+            return jsonify(resposta)
+        return jsonify([_linha_relatorio(linha) for linha in consultar_relatorio()])
+
+    return _resposta_em_cache(('usuarios', 'atividades', 'feedbacks'), gerar)
+
+# Campos disponíveis na exportação CSV (os padrões são os do relatório original)
+CAMPOS_RELATORIO = [
+    'id', 'nome', 'email', 'data_cadastro', 'pegada_total_co2', 'quiz_pontuacao',
+    'quiz_total_perguntas', 'ultima_pegada', 'ultimo_quiz', 'ultimo_feedback'
+]
+DATAS_RELATORIO = ('data_cadastro', 'ultima_pegada', 'ultimo_quiz', 'ultimo_feedback')
+CAMPOS_CSV_PADRAO = ['id', 'nome', 'email', 'pegada_total_co2', 'quiz_pontuacao', 'quiz_total_perguntas']
+TAMANHO_LOTE_CSV = 1000
+
+def _gerar_relatorio_csv(campos, cadastro_de=None, cadastro_ate=None, compactar=False):
+    """Gera o CSV em pedaços, um lote de usuários por vez (paginação por id).
+
+    O buffer é esvaziado a cada lote, então a memória usada não depende do
+    tamanho da tabela de usuários.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=campos, delimiter=';', extrasaction='ignore')
+    compressor = zlib.compressobj(wbits=31) if compactar else None
+    filtros = {'cadastro_de': cadastro_de, 'cadastro_ate': cadastro_ate}
+
+    def esvaziar():
+        pedaco = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate(0)
+        return compressor.compress(pedaco) if compressor else pedaco
 
-    output = io.StringIO()
-    fieldnames = ['id', 'nome', 'email', 'pegada_total_co2', 'quiz_pontuacao', 'quiz_total_perguntas']
-    writer = csv.DictWriter(output, fieldnames=fieldnames, delimiter=';')
     writer.writeheader()
-    for r in rows:
-        writer.writerow(r)
+    yield esvaziar()
 
-    csv_data = output.getvalue()
-    output.close()
+    apos_id = 0
+    while True:
+        ids = db.session.execute(
+            _filtrar_usuarios(select(Usuario.id), apos_id=apos_id, **filtros)
+            .order_by(Usuario.id)
+            .limit(TAMANHO_LOTE_CSV),
+            bind_arguments=leitura()
+        ).scalars().all()
+        if not ids:
+            break
+        for linha in consultar_relatorio(apos_id=apos_id, ate_id=ids[-1], **filtros):
+            writer.writerow(_linha_relatorio(linha))
+        apos_id = ids[-1]
+        pedaco = esvaziar()
+        if pedaco:
+            yield pedaco
+
+    if compressor:
+        yield compressor.flush()
+
+@site.route('/admin/relatorio.csv')
+def admin_relatorio_csv():
+    """Exporta o relatório em CSV (streaming).
 
-    from flask import Response
+    Parâmetros opcionais: `colunas` (lista separada por vírgula), `de`/`ate`
+    (data de cadastro, AAAA-MM-DD) e `gzip=1` para baixar o arquivo compactado.
+    """
+    colunas = request.args.get('colunas')
+    campos = [c.strip() for c in colunas.split(',') if c.strip()] if colunas else CAMPOS_CSV_PADRAO
+    invalidos = [c for c in campos if c not in CAMPOS_RELATORIO]
+    if invalidos or not campos:
+        return jsonify({'error': f"Colunas inválidas: {', '.join(invalidos)}"}), 400
+    try:
+        cadastro_de = _parse_data(request.args.get('de'))
+        cadastro_ate = _parse_data(request.args.get('ate'), fim_do_dia=True)
+    except ValueError:
+        return jsonify({'error': 'Datas devem estar no formato AAAA-MM-DD'}), 400
+
+    compactar = request.args.get('gzip') == '1'
+    nome_arquivo = 'relatorio_verdetech.csv.gz' if compactar else 'relatorio_verdetech.csv'
     return Response(
-        csv_data,
-        mimetype='text/csv; charset=utf-8',
+        stream_with_context(_gerar_relatorio_csv(campos, cadastro_de, cadastro_ate, compactar)),
+        mimetype='application/gzip' if compactar else 'text/csv; charset=utf-8',
         headers={
-            'Content-Disposition': 'attachment; filename="relatorio_verdetech.csv"'
+            'Content-Disposition': f'attachment; filename="{nome_arquivo}"'
         }
     )
 
-@app.route('/conquistas')
+@site.route('/admin/estatisticas')
+@login_required
+def admin_estatisticas():
+    """Estatísticas da população a partir dos agregados diários.
+
+    O custo depende do número de dias no período (`de`/`ate`, AAAA-MM-DD),
+    não da quantidade de registros brutos.
+    """
+    # Verificar se é o admin autorizado
+    if session.get('username') != 'guinavasconi@gmail.com':
+        return jsonify({'error': 'Acesso negado'}), 403
+
+    try:
+        de = _parse_data(request.args.get('de'))
+        ate = _parse_data(request.args.get('ate'), fim_do_dia=True)
+    except ValueError:
+        return jsonify({'error': 'Datas devem estar no formato AAAA-MM-DD'}), 400
+
+    def gerar():
+        def ler_no_periodo(consulta, modelo):
+            if de is not None:
+                consulta = consulta.where(modelo.dia >= de.date())
+            if ate is not None:
+                consulta = consulta.where(modelo.dia < ate.date())
+            return db.session.execute(consulta, bind_arguments=leitura())
+
+        totais = {
+            metrica: (quantidade, soma, quadrados)
+            for metrica, quantidade, soma, quadrados in ler_no_periodo(
+                select(EstatisticaDiaria.metrica, func.sum(EstatisticaDiaria.quantidade),
+                       func.sum(EstatisticaDiaria.soma), func.sum(EstatisticaDiaria.soma_quadrados))
+                .group_by(EstatisticaDiaria.metrica), EstatisticaDiaria)
+        }
+        histogramas = {}
+        for metrica, balde, quantidade in ler_no_periodo(
+                select(HistogramaDiario.metrica, HistogramaDiario.balde, func.sum(HistogramaDiario.quantidade))
+                .group_by(HistogramaDiario.metrica, HistogramaDiario.balde), HistogramaDiario):
+            histogramas.setdefault(metrica, {})[balde] = quantidade
+
+        def resumo(metrica, percentis=(0.5, 0.9, 0.99)):
+            quantidade, soma, quadrados = totais.get(metrica, (0, 0.0, 0.0))
+            media, desvio = estatisticas.media_e_desvio(quantidade, soma, quadrados)
+            dados = {
+                'media': round(media, 2) if media is not None else None,
+                'desvio_padrao': round(desvio, 2) if desvio is not None else None
+            }
+            for q, valor in estatisticas.quantis(histogramas.get(metrica, {}), percentis).items():
+                dados[f'p{int(q * 100)}'] = round(valor, 2) if valor is not None else None
+            return dados
+
+        distribuicao = histogramas.get('quiz.percentual', {})
+        diario = {}
+        for dia, metrica, quantidade, soma in ler_no_periodo(
+                select(EstatisticaDiaria.dia, EstatisticaDiaria.metrica,
+                       EstatisticaDiaria.quantidade, EstatisticaDiaria.soma)
+                .where(EstatisticaDiaria.metrica.in_(['pegada.total_co2', 'quiz.percentual']),
+                       EstatisticaDiaria.quantidade > 0)
+                .order_by(EstatisticaDiaria.dia), EstatisticaDiaria):
+            chave = 'pegadas' if metrica == 'pegada.total_co2' else 'quizzes'
+            media = 'media_total_co2' if chave == 'pegadas' else 'media_percentual'
+            linha = diario.setdefault(dia, {
+                'dia': dia.strftime('%Y-%m-%d'), 'pegadas': 0, 'media_total_co2': None,
+                'quizzes': 0, 'media_percentual': None
+            })
+            linha[chave] = quantidade
+            linha[media] = round(soma / quantidade, 2) if quantidade else None
+
+        return jsonify({
+            'pegadas': {
+                'quantidade': totais.get('pegada.total_co2', (0,))[0],
+                'total_co2': resumo('pegada.total_co2'),
+                'categorias': {c: resumo(f'pegada.{c}') for c in CATEGORIAS_PEGADA}
+            },
+            'quiz': {
+                'quantidade': totais.get('quiz.pontuacao', (0,))[0],
+                'pontuacao': resumo('quiz.pontuacao', percentis=()),
+                'percentual': resumo('quiz.percentual', percentis=()),
+                'distribuicao_percentual': {
+                    ('100%' if faixa == 10 else f'{faixa * 10}-{faixa * 10 + 9}%'): distribuicao.get(faixa, 0)
+                    for faixa in range(11)
+                }
+            },
+            'diario': list(diario.values())
+        })
+
+    return _resposta_em_cache(('atividades',), gerar)
+
+@site.route('/conquistas')
 @login_required
 def conquistas():
     return render_template('conquistas.html')
 
-@app.route('/api/feedback', methods=['GET'])
+def _posicoes():
+    """{pontos: posição} a partir da distribuição (empates dividem a posição)."""
+    posicoes, acima = {}, 0
+    for pontos, quantidade in db.session.execute(
+        select(DistribuicaoPontos.pontos, DistribuicaoPontos.quantidade)
+        .where(DistribuicaoPontos.pontos > 0, DistribuicaoPontos.quantidade > 0)
+        .order_by(DistribuicaoPontos.pontos.desc())
+    ):
+        posicoes[pontos] = acima + 1
+        acima += quantidade
+    return posicoes, acima
+
+def _resumo_conquistas(usuario_id):
+    linha = db.session.get(PontuacaoUsuario, usuario_id)
+    mascara, pontos = (linha.conquistas, linha.pontos) if linha else (0, 0)
+    lista = gamificacao.listar(mascara)
+    desbloqueadas = sum(1 for c in lista if c['desbloqueada'])
+    posicoes, usuarios = _posicoes()
+    return {
+        'conquistas': lista,
+        'pontos': pontos,
+        'desbloqueadas': desbloqueadas,
+        'total': len(lista),
+        'percentual': round(100 * desbloqueadas / len(lista)),
+        'posicao': posicoes.get(pontos) if pontos else None,
+        'usuarios': usuarios
+    }
+
+@site.route('/api/conquistas')
+def api_conquistas():
+    usuario_id = session.get('user_id')
+    if not usuario_id:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    return jsonify(_resumo_conquistas(usuario_id))
+
+@site.route('/api/conquistas/secao', methods=['POST'])
+def registrar_secao():
+    """Marca uma seção como visitada (conquista eco_explorer)."""
+    usuario_id = session.get('user_id')
+    if not usuario_id:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    secao = (request.get_json(silent=True) or {}).get('secao')
+    if secao not in gamificacao.SECOES:
+        return jsonify({'error': f"Seção inválida (use {', '.join(gamificacao.SECOES)})"}), 400
+    bit = gamificacao.bit_secao(secao)
+    # A sessão guarda as seções já gravadas: visitas repetidas não escrevem no banco
+    if not session.get('secoes', 0) & bit:
+        try:
+            banco.executar_com_retentativa(db.session, lambda: desbloquear_conquistas({}, {usuario_id: bit}))
+        except Exception as e:
+            return jsonify({'error': str(e)}), 400
+        session['secoes'] = session.get('secoes', 0) | bit
+    return jsonify(_resumo_conquistas(usuario_id))
+
+LIMITE_RANKING = 100
+
+@site.route('/api/ranking')
+def api_ranking():
+    """Top-K do ranking de pontos (parâmetro `limit`, até LIMITE_RANKING)."""
+    if not session.get('user_id'):
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    try:
+        limite = min(max(int(request.args.get('limit', 10)), 1), LIMITE_RANKING)
+    except ValueError:
+        return jsonify({'error': 'Parâmetro limit inválido'}), 400
+    posicoes, usuarios = _posicoes()
+    linhas = db.session.execute(
+        select(PontuacaoUsuario.usuario_id, PontuacaoUsuario.pontos, Usuario.nome)
+        .join(Usuario, Usuario.id == PontuacaoUsuario.usuario_id)
+        .where(PontuacaoUsuario.pontos > 0, Usuario.excluido_em.is_(None))
+        .order_by(PontuacaoUsuario.pontos.desc(), PontuacaoUsuario.usuario_id)
+        .limit(limite)
+    ).all()
+    return jsonify({
+        'ranking': [{
+            'posicao': posicoes.get(pontos),
+            # Só o primeiro nome: o ranking é visto por todos os usuários
+            'nome': nome.split()[0] if nome else '',
+            'pontos': pontos,
+            'voce': usuario_id == session['user_id']
+        } for usuario_id, pontos, nome in linhas],
+        'usuarios': usuarios
+    })
+
+# Histórico do usuário: valor de cada registro na mesma métrica do AgregadoMensal
+LIMITE_PONTOS_HISTORICO = 500
+
+def _valor_historico(tipo):
+    if tipo == 'pegada':
+        return PegadaCarbono.total_co2
+    return func.coalesce(100.0 * ResultadoQuiz.pontuacao / func.nullif(ResultadoQuiz.total_perguntas, 0), 0.0)
+
+def _segundos_unix(coluna_data):
+    # julianday() aceita o texto gravado pelo SQLAlchemy; 2440587.5 é 1970-01-01
+    return (func.julianday(coluna_data) - 2440587.5) * 86400.0
+
+def _cursor_historico(valor):
+    """O cursor de /api/historico é 'data_id' do último ponto da página anterior."""
+    if not valor:
+        return None
+    data, registro_id = valor.rsplit('_', 1)
+    return datetime.fromisoformat(data), int(registro_id)
+
+def _assinatura_usuario(modelo, coluna_data, usuario_id):
+    """Contagem, maior id e data mais recente das linhas do usuário (pelo índice usuario_id, data), para o ETag."""
+    return (*db.session.execute(_consulta_assinatura_usuario(modelo, coluna_data, usuario_id),
+                                bind_arguments=leitura()).one(), usuario_id)
+
+def _consulta_assinatura_usuario(modelo, coluna_data, usuario_id):
+    return select(func.count(), func.max(modelo.id), func.max(coluna_data)).where(modelo.usuario_id == usuario_id)
+
+def _consulta_historico_registros(tipo, usuario_id, de, ate, apos, limite):
+    modelo, nome_data = TIPOS_INGESTAO[tipo]
+    coluna_data = getattr(modelo, nome_data)
+    consulta = select(modelo.id, coluna_data, _valor_historico(tipo)).where(modelo.usuario_id == usuario_id)
+    if de is not None:
+        consulta = consulta.where(coluna_data >= de)
+    if ate is not None:
+        consulta = consulta.where(coluna_data < ate)
+    if apos is not None:
+        consulta = consulta.where(tuple_(coluna_data, modelo.id) < tuple_(*apos))
+    return consulta.order_by(coluna_data.desc(), modelo.id.desc()).limit(limite + 1)
+
+def _historico_registros(tipo, usuario_id, de, ate, apos, limite):
+    """Página de registros brutos, do mais recente para o mais antigo (keyset em data, id)."""
+    linhas = db.session.execute(_consulta_historico_registros(tipo, usuario_id, de, ate, apos, limite),
+                                bind_arguments=leitura()).all()
+    proximo = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo = f'{linhas[-1][1].isoformat()}_{linhas[-1][0]}'
+    return {
+        'pontos': [{'id': registro_id, 'data': data.strftime('%Y-%m-%d %H:%M:%S'), 'valor': valor}
+                   for registro_id, data, valor in linhas],
+        'proximo': proximo
+    }
+
+def _consultas_historico_reduzido(tipo, usuario_id, de=None, ate=None, largura=None):
+    """As consultas da série reduzida: sem intervalo, as que acham os limites; com ele, baldes e meses."""
+    modelo, nome_data = TIPOS_INGESTAO[tipo]
+    coluna_data = getattr(modelo, nome_data)
+    mensal = select(AgregadoMensal).where(AgregadoMensal.usuario_id == usuario_id,
+                                          AgregadoMensal.metrica == METRICA_MENSAL[tipo])
+    if largura is None:
+        return {
+            'limites': select(func.min(coluna_data), func.max(coluna_data)).where(modelo.usuario_id == usuario_id),
+            'primeiro_mes': mensal.with_only_columns(func.min(AgregadoMensal.mes)),
+        }
+    inicio = (de - datetime(1970, 1, 1)).total_seconds()
+    valor = _valor_historico(tipo)
+    indice = cast((_segundos_unix(coluna_data) - inicio) / largura, Integer)
+    return {
+        'baldes': (select(indice, func.count(), func.sum(valor), func.min(valor), func.max(valor))
+                   .where(modelo.usuario_id == usuario_id, coluna_data >= de, coluna_data < ate)
+                   .group_by(indice)),
+        'meses': mensal.where(AgregadoMensal.mes >= de.date(),
+                              AgregadoMensal.mes <= (ate - timedelta(microseconds=1)).date()),
+    }
+
+def _historico_reduzido(tipo, usuario_id, de, ate, pontos):
+    """Série reduzida a no máximo `pontos` intervalos de tempo iguais (média, mínimo e máximo de cada um).
+
+    As linhas do banco são agregadas no SQLite, percorrendo o índice
+    (usuario_id, data); os meses já arquivados entram pelo AgregadoMensal,
+    cada um no intervalo do seu primeiro dia.
+    """
+    if de is None or ate is None:
+        consultas = _consultas_historico_reduzido(tipo, usuario_id)
+        primeiro, ultimo = db.session.execute(consultas['limites'], bind_arguments=leitura()).one()
+        primeiro_mes = db.session.execute(consultas['primeiro_mes'], bind_arguments=leitura()).scalar()
+        if primeiro_mes is not None:
+            primeiro_mes = datetime.combine(primeiro_mes, datetime.min.time())
+            primeiro = min(primeiro, primeiro_mes) if primeiro else primeiro_mes
+            ultimo = max(ultimo, primeiro_mes) if ultimo else primeiro_mes
+        if primeiro is None:
+            return {'pontos': [], 'resolucao_segundos': None}
+        de = de if de is not None else primeiro
+        ate = ate if ate is not None else ultimo + timedelta(seconds=1)
+    if ate <= de:
+        return {'pontos': [], 'resolucao_segundos': None}
+
+    largura = max(1, math.ceil((ate - de).total_seconds() / pontos))
+    consultas = _consultas_historico_reduzido(tipo, usuario_id, de, ate, largura)
+    baldes = {}
+    for i, quantidade, soma, minimo, maximo in db.session.execute(consultas['baldes'], bind_arguments=leitura()):
+        baldes[i] = [quantidade, soma, minimo, maximo]
+    for agregado in db.session.execute(consultas['meses'], bind_arguments=leitura()).scalars():
+        segundos = (datetime.combine(agregado.mes, datetime.min.time()) - de).total_seconds()
+        i = min(max(int(segundos // largura), 0), pontos - 1)
+        balde = baldes.get(i)
+        if balde is None:
+            baldes[i] = [agregado.quantidade, agregado.soma, agregado.minimo, agregado.maximo]
+        else:
+            balde[0] += agregado.quantidade
+            balde[1] += agregado.soma
+            balde[2] = min(balde[2], agregado.minimo)
+            balde[3] = max(balde[3], agregado.maximo)
+    return {
+        'pontos': [{
+            'data': (de + timedelta(seconds=i * largura)).strftime('%Y-%m-%d %H:%M:%S'),
+            'media': soma / quantidade,
+            'minimo': minimo,
+            'maximo': maximo,
+            'quantidade': quantidade
+        } for i, (quantidade, soma, minimo, maximo) in sorted(baldes.items())],
+        'resolucao_segundos': largura
+    }
+
+@site.route('/api/historico')
+def api_historico():
+    """Histórico de pegadas (total_co2) ou quizzes (percentual) do usuário logado.
+
+    Parâmetros: `tipo` (pegada ou quiz), `de`/`ate` (AAAA-MM-DD) e um dos modos:
+    - `pontos=N`: série reduzida no servidor a no máximo N intervalos, para
+      gráficos; inclui os meses já arquivados (via AgregadoMensal);
+    - sem `pontos`: os registros um a um, do mais recente para o mais antigo,
+      paginados com `limit` e `after` (cursor devolvido em `proximo`). Só as
+      atividades ainda no banco, não as arquivadas.
+    """
+    usuario_id = session.get('user_id')
+    if not usuario_id:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    tipo = request.args.get('tipo', 'pegada')
+    if tipo not in TIPOS_INGESTAO:
+        return jsonify({'error': f"Tipo inválido (use {', '.join(TIPOS_INGESTAO)})"}), 400
+    try:
+        filtros = _parametros_paginacao()
+        pontos = request.args.get('pontos')
+        pontos = int(pontos) if pontos else None
+        if pontos is not None and not 1 <= pontos <= LIMITE_PONTOS_HISTORICO:
+            raise ValueError(f'pontos deve estar entre 1 e {LIMITE_PONTOS_HISTORICO}')
+        apos = _cursor_historico(request.args.get('after'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def gerar():
+        if pontos is not None:
+            dados = _historico_reduzido(tipo, usuario_id, filtros['de'], filtros['ate'], pontos)
+        else:
+            dados = _historico_registros(tipo, usuario_id, filtros['de'], filtros['ate'], apos, filtros['limite'])
+        return jsonify({'tipo': tipo, 'metrica': METRICA_MENSAL[tipo], **dados})
+
+    modelo, nome_data = TIPOS_INGESTAO[tipo]
+    return _resposta_condicional([_assinatura_usuario(modelo, getattr(modelo, nome_data), usuario_id)], gerar)
+
+def _feedback_json(feedback):
+    return {
+        'id': feedback.id,
+        'rating': feedback.rating,
+        'text': feedback.text,
+        'quiz_score': feedback.quiz_score,
+        'quiz_total': feedback.quiz_total,
+        'data_feedback': feedback.data_feedback.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+@site.route('/api/feedback', methods=['GET'])
 @login_required
 def buscar_feedback():
     try:
@@ -419,21 +2043,14 @@ def buscar_feedback():
         feedback = Feedback.query.filter_by(usuario_id=usuario_id).first()
         
         if feedback:
-            return jsonify({
-                'id': feedback.id,
-                'rating': feedback.rating,
-                'text': feedback.text,
-                'quiz_score': feedback.quiz_score,
-                'quiz_total': feedback.quiz_total,
-                'data_feedback': feedback.data_feedback.strftime('%Y-%m-%d %H:%M:%S')
-            })
+            return jsonify(_feedback_json(feedback))
         else:
             return jsonify(None)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
-@app.route('/api/feedback', methods=['POST'])
+@site.route('/api/feedback', methods=['POST'])
 def salvar_feedback():
     try:
         data = request.get_json()
@@ -442,76 +2059,217 @@ def salvar_feedback():
         if not usuario_id:
             return jsonify({'error': 'Usuário não autenticado'}), 401
         
-        # Verificar se já existe um feedback deste usuário
-        feedback_existente = Feedback.query.filter_by(usuario_id=usuario_id).first()
+        def gravar():
+            # Verificar se já existe um feedback deste usuário
+            feedback = Feedback.query.filter_by(usuario_id=usuario_id).first()
+            existente = feedback is not None
+            if not existente:
+                feedback = Feedback(usuario_id=usuario_id)
+                db.session.add(feedback)
+            feedback.rating = data['rating']
+            texto = data.get('text', '')
+            feedback.text = filtro_feedback.mascarar(texto) if texto else texto
+            feedback.quiz_score = data.get('quiz_score')
+            feedback.quiz_total = data.get('quiz_total')
+            feedback.data_feedback = datetime.utcnow()
+            return feedback, existente
         
-        if feedback_existente:
-            # Atualizar feedback existente
-            feedback_existente.rating = data['rating']
-            feedback_existente.text = data.get('text', '')
-            feedback_existente.quiz_score = data.get('quiz_score')
-            feedback_existente.quiz_total = data.get('quiz_total')
-            feedback_existente.data_feedback = datetime.utcnow()
-            
-            db.session.commit()
-            
-            return jsonify({
-                'message': 'Feedback atualizado com sucesso!',
-                'id': feedback_existente.id,
-                'updated': True
-            })
-        else:
-            # Criar novo feedback
-            novo_feedback = Feedback(
-                usuario_id=usuario_id,
-                rating=data['rating'],
-                text=data.get('text', ''),
-                quiz_score=data.get('quiz_score'),
-                quiz_total=data.get('quiz_total')
-            )
-            db.session.add(novo_feedback)
-            db.session.commit()
-            
-            return jsonify({
-                'message': 'Feedback salvo com sucesso!',
-                'id': novo_feedback.id,
-                'updated': False
-            })
+        feedback, atualizado = banco.executar_com_retentativa(db.session, gravar)
+        invalidar_cache('feedbacks')
+        
+        return jsonify({
+            'message': 'Feedback atualizado com sucesso!' if atualizado else 'Feedback salvo com sucesso!',
+            'id': feedback.id,
+            'updated': atualizado
+        })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
-@app.route('/admin/feedbacks')
+CAMPOS_FEEDBACK = ('id', 'usuario_nome', 'rating', 'text', 'quiz_score', 'quiz_total', 'data_feedback')
+
+@site.route('/admin/feedbacks')
 @login_required
 def admin_feedbacks():
     # Verificar se é o admin autorizado
     if session.get('username') != 'guinavasconi@gmail.com':
         return jsonify({'error': 'Acesso negado'}), 403
     
-    feedbacks = db.session.query(Feedback, Usuario).join(Usuario, Feedback.usuario_id == Usuario.id).all()
-    
-    dados = []
-    for feedback, usuario in feedbacks:
-        dados.append({
-            'id': feedback.id,
-            'usuario_nome': usuario.nome,
-            'rating': feedback.rating,
-            'text': feedback.text,
-            'quiz_score': feedback.quiz_score,
-            'quiz_total': feedback.quiz_total,
-            'data_feedback': feedback.data_feedback.strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        filtros = _parametros_paginacao()
+        after = request.args.get('after')
+        apos_id = int(after) if after else None
+    except ValueError:
+        return jsonify({'error': 'Parâmetros de paginação inválidos'}), 400
+    try:
+        formato_colunar = _formato_colunar()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def gerar():
+        if formato_colunar:
+            consulta = (select(Feedback.id, Usuario.nome.label('usuario_nome'), Feedback.rating, Feedback.text,
+                               Feedback.quiz_score, Feedback.quiz_total, colunar.epoch(Feedback.data_feedback))
+                        .join(Usuario, Feedback.usuario_id == Usuario.id)
+                        .where(Usuario.excluido_em.is_(None)))
+            linhas, proximo = _pagina(Feedback, Feedback.data_feedback, apos_id, consulta=consulta, **filtros)
+            return jsonify({'feedbacks': colunar.codificar(linhas, CAMPOS_FEEDBACK, ('data_feedback',)),
+                            'proximo': proximo})
+        consulta = (select(Feedback, Usuario).join(Usuario, Feedback.usuario_id == Usuario.id)
+                    .where(Usuario.excluido_em.is_(None)))
+        feedbacks, proximo = _pagina(Feedback, Feedback.data_feedback, apos_id, consulta=consulta, **filtros)
+        dados = []
+        for feedback, usuario in feedbacks:
+            dados.append({
+                'id': feedback.id,
+                'usuario_nome': usuario.nome,
+                'rating': feedback.rating,
+                'text': feedback.text,
+                'quiz_score': feedback.quiz_score,
+                'quiz_total': feedback.quiz_total,
+                'data_feedback': feedback.data_feedback.strftime('%Y-%m-%d %H:%M:%S')
+            })
+        return jsonify({'feedbacks': dados, 'proximo': proximo})
+
+    return _resposta_em_cache(('feedbacks', 'usuarios'), gerar)
+
+# Índice FTS5 de Feedback.text, mantido por gatilhos (migração 7)
+feedback_fts = table('feedback_fts', column('rowid'), column('rank'))
+_FEEDBACK_FTS = literal_column('feedback_fts')
+_PALAVRA_BUSCA = re.compile(r'\w+')
+LIMITE_PALAVRAS_BUSCA = 10
+# Quantos resultados (os mais recentes) entram na ordenação por relevância
+LIMITE_CANDIDATOS_BUSCA = 10000
+
+def _expressao_busca(texto):
+    """Converte o texto digitado em uma consulta FTS5: todas as palavras, cada uma como prefixo.
+
+    Só letras e dígitos passam, então aspas e operadores do FTS5 digitados
+    pelo usuário nunca viram erro de sintaxe.
+    """
+    palavras = _PALAVRA_BUSCA.findall(texto or '')[:LIMITE_PALAVRAS_BUSCA]
+    if not palavras:
+        raise ValueError('Informe ao menos uma palavra para buscar')
+    return ' '.join(f'"{palavra}"*' for palavra in palavras)
+
+def _parse_nota(valor):
+    if not valor:
+        return None
+    nota = int(valor)
+    if not 1 <= nota <= 5:
+        raise ValueError('rating deve estar entre 1 e 5')
+    return nota
+
+def _consulta_busca_feedbacks(expressao, filtros, nota_minima=None, nota_maxima=None):
+    """Ids dos feedbacks que casam com a expressão FTS5 e os filtros, ainda sem ordem."""
+    consulta = (select(feedback_fts.c.rowid)
+                .select_from(feedback_fts)
+                .join(Feedback, Feedback.id == feedback_fts.c.rowid)
+                .join(Usuario, Feedback.usuario_id == Usuario.id)
+                .where(_FEEDBACK_FTS.op('MATCH')(expressao), Usuario.excluido_em.is_(None)))
+    if filtros['de'] is not None:
+        consulta = consulta.where(Feedback.data_feedback >= filtros['de'])
+    if filtros['ate'] is not None:
+        consulta = consulta.where(Feedback.data_feedback < filtros['ate'])
+    if filtros['usuario_id'] is not None:
+        consulta = consulta.where(Feedback.usuario_id == filtros['usuario_id'])
+    if nota_minima is not None:
+        consulta = consulta.where(Feedback.rating >= nota_minima)
+    if nota_maxima is not None:
+        consulta = consulta.where(Feedback.rating <= nota_maxima)
+    return consulta
+
+def _consulta_corte_busca(consulta):
+    return consulta.order_by(feedback_fts.c.rowid.desc()).limit(1).offset(LIMITE_CANDIDATOS_BUSCA - 1)
+
+def _consulta_ordenada_busca(consulta, limite, deslocamento):
+    trecho = func.snippet(_FEEDBACK_FTS, 0, '<mark>', '</mark>', '…', 16)
+    # A relevância muda a cada feedback novo, então o cursor é a posição
+    # na lista ordenada (não um id, como nas outras listagens)
+    return (consulta.with_only_columns(Feedback, Usuario.nome, trecho)
+            .order_by(feedback_fts.c.rank, Feedback.id.desc())
+            .limit(limite + 1).offset(deslocamento))
+
+@site.route('/admin/feedbacks/search')
+@login_required
+def buscar_feedbacks():
+    """Busca textual nos feedbacks, os mais relevantes (bm25) primeiro.
+
+    Parâmetros: `q` (palavras, todas obrigatórias, aceitando prefixo),
+    `rating_min`/`rating_max`, `de`/`ate` (AAAA-MM-DD), `limit` e `after`
+    (cursor devolvido em `proximo`). Cada resultado traz um `trecho` do
+    comentário com os termos entre <mark> e </mark>.
+
+    O bm25 é calculado para cada linha encontrada, então uma palavra comum
+    em centenas de milhares de feedbacks levaria centenas de milissegundos.
+    Só os LIMITE_CANDIDATOS_BUSCA resultados mais recentes são ordenados
+    (`parcial` indica quando o corte foi aplicado).
+    """
+    # Verificar se é o admin autorizado
+    if session.get('username') != 'guinavasconi@gmail.com':
+        return jsonify({'error': 'Acesso negado'}), 403
+
+    try:
+        expressao = _expressao_busca(request.args.get('q'))
+        filtros = _parametros_paginacao()
+        nota_minima = _parse_nota(request.args.get('rating_min'))
+        nota_maxima = _parse_nota(request.args.get('rating_max'))
+        after = request.args.get('after')
+        deslocamento = int(after) if after else 0
+        if deslocamento < 0:
+            raise ValueError('after inválido')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def gerar():
+        limite = filtros['limite']
+        consulta = _consulta_busca_feedbacks(expressao, filtros, nota_minima, nota_maxima)
+        # Percorrer o índice em ordem de id é barato: acha o id do último candidato
+        corte = db.session.execute(_consulta_corte_busca(consulta), bind_arguments=leitura()).scalar()
+        if corte is not None:
+            consulta = consulta.where(feedback_fts.c.rowid >= corte)
+        linhas = db.session.execute(_consulta_ordenada_busca(consulta, limite, deslocamento),
+                                    bind_arguments=leitura()).all()
+        proximo = None
+        if len(linhas) > limite:
+            linhas = linhas[:limite]
+            proximo = deslocamento + limite
+        return jsonify({
+            'feedbacks': [{
+                'id': feedback.id,
+                'usuario_nome': nome,
+                'rating': feedback.rating,
+                'text': feedback.text,
+                'trecho': trecho,
+                'quiz_score': feedback.quiz_score,
+                'quiz_total': feedback.quiz_total,
+                'data_feedback': feedback.data_feedback.strftime('%Y-%m-%d %H:%M:%S')
+            } for feedback, nome, trecho in linhas],
+            'proximo': proximo,
+            'parcial': corte is not None
         })
-    
-    return jsonify(dados)
 
-@app.route('/admin/delete-activities/<int:user_id>', methods=['DELETE'])
+    return _resposta_em_cache(('feedbacks', 'usuarios'), gerar)
+
+@site.cli.command('reconstruir-busca-feedbacks')
+def reconstruir_busca_feedbacks_comando():
+    """Refaz o índice de busca dos feedbacks a partir da tabela feedback."""
+    with db.engine.begin() as conexao:
+        conexao.exec_driver_sql("INSERT INTO feedback_fts (feedback_fts) VALUES ('rebuild')")
+        conexao.exec_driver_sql("INSERT INTO feedback_fts (feedback_fts) VALUES ('optimize')")
+    print("Índice de busca dos feedbacks reconstruído")
+
+@site.route('/admin/delete-activities/<int:user_id>', methods=['DELETE'])
 @login_required
 def delete_user_activities(user_id):
     # Verificar se é o admin autorizado
     if session.get('username') != 'guinavasconi@gmail.com':
         return jsonify({'error': 'Acesso negado'}), 403
     
-    try:
+    def excluir():
+        _descontar_estatisticas_usuarios([user_id])
+        AgregadoMensal.query.filter_by(usuario_id=user_id).delete()
+        
         # Excluir pegadas de carbono
         PegadaCarbono.query.filter_by(usuario_id=user_id).delete()
         
@@ -521,7 +2279,13 @@ def delete_user_activities(user_id):
         # Excluir feedbacks
         Feedback.query.filter_by(usuario_id=user_id).delete()
         
-        db.session.commit()
+        recalcular_conquistas(user_id)
+    
+    try:
+        banco.executar_com_retentativa(db.session, excluir)
+        # Só depois do commit: o arquivo não volta atrás num rollback
+        _retirar_do_arquivo([user_id])
+        invalidar_cache('atividades', 'feedbacks')
         
         return jsonify({'message': 'Atividades excluídas com sucesso'})
     
@@ -529,7 +2293,7 @@ def delete_user_activities(user_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
-@app.route('/admin/delete-user/<int:user_id>', methods=['DELETE'])
+@site.route('/admin/delete-user/<int:user_id>', methods=['DELETE'])
 @login_required
 def delete_user(user_id):
     # Verificar se é o admin autorizado
@@ -537,15 +2301,10 @@ def delete_user(user_id):
         return jsonify({'error': 'Acesso negado'}), 403
     
     try:
-        # Primeiro excluir todas as atividades (cascade)
-        PegadaCarbono.query.filter_by(usuario_id=user_id).delete()
-        ResultadoQuiz.query.filter_by(usuario_id=user_id).delete()
-        Feedback.query.filter_by(usuario_id=user_id).delete()
-        
-        # Depois excluir o usuário
-        Usuario.query.filter_by(id=user_id).delete()
-        
-        db.session.commit()
+        # Atividades, feedback e login vão junto (ON DELETE CASCADE)
+        banco.executar_com_retentativa(db.session, lambda: _purgar_usuarios([user_id]))
+        _retirar_do_arquivo([user_id])
+        invalidar_cache('usuarios', 'atividades', 'feedbacks')
         
         return jsonify({'message': 'Usuário excluído com sucesso'})
     
@@ -553,7 +2312,144 @@ def delete_user(user_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
-@app.route('/admin/delete-feedback/<int:feedback_id>', methods=['DELETE'])
+# Máximo de ids aceitos por pedido de exclusão em massa
+LIMITE_IDS_EXCLUSAO = 10000
+
+def _condicao_exclusao(dados):
+    """Condição dos usuários a excluir a partir de `ids` ou de `filtro`.
+
+    Nunca inclui a conta do admin nem usuários já marcados. Levanta
+    ValueError com a mensagem para o cliente se o pedido for inválido.
+    """
+    ids, filtro = dados.get('ids'), dados.get('filtro')
+    if (ids is None) == (filtro is None):
+        raise ValueError("Informe 'ids' ou 'filtro'")
+    condicoes = [
+        Usuario.excluido_em.is_(None),
+        Usuario.id.not_in(select(Auth.usuario_id).where(Auth.username == 'guinavasconi@gmail.com'))
+    ]
+    if ids is not None:
+        if not isinstance(ids, list) or not ids or not all(type(i) is int for i in ids):
+            raise ValueError("'ids' deve ser uma lista de números")
+        if len(ids) > LIMITE_IDS_EXCLUSAO:
+            raise ValueError(f"No máximo {LIMITE_IDS_EXCLUSAO} ids por pedido; use um filtro")
+        return and_(*condicoes, Usuario.id.in_(ids))
+
+    if not isinstance(filtro, dict):
+        raise ValueError("'filtro' deve ser um objeto")
+    try:
+        cadastro_de = _parse_data(filtro.get('de'))
+        cadastro_ate = _parse_data(filtro.get('ate'), fim_do_dia=True)
+    except (TypeError, ValueError):
+        raise ValueError('Datas devem estar no formato AAAA-MM-DD')
+    criterios = []
+    if cadastro_de is not None:
+        criterios.append(Usuario.data_cadastro >= cadastro_de)
+    if cadastro_ate is not None:
+        criterios.append(Usuario.data_cadastro < cadastro_ate)
+    for campo in ('email', 'nome'):
+        valor = filtro.get(campo)
+        if valor:
+            criterios.append(getattr(Usuario, campo).contains(str(valor), autoescape=True))
+    if not criterios:
+        raise ValueError('O filtro precisa de pelo menos um critério: de, ate, email ou nome')
+    return and_(*condicoes, *criterios)
+
+@site.route('/admin/usuarios/excluir', methods=['POST'])
+@login_required
+def excluir_usuarios():
+    """Exclui vários usuários de uma vez, por lista de ids ou por filtro.
+
+    Corpo JSON: `ids` (lista) ou `filtro` com `de`/`ate` (data de cadastro,
+    AAAA-MM-DD), `email` e/ou `nome` (trecho contido). Com `simular: true` só
+    conta quantos seriam excluídos. Os usuários são marcados na hora (somem
+    do login, do relatório e do ranking) e apagados em segundo plano.
+    """
+    # Verificar se é o admin autorizado
+    if session.get('username') != 'guinavasconi@gmail.com':
+        return jsonify({'error': 'Acesso negado'}), 403
+
+    dados = request.get_json(silent=True) or {}
+    try:
+        condicao = _condicao_exclusao(dados)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        if dados.get('simular'):
+            total = db.session.execute(select(func.count()).select_from(Usuario).where(condicao)).scalar()
+            return jsonify({'usuarios': total, 'simulacao': True})
+
+        agora = datetime.utcnow()
+        marcados = banco.executar_com_retentativa(
+            db.session, lambda: db.session.execute(update(Usuario).where(condicao).values(excluido_em=agora)).rowcount
+        )
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+    if marcados:
+        invalidar_cache('usuarios')
+        _estado().expurgo.agendar()
+    return jsonify({'message': f'{marcados} usuários excluídos', 'usuarios': marcados}), 202
+
+@site.route('/admin/usuarios/exclusao')
+@login_required
+def status_exclusao():
+    """Quantos usuários marcados ainda esperam o expurgo."""
+    # Verificar se é o admin autorizado
+    if session.get('username') != 'guinavasconi@gmail.com':
+        return jsonify({'error': 'Acesso negado'}), 403
+
+    pendentes = db.session.execute(
+        select(func.count()).select_from(Usuario).where(Usuario.excluido_em.is_not(None))
+    ).scalar()
+    expurgo = _estado().expurgo
+    return jsonify({'pendentes': pendentes, 'rodando': expurgo.rodando(), **expurgo.estatisticas})
+
+@site.route('/admin/cache')
+@login_required
+def admin_cache():
+    """Entradas do cache de respostas e taxa de acerto por rota, somadas entre os workers."""
+    # Verificar se é o admin autorizado
+    if session.get('username') != 'guinavasconi@gmail.com':
+        return jsonify({'error': 'Acesso negado'}), 403
+
+    contadores, _ = metricas_app.agregar()
+    rotas = {}
+    for (nome, rotulos), valor in contadores.items():
+        if nome == 'verdetech_cache_consultas_total':
+            rotulos = dict(rotulos)
+            contagem = rotas.setdefault(rotulos['rota'], {'acerto': 0, 'falta': 0, 'validacao': 0})
+            contagem[rotulos['resultado']] += valor
+    for contagem in rotas.values():
+        # 304 também poupa a consulta ao banco: conta como acerto
+        total = sum(contagem.values())
+        contagem['taxa_acerto'] = round((contagem['acerto'] + contagem['validacao']) / total, 3)
+    return jsonify({**cache_respostas.resumo(), 'rotas': rotas})
+
+@site.route('/admin/admissao')
+@login_required
+def admin_admissao():
+    """Vagas em uso e limites do controle de admissão e recusas por rota, somadas entre os workers."""
+    # Verificar se é o admin autorizado
+    if session.get('username') != 'guinavasconi@gmail.com':
+        return jsonify({'error': 'Acesso negado'}), 403
+    if controle_admissao is None:
+        return jsonify({'ativo': False})
+
+    contadores, _ = metricas_app.agregar()
+    resumo = controle_admissao.resumo()
+    for rota in resumo['rotas'].values():
+        rota['recusas'] = {'taxa': 0, 'em_andamento': 0, 'processo': 0}
+    for (nome, rotulos), valor in contadores.items():
+        if nome == 'verdetech_admissao_recusas_total':
+            rotulos = dict(rotulos)
+            if rotulos['rota'] in resumo['rotas']:
+                resumo['rotas'][rotulos['rota']]['recusas'][rotulos['motivo']] += valor
+    return jsonify({'ativo': True, **resumo})
+
+@site.route('/admin/delete-feedback/<int:feedback_id>', methods=['DELETE'])
 @login_required
 def delete_feedback(feedback_id):
     # Verificar se é o admin autorizado
@@ -563,6 +2459,7 @@ def delete_feedback(feedback_id):
     try:
         Feedback.query.filter_by(id=feedback_id).delete()
         db.session.commit()
+        invalidar_cache('feedbacks')
         
         return jsonify({'message': 'Feedback excluído com sucesso'})
     
@@ -570,29 +2467,260 @@ def delete_feedback(feedback_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
-@app.route('/admin')
+@site.route('/admin')
 @login_required
 def admin():
     # Verificar se é o admin autorizado
     if session.get('username') != 'guinavasconi@gmail.com':
-        return redirect(url_for('index'))
+        return redirect(url_for('site.index'))
     return render_template('admin.html')
 
-@app.route('/health')
+def consultas_verificadas():
+    """Consultas das rotas admin e da API conferidas por `flask verificar-planos`.
+
+    Cada item é (nome, consulta, tabelas em que um SCAN é esperado). Os SCANs
+    permitidos são leituras completas por definição (relatório inteiro) ou
+    primeiras páginas em ordem de id, que param no LIMIT.
+    """
+    pagina_feedbacks = (select(Feedback, Usuario).join(Usuario, Feedback.usuario_id == Usuario.id)
+                        .where(Usuario.excluido_em.is_(None)))
+    consultas = [
+        ('relatório completo', consulta_relatorio(), {'usuario'}),
+        ('relatório em lote (CSV)', consulta_relatorio(apos_id=0, ate_id=1000), set()),
+        ('ids do lote (CSV)',
+         _filtrar_usuarios(select(Usuario.id), apos_id=0).order_by(Usuario.id).limit(TAMANHO_LOTE_CSV), set()),
+        ('feedbacks: primeira página',
+         _consulta_pagina(Feedback, Feedback.data_feedback, None, 100, consulta=pagina_feedbacks), {'feedback'}),
+        ('feedbacks: página seguinte',
+         _consulta_pagina(Feedback, Feedback.data_feedback, 1000, 100, consulta=pagina_feedbacks), set()),
+        ('feedback do usuário', select(Feedback).where(Feedback.usuario_id == 1).limit(1), set()),
+        ('login', select(Auth).where(Auth.username == 'a@b.c').limit(1), set()),
+        ('cadastro: e-mail em uso', select(Usuario).where(Usuario.email == 'a@b.c').limit(1), set()),
+        ('minha conta', select(Usuario).where(Usuario.id == 1), set()),
+        ('fatores de emissão vigentes',
+         select(FatorEmissao).order_by(FatorEmissao.versao.desc()).limit(1), {'fator_emissao'}),
+        ('estatísticas', select(EstatisticaDiaria.metrica, func.sum(EstatisticaDiaria.quantidade))
+         .group_by(EstatisticaDiaria.metrica), {'estatistica_diaria'}),
+        ('ranking: top-K', select(PontuacaoUsuario.usuario_id, PontuacaoUsuario.pontos, Usuario.nome)
+         .join(Usuario, Usuario.id == PontuacaoUsuario.usuario_id)
+         .where(PontuacaoUsuario.pontos > 0, Usuario.excluido_em.is_(None))
+         .order_by(PontuacaoUsuario.pontos.desc(), PontuacaoUsuario.usuario_id).limit(10), set()),
+        ('ranking: posições', select(DistribuicaoPontos.pontos, DistribuicaoPontos.quantidade)
+         .where(DistribuicaoPontos.pontos > 0).order_by(DistribuicaoPontos.pontos.desc()), set()),
+        ('conquistas do usuário', select(PontuacaoUsuario).where(PontuacaoUsuario.usuario_id == 1), set()),
+        ('expurgo: próximo lote', select(Usuario.id).where(Usuario.excluido_em.is_not(None))
+         .order_by(Usuario.id).limit(TAMANHO_LOTE_EXPURGO), {'usuario'}),
+    ]
+    for tipo, (modelo, coluna_data) in TIPOS_INGESTAO.items():
+        coluna = getattr(modelo, coluna_data)
+        consultas += [
+            (f'dados ({tipo}): primeira página', _consulta_pagina(modelo, coluna, None, 100), {modelo.__tablename__}),
+            (f'dados ({tipo}): página seguinte', _consulta_pagina(modelo, coluna, 1000, 100), set()),
+            (f'dados ({tipo}): por usuário', _consulta_pagina(modelo, coluna, None, 100, usuario_id=1), set()),
+            (f'atividades do usuário ({tipo})', select(modelo.__table__).where(modelo.usuario_id == 1), set()),
+            (f'compactação ({tipo}): próximo lote',
+             _consulta_compactacao(modelo, coluna_data, datetime(2000, 1, 1), TAMANHO_LOTE_COMPACTACAO),
+             {modelo.__tablename__}),
+            (f'bootstrap: último registro ({tipo})', _consulta_mais_recente(modelo, coluna, 1, modelo.id), set()),
+            (f'histórico ({tipo}): assinatura', _consulta_assinatura_usuario(modelo, coluna, 1), set()),
+            (f'histórico ({tipo}): primeira página',
+             _consulta_historico_registros(tipo, 1, None, None, None, 100), set()),
+            (f'histórico ({tipo}): página seguinte com intervalo',
+             _consulta_historico_registros(tipo, 1, datetime(2024, 1, 1), datetime(2025, 1, 1),
+                                           (datetime(2024, 6, 1), 1000), 100), set()),
+            *((f'histórico ({tipo}): {nome}', consulta, set()) for nome, consulta in itertools.chain(
+                _consultas_historico_reduzido(tipo, 1).items(),
+                _consultas_historico_reduzido(tipo, 1, datetime(2024, 1, 1), datetime(2025, 1, 1), 86400).items())),
+        ]
+    busca = _consulta_busca_feedbacks('"agua"*', {'de': datetime(2024, 1, 1), 'ate': None, 'usuario_id': None}, 4)
+    consultas += [
+        ('busca de feedbacks: corte', _consulta_corte_busca(busca), set()),
+        ('busca de feedbacks: por relevância', _consulta_ordenada_busca(busca, 20, 0), set()),
+    ]
+    return consultas
+
+def verificar_planos():
+    """Roda EXPLAIN QUERY PLAN em cada consulta verificada.
+
+    Retorna [(nome, linhas do plano, SCANs não permitidos)].
+    """
+    tabelas = set(db.metadata.tables)
+    resultados = []
+    with db.engine.connect() as conexao:
+        for nome, consulta, scan_permitido in consultas_verificadas():
+            compilada = consulta.compile(dialect=db.engine.dialect)
+            parametros = tuple(compilada.params[p] for p in compilada.positiontup)
+            plano = [linha[-1] for linha in conexao.exec_driver_sql(
+                'EXPLAIN QUERY PLAN ' + str(compilada), parametros)]
+            scans = [
+                detalhe for detalhe in plano
+                if detalhe.startswith('SCAN ') and detalhe.split()[1] in tabelas
+                and detalhe.split()[1] not in scan_permitido
+            ]
+            resultados.append((nome, plano, scans))
+    return resultados
+
+def inicializar_banco():
+    """Aplica as migrações pendentes e grava os fatores padrão em um banco novo; retorna as versões aplicadas."""
+    aplicadas = migracoes.aplicar(db.engine, db.metadata)
+    if not db.session.execute(select(FatorEmissao.versao).limit(1)).first():
+        db.session.add(FatorEmissao(**FATORES_PADRAO))
+        db.session.commit()
+    return aplicadas
+
+@site.cli.command('migrar')
+def migrar_comando():
+    """Aplica as migrações pendentes do banco (cria as tabelas em um banco novo)."""
+    aplicadas = inicializar_banco()
+    print(f"Migrações aplicadas: {aplicadas}" if aplicadas else "Banco já está na versão mais recente")
+
+@site.cli.command('verificar-planos')
+def verificar_planos_comando():
+    """Falha se alguma consulta quente cair em SCAN de tabela."""
+    falhou = False
+    for nome, plano, scans in verificar_planos():
+        print(f"{'FALHA' if scans else 'ok   '} {nome}")
+        for detalhe in plano:
+            print(f"        {detalhe}")
+        falhou = falhou or bool(scans)
+    if falhou:
+        raise SystemExit(1)
+
+@site.route('/health')
 def health_check():
     """Health check para o Render"""
     return jsonify({'status': 'ok', 'message': 'Aplicação funcionando'})
 
-@app.route('/test')
+@site.route('/metrics')
+def exportar_metricas():
+    """Métricas no formato do Prometheus; com METRICAS_TOKEN, exige `Authorization: Bearer <token>`."""
+    token = os.environ.get('METRICAS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'error': 'Acesso negado'}), 403
+    return Response(metricas_app.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@site.route('/test')
 def test():
     """Rota de teste simples"""
     return "Aplicação funcionando! Teste OK."
 
-@app.route('/static/<path:filename>')
-def static_files(filename):
-    """Servir arquivos estáticos"""
-    return app.send_static_file(filename)
+# Variantes geradas pelo gerar_assets.py, na ordem de preferência
+VARIANTES_IMAGEM = (('image/avif', '.avif'), ('image/webp', '.webp'))
+VARIANTES_TEXTO = (('br', '.br'), ('gzip', '.gz'))
+CACHE_IMUTAVEL = 31536000
+
+@lru_cache(maxsize=None)
+def _variantes_existentes(caminho):
+    # O dist/ não muda com o app no ar, então a checagem no disco é feita uma vez por arquivo
+    return frozenset(e for _, e in VARIANTES_IMAGEM + VARIANTES_TEXTO if os.path.isfile(caminho + e))
+
+@site.route('/assets/<path:filename>')
+def servir_asset(filename):
+    """Assets com hash no nome: cache imutável e a melhor variante que o cliente aceita"""
+    caminho = safe_join(os.path.join(current_app.static_folder, 'assets'), filename)
+    if caminho is None or not os.path.isfile(caminho):
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    existentes = _variantes_existentes(caminho)
+    codificacao = None
+    if mimetype.startswith('image/'):
+        vary = 'Accept'
+        aceitos = {tipo for tipo, _ in request.accept_mimetypes}
+        for tipo, extensao in VARIANTES_IMAGEM:
+            if extensao in existentes and tipo in aceitos:
+                caminho, mimetype = caminho + extensao, tipo
+                break
+    else:
+        vary = 'Accept-Encoding'
+        for nome, extensao in VARIANTES_TEXTO:
+            if extensao in existentes and request.accept_encodings[nome]:
+                caminho, codificacao = caminho + extensao, nome
+                break
+    resposta = send_file(caminho, mimetype=mimetype, max_age=CACHE_IMUTAVEL, conditional=True)
+    resposta.headers['Cache-Control'] = f'public, max-age={CACHE_IMUTAVEL}, immutable'
+    resposta.headers['Vary'] = vary
+    if codificacao:
+        resposta.headers['Content-Encoding'] = codificacao
+    return resposta
+
+def preparar_processo(app):
+    """Preparo de cada processo que atende requisições, uma vez por pid.
+
+    Descarta as conexões herdadas do processo pai (com o `preload_app` do
+    gunicorn o app é criado no mestre, antes do fork), reaplica o spool da
+    ingestão deixado por workers que morreram e retoma um expurgo
+    interrompido (deploy, reinício). O gunicorn.conf.py chama na subida de
+    cada worker; fora do gunicorn acontece na primeira requisição.
+    """
+    estado = app.extensions['verdetech']
+    if estado.pid == os.getpid():
+        return
+    with estado.trava:
+        if estado.pid == os.getpid():
+            return
+        with app.app_context():
+            for engine in [*db.engines.values(), estado.engine_leitura]:
+                if engine is not None:
+                    # close=False: as conexões herdadas continuam sendo do pai
+                    engine.dispose(close=False)
+            if estado.ingestao is not None:
+                try:
+                    estado.ingestao.recuperar()
+                except Exception as e:
+                    logger.error(f"Erro ao reaplicar spool da ingestão: {e}")
+            try:
+                if db.session.execute(select(Usuario.id).where(Usuario.excluido_em.is_not(None)).limit(1)).first():
+                    estado.expurgo.agendar()
+            except Exception as e:
+                logger.error(f"Erro ao verificar exclusões pendentes: {e}")
+            finally:
+                db.session.remove()
+        estado.pid = os.getpid()
+
+def create_app(config=None):
+    """Cria o app; `config` sobrepõe a configuração lida do ambiente.
+
+    Nada aqui abre conexão com o banco ou mexe no esquema: as migrações são um
+    passo explícito (`flask --app app migrar`, ou o on_starting do
+    gunicorn.conf.py) e cada processo abre as suas conexões no primeiro uso,
+    depois do fork.
+    """
+    app = Flask(__name__, template_folder=PASTA_FRONT, static_folder=PASTA_FRONT, static_url_path='')
+    app.config.update(configuracao_ambiente())
+    app.config.update(config or {})
+    db.init_app(app)
+    with app.app_context():
+        banco.configurar(db.engine, app.config['DB_PERFIL'])
+        engine_leitura = banco.criar_engine_leitura(db.engine.url.database, app.config['DB_PERFIL'])
+        metricas_app.instrumentar(app, db.engine, engine_leitura)
+
+    estado = SimpleNamespace(engine_leitura=engine_leitura, ingestao=None, pid=None, trava=threading.Lock())
+    # Exclusão em massa: os usuários são marcados na requisição e apagados em
+    # segundo plano, em lotes de EXPURGO_TAMANHO_LOTE (ver expurgo.py)
+    estado.expurgo = ExpurgoEmSegundoPlano(partial(_no_contexto, app, purgar_excluidos),
+                                           pausa=float(os.environ.get('EXPURGO_PAUSA', 0.2)))
+    # Ingestão em lote (write-behind), ativada com INGESTAO_MODO=lote
+    if os.environ.get('INGESTAO_MODO') == 'lote':
+        estado.ingestao = IngestaoEmLote(
+            partial(_no_contexto, app, _gravar_registros),
+            os.environ.get('INGESTAO_SPOOL', os.path.join(os.path.dirname(__file__), 'fecart', 'instance', 'spool')),
+            tamanho_lote=int(os.environ.get('INGESTAO_TAMANHO_LOTE', 200)),
+            intervalo=float(os.environ.get('INGESTAO_INTERVALO', 0.5)),
+            capacidade=int(os.environ.get('INGESTAO_CAPACIDADE', 5000)),
+            fsync=os.environ.get('INGESTAO_FSYNC', '1') == '1',
+            transitorio=banco.erro_transitorio
+        )
+        atexit.register(estado.ingestao.parar)
+    app.extensions['verdetech'] = estado
+
+    app.before_request(partial(preparar_processo, app))
+    app.register_blueprint(site)
+    return app
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
+    app = create_app()
+    with app.app_context():
+        inicializar_banco()
+    metricas.limpar(metricas_app.pasta)
     app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
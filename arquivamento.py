@@ -0,0 +1,162 @@
+"""Arquivo colunar das atividades antigas, fora do banco.
+
+A compactação (`flask compactar-historico`) tira do SQLite as pegadas e os
+quizzes mais velhos que a retenção e grava aqui, em segmentos imutáveis:
+
+    <pasta>/<tipo>/<AAAA-MM>/<menor id>-<maior id>/<coluna>.npy
+
+Cada coluna é um .npy com tipo estreito (ids em int64, datas em
+datetime64[us]), lido com mmap: filtrar milhões de linhas por usuário ou
+data é uma operação vetorizada do numpy que só toca as páginas das colunas
+usadas. `usuario_id` nulo (envios anônimos) vira SEM_USUARIO.
+
+O módulo não conhece o banco: recebe e devolve dicionários de colunas
+(nome -> array). Gravações e remoções são serializadas entre processos por
+um flock em `<pasta>/.trava`.
+"""
+import contextlib
+import fcntl
+import glob
+import os
+import re
+import shutil
+
+import numpy as np
+
+SEM_USUARIO = -1
+_NOME_SEGMENTO = re.compile(r'^\d+-\d+$')
+
+
+class ArquivoColunar:
+    def __init__(self, pasta):
+        self.pasta = pasta
+
+    @contextlib.contextmanager
+    def _travado(self, compartilhado=False):
+        os.makedirs(self.pasta, exist_ok=True)
+        with open(os.path.join(self.pasta, '.trava'), 'w') as trava:
+            fcntl.flock(trava, fcntl.LOCK_SH if compartilhado else fcntl.LOCK_EX)
+            yield
+
+    def segmentos(self, tipo, mes=None):
+        """Pastas dos segmentos de um tipo (de um mês, se informado), em ordem."""
+        padrao = os.path.join(self.pasta, tipo, mes or '[0-9]*', '[0-9]*-[0-9]*')
+        # Ignora as pastas .tmp e .antigo de uma gravação em andamento
+        return sorted(caminho for caminho in glob.glob(padrao)
+                      if _NOME_SEGMENTO.match(os.path.basename(caminho)) and os.path.isdir(caminho))
+
+    @staticmethod
+    def _ler_segmento(caminho, colunas=None):
+        arquivos = sorted(glob.glob(os.path.join(caminho, '*.npy')))
+        return {
+            os.path.basename(arquivo)[:-4]: np.load(arquivo, mmap_mode='r')
+            for arquivo in arquivos
+            if colunas is None or os.path.basename(arquivo)[:-4] in colunas
+        }
+
+    def ler(self, tipo, colunas=None):
+        """Gera, segmento a segmento, os dicionários de colunas (arrays em mmap)."""
+        for caminho in self.segmentos(tipo):
+            yield self._ler_segmento(caminho, colunas)
+
+    @staticmethod
+    def _escrever(destino, colunas):
+        temporario = f'{destino}.tmp'
+        shutil.rmtree(temporario, ignore_errors=True)
+        os.makedirs(temporario)
+        for nome, valores in colunas.items():
+            with open(os.path.join(temporario, f'{nome}.npy'), 'wb') as f:
+                np.save(f, valores)
+                f.flush()
+                os.fsync(f.fileno())
+        return temporario
+
+    def gravar(self, tipo, mes, colunas):
+        """Grava as linhas de um mês (`colunas['id']` obrigatória) como um segmento novo.
+
+        Ids que já estão no arquivo são ignorados, então repetir uma compactação
+        interrompida não duplica linhas. Retorna quantas linhas foram gravadas.
+        """
+        with self._travado():
+            ids = colunas['id']
+            for caminho in self.segmentos(tipo, mes):
+                ids_existentes = self._ler_segmento(caminho, ('id',))['id']
+                novas = ~np.isin(ids, ids_existentes)
+                if not novas.all():
+                    colunas = {nome: valores[novas] for nome, valores in colunas.items()}
+                    ids = colunas['id']
+            if not len(ids):
+                return 0
+            destino = os.path.join(self.pasta, tipo, mes, f'{int(ids.min())}-{int(ids.max())}')
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            if os.path.exists(destino):
+                # Mesmo intervalo de ids já arquivado com outras linhas: junta os dois
+                antigas = self._ler_segmento(destino)
+                colunas = {nome: np.concatenate([antigas[nome], valores]) for nome, valores in colunas.items()}
+                self._substituir(destino, colunas)
+            else:
+                os.rename(self._escrever(destino, colunas), destino)
+            return len(ids)
+
+    def _substituir(self, destino, colunas):
+        temporario = self._escrever(destino, colunas)
+        antigo = f'{destino}.antigo'
+        os.rename(destino, antigo)
+        os.rename(temporario, destino)
+        shutil.rmtree(antigo)
+
+    def ler_usuarios(self, tipo, usuarios):
+        """As linhas dos usuários (dicionário de colunas), sem uma remoção pela metade no meio."""
+        if not self.segmentos(tipo):
+            return {}
+        usuarios = np.asarray(list(usuarios), dtype=np.int64)
+        lidas = []
+        with self._travado(compartilhado=True):
+            for caminho in self.segmentos(tipo):
+                colunas = self._ler_segmento(caminho)
+                filtro = np.isin(colunas['usuario_id'], usuarios)
+                if filtro.any():
+                    lidas.append({nome: np.array(valores[filtro]) for nome, valores in colunas.items()})
+        return _juntar(lidas)
+
+    def remover_usuarios(self, tipo, usuarios):
+        """Apaga do arquivo as linhas dos usuários e as devolve (dicionário de colunas)."""
+        if not self.segmentos(tipo):
+            return {}
+        usuarios = np.asarray(list(usuarios), dtype=np.int64)
+        removidas = []
+        with self._travado():
+            for caminho in self.segmentos(tipo):
+                colunas = self._ler_segmento(caminho)
+                remover = np.isin(colunas['usuario_id'], usuarios)
+                if not remover.any():
+                    continue
+                removidas.append({nome: np.array(valores[remover]) for nome, valores in colunas.items()})
+                manter = {nome: np.array(valores[~remover]) for nome, valores in colunas.items()}
+                del colunas
+                if manter['id'].size:
+                    self._substituir(caminho, manter)
+                else:
+                    shutil.rmtree(caminho)
+        return _juntar(removidas)
+
+    def resumo(self):
+        """Segmentos, linhas e bytes em disco por tipo."""
+        tipos = {}
+        for pasta_tipo in sorted(glob.glob(os.path.join(self.pasta, '*'))):
+            if not os.path.isdir(pasta_tipo):
+                continue
+            tipo = os.path.basename(pasta_tipo)
+            segmentos = self.segmentos(tipo)
+            tipos[tipo] = {
+                'segmentos': len(segmentos),
+                'linhas': sum(len(self._ler_segmento(s, ('id',))['id']) for s in segmentos),
+                'bytes': sum(os.path.getsize(a) for s in segmentos for a in glob.glob(os.path.join(s, '*.npy'))),
+            }
+        return tipos
+
+
+def _juntar(partes):
+    if not partes:
+        return {}
+    return {nome: np.concatenate([parte[nome] for parte in partes]) for nome in partes[0]}
@@ -0,0 +1,135 @@
+"""Perfis de conexão do SQLite: PRAGMAs, busy timeout, pool somente leitura e retentativas.
+
+O perfil é escolhido pela variável DB_PERFIL:
+
+- `padrao`: configuração do SQLite sem ajustes (journal de rollback).
+- `producao`: WAL, synchronous=NORMAL, mmap, cache maior e busy timeout; as
+  consultas de leitura do admin usam um pool separado, aberto em modo
+  somente leitura, que no WAL nunca bloqueia nem é bloqueado pelos escritores.
+
+Em todos os perfis as chaves estrangeiras ficam ligadas (o SQLite vem com
+elas desligadas), para valer o ON DELETE CASCADE das tabelas do usuário, e
+bancos novos nascem com auto_vacuum incremental (ver `vacuum_incremental`).
+"""
+import logging
+import random
+import sqlite3
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+PERFIS = {
+    'padrao': {},
+    'producao': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # em KiB (negativo), ou seja 64 MiB por conexão
+        'temp_store': 'MEMORY',
+    },
+}
+
+
+def _aplicar_pragmas(conexao, pragmas):
+    cursor = conexao.cursor()
+    try:
+        for nome, valor in pragmas.items():
+            cursor.execute(f'PRAGMA {nome}={valor}')
+    finally:
+        cursor.close()
+
+
+def configurar(engine, perfil):
+    """Aplica os PRAGMAs do perfil a cada nova conexão do engine."""
+    if perfil not in PERFIS:
+        raise ValueError(f"DB_PERFIL inválido: {perfil!r} (use {', '.join(PERFIS)})")
+    # auto_vacuum só tem efeito antes da primeira tabela; nos bancos existentes é ignorado
+    pragmas = {'auto_vacuum': 'INCREMENTAL', 'foreign_keys': 'ON', **PERFIS[perfil]}
+
+    @event.listens_for(engine, 'connect')
+    def _ao_conectar(conexao, _registro):
+        _aplicar_pragmas(conexao, pragmas)
+
+
+def criar_engine_leitura(caminho, perfil, tamanho_pool=5):
+    """Engine separado para consultas somente leitura, ou None se o perfil não usa.
+
+    As conexões abrem o arquivo com mode=ro e query_only, então qualquer
+    escrita acidental por esse pool falha em vez de disputar o lock.
+    """
+    if perfil != 'producao' or not caminho or caminho == ':memory:':
+        return None
+    pragmas = {nome: valor for nome, valor in PERFIS[perfil].items() if nome not in ('journal_mode', 'synchronous')}
+    pragmas['query_only'] = 1
+
+    def conectar():
+        conexao = sqlite3.connect(f'file:{caminho}?mode=ro', uri=True, check_same_thread=False)
+        _aplicar_pragmas(conexao, pragmas)
+        return conexao
+
+    return create_engine('sqlite://', creator=conectar, poolclass=QueuePool, pool_size=tamanho_pool)
+
+
+def vacuum_incremental(engine, paginas=None):
+    """Devolve ao sistema até `paginas` páginas livres (todas, se None).
+
+    Só funciona com auto_vacuum incremental; retorna False se o banco não usa.
+    O SQLite libera uma página a cada passo do PRAGMA e o sqlite3 do Python
+    dá um passo só por execute, daí uma execução por página.
+    """
+    with engine.connect() as conexao:
+        if conexao.exec_driver_sql('PRAGMA auto_vacuum').scalar() != 2:
+            return False
+        livres = conexao.exec_driver_sql('PRAGMA freelist_count').scalar()
+        cursor = conexao.connection.driver_connection.cursor()
+        try:
+            for _ in range(livres if paginas is None else min(paginas, livres)):
+                cursor.execute('PRAGMA incremental_vacuum(1)')
+        finally:
+            cursor.close()
+    return True
+
+
+def ativar_vacuum_incremental(engine):
+    """Converte um banco existente para auto_vacuum incremental (reescreve o arquivo inteiro)."""
+    with engine.connect() as conexao:
+        if conexao.exec_driver_sql('PRAGMA auto_vacuum').scalar() == 2:
+            return
+        logger.info("Convertendo o banco para auto_vacuum incremental (VACUUM)")
+        conexao.exec_driver_sql('PRAGMA auto_vacuum=INCREMENTAL')
+        conexao.exec_driver_sql('VACUUM')
+
+
+def banco_ocupado(erro):
+    mensagem = str(getattr(erro, 'orig', erro)).lower()
+    return 'database is locked' in mensagem or 'database is busy' in mensagem
+
+
+def erro_transitorio(erro):
+    """Falha que pode passar repetindo a mesma gravação (banco ocupado ou indisponível), não dados inválidos."""
+    return isinstance(erro, (OperationalError, sqlite3.OperationalError))
+
+
+def executar_com_retentativa(sessao, operacao, tentativas=5, espera=0.05):
+    """Executa `operacao()` e faz commit, repetindo se o banco estiver ocupado.
+
+    O busy timeout cobre a maior parte das esperas, mas o SQLite devolve
+    SQLITE_BUSY na hora quando uma transação de leitura tenta virar escrita
+    com outro escritor ativo; nesse caso a transação inteira é refeita.
+    """
+    for tentativa in range(tentativas):
+        try:
+            resultado = operacao()
+            sessao.commit()
+            return resultado
+        except OperationalError as erro:
+            sessao.rollback()
+            if not banco_ocupado(erro) or tentativa == tentativas - 1:
+                raise
+            logger.warning(f"Banco ocupado, nova tentativa ({tentativa + 1}/{tentativas})")
+            time.sleep(espera * 2 ** tentativa * random.uniform(0.5, 1.5))
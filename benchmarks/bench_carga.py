@@ -0,0 +1,264 @@
+"""Teste de carga HTTP: gunicorn local e vários processos clientes com keep-alive.
+
+Sobe o gunicorn (como no Procfile) sobre uma cópia do banco gerado pelo
+gerar_dados.py e dispara `--clientes` processos, cada um com uma conexão
+HTTP/1.1 persistente fazendo requisições em sequência (laço fechado) com os
+cenários de uma mistura ponderada. Cada cliente entra com uma conta gerada
+(e como admin, se a mistura pedir). Mede latência p50/p95/p99, vazão e
+respostas de erro por cenário, descartando os primeiros `--aquecimento`
+segundos; o resultado vai para benchmarks/resultados/ em JSON. Os clientes
+não esperam o Retry-After: nas misturas de escrita o controle de admissão
+recusa boa parte das requisições (use `--sem-admissao` para medir a vazão).
+
+    python benchmarks/bench_carga.py --banco /tmp/verdetech-bench.db --workers 2 --threads 4 --clientes 16
+    python benchmarks/bench_carga.py --url http://127.0.0.1:5000 --banco fecart/instance/verdetech.db
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+import comum
+import gerar_dados
+
+# Pesos dos cenários de comum.CENARIOS em cada mistura (cada página vista faz um /api/bootstrap)
+MISTURAS = {
+    'misto': {'pagina_inicial': 10, 'pagina_carbono': 5, 'bootstrap': 15, 'calcular_pegada': 10, 'salvar_quiz': 5,
+              'feedback_buscar': 5, 'conquistas': 10, 'conquistas_secao': 5, 'ranking': 10,
+              'admin_dados': 1, 'admin_estatisticas': 1},
+    'leitura': {'pagina_inicial': 10, 'bootstrap': 10, 'feedback_buscar': 5, 'conquistas': 10, 'ranking': 10,
+                'historico': 5},
+    'escrita': {'calcular_pegada': 10, 'salvar_quiz': 10, 'feedback_salvar': 5, 'calcular_pegada_lote': 1},
+    'admin': {'admin_relatorio': 1, 'admin_dados': 5, 'admin_estatisticas': 5, 'admin_feedbacks': 5,
+              'admin_feedbacks_busca': 5},
+    'login': {'login': 1},
+    # Pico de escritas e logins: o /health deve continuar rápido e o excesso sair como 429/503
+    'pico': {'calcular_pegada': 10, 'salvar_quiz': 10, 'feedback_salvar': 5, 'login': 5, 'health': 5},
+}
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def ambiente_servidor(caminho, perfil, **extra):
+    """Variáveis do app para usar o banco `caminho`, com os arquivos auxiliares ao lado dele."""
+    pasta = os.path.dirname(caminho)
+    return dict(os.environ, RENDER='1', DATABASE_URL=f'sqlite:///{caminho}', DB_PERFIL=perfil,
+                METRICAS_DIR=os.path.join(pasta, 'metricas'), ARQUIVO_DIR=os.path.join(pasta, 'arquivo'),
+                CACHE_DB=os.path.join(pasta, 'cache.db'), ADMISSAO_DB=os.path.join(pasta, 'admissao.db'), **extra)
+
+
+def iniciar_gunicorn(caminho, args):
+    porta = _porta_livre()
+    ambiente = ambiente_servidor(caminho, args.perfil, ADMISSAO_ATIVA='0' if args.sem_admissao else '1',
+                                 GUNICORN_THREADS=str(args.threads))
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{porta}', '--workers', str(args.workers),
+         '--log-level', 'warning', 'app:create_app()'],
+        cwd=comum.RAIZ, env=ambiente)
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            raise SystemExit(f'gunicorn terminou com código {processo.returncode}')
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=2)
+            conexao.request('GET', '/health')
+            if conexao.getresponse().status == 200:
+                return processo, f'http://127.0.0.1:{porta}'
+        except OSError:
+            time.sleep(0.2)
+    processo.terminate()
+    raise SystemExit('gunicorn não respondeu ao /health em 60 s')
+
+
+def _contas(caminho, clientes):
+    """Uma conta gerada por cliente (repetindo se faltar) e a do admin, se houver."""
+    import sqlite3
+    with sqlite3.connect(caminho) as conexao:
+        usuarios = [u for (u,) in conexao.execute(
+            "SELECT username FROM auth WHERE username LIKE 'bench%' ORDER BY id LIMIT ?", (clientes,))]
+        admin = conexao.execute('SELECT 1 FROM auth WHERE username = ?', (comum.ADMIN,)).fetchone()
+    if not usuarios:
+        raise SystemExit('O banco não tem contas geradas: rode o gerar_dados.py')
+    return [usuarios[i % len(usuarios)] for i in range(clientes)], comum.ADMIN if admin else None
+
+
+class Cliente:
+    """Conexão HTTP persistente com os cookies de sessão de cada perfil.
+
+    Cada cliente se apresenta com um IP próprio no X-Forwarded-For, para que
+    o controle de admissão do app não trate todos como um cliente só.
+    """
+
+    def __init__(self, url, ip='127.0.0.1'):
+        partes = urlsplit(url)
+        self.host, self.porta = partes.hostname, partes.port or 80
+        self.ip = ip
+        self.conexao = None
+        self.cookies = {'anonimo': ''}
+
+    def requisitar(self, metodo, caminho, perfil='anonimo', corpo=None, form=None):
+        cabecalhos = {'X-Forwarded-For': self.ip}
+        if self.cookies[perfil]:
+            cabecalhos['Cookie'] = self.cookies[perfil]
+        if corpo is not None:
+            corpo = json.dumps(corpo)
+            cabecalhos['Content-Type'] = 'application/json'
+        elif form is not None:
+            corpo = urlencode(form)
+            cabecalhos['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            if self.conexao is None:
+                self.conexao = http.client.HTTPConnection(self.host, self.porta, timeout=60)
+            self.conexao.request(metodo, caminho, corpo, cabecalhos)
+            resposta = self.conexao.getresponse()
+            resposta.read()
+        except (OSError, http.client.HTTPException):
+            self.conexao.close()
+            self.conexao = None
+            return 0, None
+        cookie = resposta.headers.get('Set-Cookie')
+        if cookie and perfil != 'anonimo':
+            # A sessão do Flask fica no cookie: rotas que mudam a sessão trocam o cookie
+            self.cookies[perfil] = '; '.join(f'{k}={v.value}' for k, v in SimpleCookie(cookie).items())
+        return resposta.status, cookie
+
+    def entrar(self, perfil, email, senha):
+        for _ in range(30):
+            status, cookie = self.requisitar('POST', '/login', form={'email': email, 'password': senha})
+            if status not in (429, 503):
+                break
+            # Clientes entrando juntos esbarram no controle de admissão: espera e tenta de novo
+            time.sleep(1 + random.random())
+        if status != 302 or not cookie:
+            raise RuntimeError(f'Falha no login de {email} (status {status})')
+        self.cookies[perfil] = '; '.join(f'{k}={v.value}' for k, v in SimpleCookie(cookie).items())
+
+
+def trabalhar(indice, url, conta, admin, senha, mistura, inicio_medicao, fim, semente, resultados):
+    rnd = random.Random(semente + indice)
+    cliente = Cliente(url, f'10.0.{indice // 250}.{indice % 250 + 1}')
+    cliente.entrar('usuario', conta, senha)
+    if admin:
+        cliente.entrar('admin', admin, senha)
+    nomes = list(mistura)
+    pesos = [mistura[n] for n in nomes]
+    registros = []
+    while (agora := time.time()) < fim:
+        nome = rnd.choices(nomes, pesos)[0]
+        cenario = comum.CENARIOS[nome]
+        form = {k: v.format(email=conta, senha=senha) for k, v in cenario.form.items()} if cenario.form else None
+        inicio = time.perf_counter()
+        status, _ = cliente.requisitar(cenario.metodo, cenario.caminho, cenario.perfil, cenario.json, form)
+        latencia = time.perf_counter() - inicio
+        if agora >= inicio_medicao:
+            registros.append((nome, latencia, status))
+    resultados.put(registros)
+
+
+def executar(url, caminho, args):
+    contas, admin = _contas(caminho, args.clientes)
+    mistura = dict(MISTURAS[args.mistura])
+    if admin is None:
+        for nome in [n for n in mistura if comum.CENARIOS[n].perfil == 'admin']:
+            print(f'{nome}: pulado, sem conta admin no banco (gere com --admin)')
+            del mistura[nome]
+    if not mistura:
+        raise SystemExit('Nenhum cenário da mistura pode ser executado')
+    usa_admin = admin if any(comum.CENARIOS[n].perfil == 'admin' for n in mistura) else None
+
+    contexto = multiprocessing.get_context('spawn')
+    resultados = contexto.Queue()
+    # Margem para os processos subirem e fazerem login antes de começar
+    inicio = time.time() + 2 + args.clientes * 0.1
+    inicio_medicao, fim = inicio + args.aquecimento, inicio + args.aquecimento + args.duracao
+    processos = [
+        contexto.Process(target=trabalhar, args=(i, url, contas[i], usa_admin, args.senha, mistura,
+                                                 inicio_medicao, fim, args.semente, resultados))
+        for i in range(args.clientes)
+    ]
+    for p in processos:
+        p.start()
+    registros = [r for _ in processos for r in resultados.get()]
+    for p in processos:
+        p.join()
+    return registros
+
+
+def resumir(registros, duracao):
+    por_cenario = defaultdict(list)
+    for nome, latencia, status in registros:
+        por_cenario[nome].append((latencia, status))
+    por_cenario['total'] = [(latencia, status) for _, latencia, status in registros]
+    resumo = {}
+    for nome, medidas in por_cenario.items():
+        status = Counter(s for _, s in medidas)
+        resumo[nome] = comum.resumir([latencia for latencia, _ in medidas], duracao)
+        resumo[nome].update(erros=sum(n for s, n in status.items() if s == 0 or s >= 400),
+                            status={str(k): v for k, v in sorted(status.items())})
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--banco', help=f'banco gerado pelo gerar_dados.py (ex.: {gerar_dados.BANCO_PADRAO})')
+    parser.add_argument('--usuarios', type=int, default=1000, help='tamanho do banco gerado sem --banco')
+    parser.add_argument('--url', help='servidor já no ar (usa o --banco só para achar as contas)')
+    parser.add_argument('--mistura', choices=sorted(MISTURAS), default='misto')
+    parser.add_argument('--clientes', type=int, default=8, help='processos clientes')
+    parser.add_argument('--duracao', type=float, default=20, help='segundos medidos')
+    parser.add_argument('--aquecimento', type=float, default=3, help='segundos descartados no início')
+    parser.add_argument('--workers', type=int, default=2, help='workers do gunicorn')
+    parser.add_argument('--threads', type=int, default=4, help='threads por worker do gunicorn')
+    parser.add_argument('--perfil', default='producao', help='DB_PERFIL do app')
+    parser.add_argument('--sem-admissao', action='store_true',
+                        help='desliga o controle de admissão (mede a vazão sem 429/503)')
+    parser.add_argument('--senha', default=gerar_dados.SENHA_PADRAO)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', help='arquivo JSON (padrão: benchmarks/resultados/carga-<data>.json)')
+    args = parser.parse_args()
+
+    servidor = None
+    if args.url:
+        if not args.banco:
+            raise SystemExit('Com --url informe o --banco usado pelo servidor')
+        caminho, url = args.banco, args.url
+    else:
+        caminho = comum.banco_temporario()
+        if args.banco:
+            comum.copiar_banco(args.banco, caminho)
+        else:
+            gerar_dados.popular(caminho, usuarios=args.usuarios, pegadas=5 * args.usuarios,
+                                quizzes=5 * args.usuarios, feedbacks=args.usuarios // 2, admin=True)
+        servidor, url = iniciar_gunicorn(caminho, args)
+    try:
+        linhas = comum.contar_linhas(caminho)
+        resumo = resumir(executar(url, caminho, args), args.duracao)
+    finally:
+        if servidor is not None:
+            servidor.terminate()
+            servidor.wait()
+
+    print(f'{"cenario":<22} {"n":>7} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"erros":>6}  status')
+    for nome, r in sorted(resumo.items(), key=lambda item: (item[0] == 'total', item[0])):
+        print(f'{nome:<22} {r["n"]:>7} {r["req_s"]:>8.1f} {r["p50_ms"]:>8.2f} {r["p95_ms"]:>8.2f} '
+              f'{r["p99_ms"]:>8.2f} {r["erros"]:>6}  {r["status"]}')
+    parametros = {k: v for k, v in vars(args).items() if k not in ('saida', 'senha')}
+    parametros['linhas'] = linhas
+    print(f'\nResultado gravado em {comum.gravar_resultado("carga", parametros, resumo, args.saida)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Benchmark de contenção: vários processos gravando e lendo o mesmo SQLite.
+
+Para cada perfil de DB_PERFIL, sobe processos escritores (gravando quizzes
+como /api/salvar-quiz) e leitores (montando o relatório do admin) ao mesmo
+tempo, e mede vazão, latência e erros "database is locked".
+
+    python benchmarks/bench_contencao.py --perfis padrao producao --escritores 4 --leitores 2
+"""
+import argparse
+import multiprocessing
+import time
+
+import comum
+
+
+def _criar_app(caminho, perfil):
+    return comum.criar_app(caminho, DB_PERFIL=perfil)
+
+
+def preparar(caminho, perfil, usuarios):
+    m, app = _criar_app(caminho, perfil)
+    from sqlalchemy import insert
+    with app.app_context():
+        m.db.session.execute(insert(m.Usuario), [
+            {'id': i, 'nome': f'Pessoa {i}', 'email': f'p{i}@exemplo.com'} for i in range(1, usuarios + 1)
+        ])
+        m.db.session.execute(insert(m.PegadaCarbono), [
+            {'usuario_id': i, 'transporte': 1.0, 'energia': 1.0, 'alimentacao': 1, 'lixo': 1, 'total_co2': 14.7}
+            for i in range(1, usuarios + 1)
+        ])
+        m.db.session.commit()
+
+
+def trabalhar(papel, caminho, perfil, duracao, usuarios, resultados):
+    m, app = _criar_app(caminho, perfil)
+    from sqlalchemy.exc import OperationalError
+    latencias, erros = [], 0
+    with app.app_context():
+        fim = time.monotonic() + duracao
+        i = 0
+        while time.monotonic() < fim:
+            i += 1
+            inicio = time.perf_counter()
+            try:
+                if papel == 'escritor':
+                    m._registrar_atividade('quiz', {
+                        'usuario_id': i % usuarios + 1, 'pontuacao': i % 10, 'total_perguntas': 10
+                    })
+                else:
+                    list(m.consultar_relatorio())
+                latencias.append(time.perf_counter() - inicio)
+            except OperationalError as e:
+                m.db.session.rollback()
+                if not m.banco.banco_ocupado(e):
+                    raise
+                erros += 1
+            finally:
+                m.db.session.remove()
+    resultados.put((papel, latencias, erros))
+
+
+def executar(perfil, args):
+    contexto = multiprocessing.get_context('spawn')
+    caminho = comum.banco_temporario()
+    processo = contexto.Process(target=preparar, args=(caminho, perfil, args.usuarios))
+    processo.start()
+    processo.join()
+
+    resultados = contexto.Queue()
+    processos = [
+        contexto.Process(target=trabalhar, args=(papel, caminho, perfil, args.duracao, args.usuarios, resultados))
+        for papel in ['escritor'] * args.escritores + ['leitor'] * args.leitores
+    ]
+    for p in processos:
+        p.start()
+    coletados = [resultados.get() for _ in processos]
+    for p in processos:
+        p.join()
+
+    for papel in ('escritor', 'leitor'):
+        r = comum.resumir([x for q, lat, _ in coletados if q == papel for x in lat], args.duracao)
+        erros = sum(e for q, _, e in coletados if q == papel)
+        print(f'{perfil:>9} {papel:>9} {r["req_s"]:>9.1f} {r["p50_ms"]:>8.1f} '
+              f'{r["p95_ms"]:>8.1f} {r["p99_ms"]:>8.1f} {erros:>7}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--perfis', nargs='+', default=['padrao', 'producao'])
+    parser.add_argument('--escritores', type=int, default=4)
+    parser.add_argument('--leitores', type=int, default=2)
+    parser.add_argument('--usuarios', type=int, default=2000)
+    parser.add_argument('--duracao', type=float, default=10, help='segundos por perfil')
+    args = parser.parse_args()
+
+    print(f'{"perfil":>9} {"papel":>9} {"ops/s":>9} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"locked":>7}')
+    for perfil in args.perfis:
+        executar(perfil, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Microbenchmarks de cada rota pelo test client do Flask (sem rede nem servidor).
+
+Roda os cenários de comum.CENARIOS em série sobre uma cópia do banco gerado
+pelo gerar_dados.py (o original não é alterado; sem `--banco`, gera um pequeno)
+e mede latência, comandos SQL e bytes por requisição. O resultado vai para
+benchmarks/resultados/ em JSON; compare duas execuções com comparar.py.
+
+    python benchmarks/gerar_dados.py --substituir --admin --usuarios 100000 --pegadas 1000000 --quizzes 1000000
+    python benchmarks/bench_endpoints.py --repeticoes 200
+    python benchmarks/bench_endpoints.py --cenarios ranking conquistas --perfil producao
+"""
+import argparse
+import statistics
+import time
+from collections import Counter
+
+import comum
+import gerar_dados
+
+
+def preparar(args):
+    caminho = comum.banco_temporario()
+    if args.banco:
+        comum.copiar_banco(args.banco, caminho)
+    else:
+        gerar_dados.popular(caminho, usuarios=args.usuarios, pegadas=5 * args.usuarios,
+                            quizzes=5 * args.usuarios, feedbacks=args.usuarios // 2, admin=True)
+    return (caminho, *comum.criar_app(caminho, DB_PERFIL=args.perfil))
+
+
+def _sessoes(m, app):
+    """Dados de sessão de cada perfil, como o /login gravaria."""
+    from sqlalchemy import select
+    with app.app_context():
+        contas = {}
+        for perfil, condicao in (('usuario', m.Auth.username.like('bench%')), ('admin', m.Auth.username == comum.ADMIN)):
+            auth = m.db.session.execute(select(m.Auth).where(condicao).order_by(m.Auth.id).limit(1)).scalar()
+            if auth is not None:
+                contas[perfil] = {'user_id': auth.usuario_id, 'username': auth.username, 'nome': auth.usuario.nome}
+        m.db.session.remove()
+    return contas
+
+
+def medir(m, app, cliente, cenario, conta, repeticoes, aquecimento):
+    with app.app_context():
+        engines = (m.db.engine, app.extensions['verdetech'].engine_leitura)
+    kwargs = {'json': cenario.json}
+    if cenario.form:
+        kwargs = {'data': {k: v.format(**conta) for k, v in cenario.form.items()}}
+    latencias, consultas, tamanhos, status = [], [], [], Counter()
+    for i in range(aquecimento + repeticoes):
+        with comum.contar_consultas(*engines) as contador:
+            inicio = time.perf_counter()
+            resposta = cliente.open(cenario.caminho, method=cenario.metodo, **kwargs)
+            corpo = resposta.get_data()  # consome também as respostas em streaming
+            latencia = time.perf_counter() - inicio
+            resposta.close()
+        if i >= aquecimento:
+            latencias.append(latencia)
+            consultas.append(contador[0])
+            tamanhos.append(len(corpo))
+            status[resposta.status_code] += 1
+    resultado = comum.resumir(latencias)
+    resultado.update(consultas=statistics.median(consultas), bytes=statistics.median(tamanhos),
+                     status={str(k): v for k, v in sorted(status.items())})
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--banco', help=f'banco gerado pelo gerar_dados.py (ex.: {gerar_dados.BANCO_PADRAO})')
+    parser.add_argument('--usuarios', type=int, default=1000, help='tamanho do banco gerado sem --banco')
+    parser.add_argument('--cenarios', nargs='+', choices=sorted(comum.CENARIOS), default=list(comum.CENARIOS))
+    parser.add_argument('--repeticoes', type=int, default=50)
+    parser.add_argument('--aquecimento', type=int, default=5)
+    parser.add_argument('--perfil', default='padrao', help='DB_PERFIL do app')
+    parser.add_argument('--senha', default=gerar_dados.SENHA_PADRAO)
+    parser.add_argument('--saida', help='arquivo JSON (padrão: benchmarks/resultados/endpoints-<data>.json)')
+    args = parser.parse_args()
+
+    caminho, m, app = preparar(args)
+    sessoes = _sessoes(m, app)
+    print(f'{"cenario":<22} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"req/s":>8} {"SQL":>5} {"bytes":>9}  status')
+    resultados = {}
+    for nome in args.cenarios:
+        cenario = comum.CENARIOS[nome]
+        if cenario.perfil != 'anonimo' and cenario.perfil not in sessoes:
+            print(f'{nome:<22} pulado: sem conta {cenario.perfil} no banco (gere com --admin)')
+            continue
+        cliente = app.test_client()
+        conta = dict(sessoes.get('usuario', {}), senha=args.senha)
+        conta['email'] = conta.get('username')
+        if cenario.perfil != 'anonimo':
+            with cliente.session_transaction() as sessao:
+                sessao.update(sessoes[cenario.perfil])
+        r = medir(m, app, cliente, cenario, conta, args.repeticoes, args.aquecimento)
+        resultados[nome] = r
+        print(f'{nome:<22} {r["p50_ms"]:>8.2f} {r["p95_ms"]:>8.2f} {r["p99_ms"]:>8.2f} {r["req_s"]:>8.1f} '
+              f'{r["consultas"]:>5g} {r["bytes"]:>9.0f}  {r["status"]}')
+
+    parametros = {k: v for k, v in vars(args).items() if k not in ('saida', 'senha')}
+    parametros['linhas'] = comum.contar_linhas(caminho)
+    print(f'\nResultado gravado em {comum.gravar_resultado("endpoints", parametros, resultados, args.saida)}')
+
+
+if __name__ == '__main__':
+    main()
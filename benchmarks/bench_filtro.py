@@ -0,0 +1,78 @@
+"""Microbenchmark do filtro de palavras: laço antigo x regex única do filtro_conteudo.
+
+Mede a validação de nomes e a busca em textos de feedback de tamanhos
+crescentes. O laço antigo percorre o texto uma vez por palavra da lista; o
+filtro percorre uma vez só, mas também normaliza acentos e leetspeak, confere
+fronteira de palavra e devolve as posições (para mascarar). `--ofensivas` é a
+fração de palavras ofensivas no texto gerado.
+Usa um banco SQLite temporário, nunca o fecart/instance/verdetch.db.
+
+    python benchmarks/bench_filtro.py --tamanhos 1000 100000 1000000
+"""
+import argparse
+import random
+import re
+import timeit
+
+import comum
+
+comum.importar_app(comum.banco_temporario())
+
+from app import PALAVRAS_OFENSIVAS, PROHIBITED_WORDS, filtro_feedback, filtro_nomes  # noqa: E402
+
+NOMES = ['Maria Silva', 'João Pereira', 'Ana Beatriz Souza', 'Carlos Eduardo', 'Gordon Freeman']
+
+
+def validar_legado(name):
+    """validate_name() anterior, mantida aqui só para comparação."""
+    name_lower = name.lower().strip()
+    for word in PROHIBITED_WORDS:
+        if word in name_lower:
+            return False
+    return bool(re.match(r'^[a-zA-ZÀ-ÿ\s]+$', name))
+
+
+def buscar_legado(texto):
+    texto = texto.lower()
+    return [word for word in PALAVRAS_OFENSIVAS if word in texto]
+
+
+def texto_aleatorio(tamanho, ofensivas, rnd):
+    vocabulario = ['o', 'quiz', 'foi', 'muito', 'bom', 'aprendi', 'sobre', 'reciclagem', 'energia',
+                   'cidade', 'sustentável', 'gostei', 'das', 'perguntas', 'e', 'da', 'calculadora']
+    palavras, total = [], 0
+    while total < tamanho:
+        palavra = rnd.choice(PALAVRAS_OFENSIVAS if rnd.random() < ofensivas else vocabulario)
+        palavras.append(palavra)
+        total += len(palavra) + 1
+    return ' '.join(palavras)[:tamanho]
+
+
+def medir(funcao, argumento, repeticoes):
+    return min(timeit.repeat(lambda: funcao(argumento), number=1, repeat=repeticoes)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tamanhos', nargs='+', type=int, default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--ofensivas', type=float, default=0.01)
+    args = parser.parse_args()
+
+    n = 10000
+    legado = min(timeit.repeat(lambda: [validar_legado(x) for x in NOMES], number=n // len(NOMES), repeat=3))
+    atual = min(timeit.repeat(lambda: [filtro_nomes.primeira(x) for x in NOMES], number=n // len(NOMES), repeat=3))
+    print(f'nomes ({len(PROHIBITED_WORDS)} palavras): laço {legado / n * 1e6:.2f} µs/nome, '
+          f'filtro {atual / n * 1e6:.2f} µs/nome')
+
+    rnd = random.Random(42)
+    print(f'\n{"caracteres":>12} {"laço ms":>10} {"filtro ms":>12} {"máscara ms":>11}')
+    for tamanho in args.tamanhos:
+        texto = texto_aleatorio(tamanho, args.ofensivas, rnd)
+        print(f'{tamanho:>12} {medir(buscar_legado, texto, args.repeticoes):>10.2f} '
+              f'{medir(filtro_feedback.encontrar, texto, args.repeticoes):>12.2f} '
+              f'{medir(filtro_feedback.mascarar, texto, args.repeticoes):>11.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Benchmark de subida: importação, create_app, primeira requisição e gunicorn pronto.
+
+Cada medida do app roda em um processo Python novo (a importação só é fria
+uma vez por processo), sobre uma cópia do banco gerado pelo gerar_dados.py:
+tempo do `import app`, do `create_app()`, da primeira requisição ao /health e
+da primeira que consulta o banco (ranking, com a sessão de uma conta gerada).
+Depois sobe o gunicorn com e sem `preload_app` (GUNICORN_PRELOAD) e mede o
+tempo até o /health responder, que é o que a plataforma espera na subida e
+em cada instância nova.
+
+    python benchmarks/bench_inicio.py --banco /tmp/verdetech-bench.db --repeticoes 5 --workers 4
+"""
+import argparse
+import http.client
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+import bench_carga
+import comum
+import gerar_dados
+
+ETAPAS = ('interpretador', 'importacao', 'create_app', 'primeira_health', 'primeira_consulta')
+
+
+def medir_processo(caminho, perfil, conta):
+    """Roda no processo filho: duração de cada etapa da subida, em segundos."""
+    inicio = time.perf_counter()
+    modulo = comum.importar_app(caminho, DB_PERFIL=perfil)
+    importado = time.perf_counter()
+    app = modulo.create_app()
+    criado = time.perf_counter()
+    cliente = app.test_client()
+    status = [cliente.get('/health').status_code]
+    health = time.perf_counter()
+    with cliente.session_transaction() as sessao:
+        sessao.update(conta)
+    status.append(cliente.get('/api/ranking?limit=10').status_code)
+    consulta = time.perf_counter()
+    return {'importacao': importado - inicio, 'create_app': criado - importado,
+            'primeira_health': health - criado, 'primeira_consulta': consulta - health, 'status': status}
+
+
+def _conta(caminho):
+    with sqlite3.connect(caminho) as conexao:
+        linha = conexao.execute(
+            "SELECT usuario_id, username FROM auth WHERE username LIKE 'bench%' ORDER BY id LIMIT 1").fetchone()
+    if linha is None:
+        raise SystemExit('O banco não tem contas geradas: rode o gerar_dados.py')
+    return {'user_id': linha[0], 'username': linha[1], 'nome': 'Bench'}
+
+
+def medir_app(caminho, perfil, repeticoes):
+    conta = json.dumps(_conta(caminho))
+    medidas = {etapa: [] for etapa in ETAPAS}
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        saida = subprocess.run([sys.executable, os.path.abspath(__file__), '--filho', caminho, '--perfil', perfil,
+                                '--conta', conta], capture_output=True, text=True, check=True).stdout
+        total = time.perf_counter() - inicio
+        resultado = json.loads(saida.strip().splitlines()[-1])
+        if any(s != 200 for s in resultado.pop('status')):
+            raise SystemExit(f'Requisição com erro no processo filho: {saida}')
+        # O que sobra do tempo do processo é a subida do Python e a importação do comum
+        resultado['interpretador'] = total - sum(resultado.values())
+        for etapa, valor in resultado.items():
+            medidas[etapa].append(valor)
+    return {etapa: comum.resumir(valores) for etapa, valores in medidas.items()}
+
+
+def medir_gunicorn(caminho, perfil, workers, preload, limite=60):
+    """Segundos do início do gunicorn até o primeiro 200 no /health."""
+    porta = bench_carga._porta_livre()
+    ambiente = bench_carga.ambiente_servidor(caminho, perfil, GUNICORN_PRELOAD='1' if preload else '0',
+                                             GUNICORN_THREADS='4')
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{porta}', '--workers', str(workers),
+         '--log-level', 'warning', 'app:create_app()'],
+        cwd=comum.RAIZ, env=ambiente)
+    try:
+        while time.perf_counter() - inicio < limite:
+            if processo.poll() is not None:
+                raise SystemExit(f'gunicorn terminou com código {processo.returncode}')
+            try:
+                conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=5)
+                conexao.request('GET', '/health')
+                if conexao.getresponse().status == 200:
+                    return time.perf_counter() - inicio
+            except OSError:
+                time.sleep(0.01)
+        raise SystemExit(f'gunicorn não respondeu ao /health em {limite} s')
+    finally:
+        processo.terminate()
+        processo.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--banco', help=f'banco gerado pelo gerar_dados.py (ex.: {gerar_dados.BANCO_PADRAO})')
+    parser.add_argument('--usuarios', type=int, default=1000, help='tamanho do banco gerado sem --banco')
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=2, help='workers do gunicorn')
+    parser.add_argument('--perfil', default='producao', help='DB_PERFIL do app')
+    parser.add_argument('--sem-gunicorn', action='store_true', help='mede só o app em processos novos')
+    parser.add_argument('--saida', help='arquivo JSON (padrão: benchmarks/resultados/inicio-<data>.json)')
+    parser.add_argument('--filho', help=argparse.SUPPRESS)
+    parser.add_argument('--conta', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        print(json.dumps(medir_processo(args.filho, args.perfil, json.loads(args.conta))))
+        return
+
+    caminho = comum.banco_temporario()
+    if args.banco:
+        comum.copiar_banco(args.banco, caminho)
+    else:
+        gerar_dados.popular(caminho, usuarios=args.usuarios, pegadas=5 * args.usuarios,
+                            quizzes=5 * args.usuarios, feedbacks=args.usuarios // 2)
+
+    resultados = medir_app(caminho, args.perfil, args.repeticoes)
+    print(f'{"etapa":<22} {"p50 ms":>8} {"max ms":>8}')
+    for etapa, r in resultados.items():
+        print(f'{etapa:<22} {r["p50_ms"]:>8.1f} {r["max_ms"]:>8.1f}')
+    if not args.sem_gunicorn:
+        for preload in (False, True):
+            nome = 'gunicorn_preload' if preload else 'gunicorn_sem_preload'
+            resultados[nome] = comum.resumir(
+                [medir_gunicorn(caminho, args.perfil, args.workers, preload) for _ in range(args.repeticoes)])
+            print(f'{nome:<22} {resultados[nome]["p50_ms"]:>8.1f} {resultados[nome]["max_ms"]:>8.1f}')
+
+    parametros = {k: v for k, v in vars(args).items() if k not in ('saida', 'filho', 'conta')}
+    parametros['linhas'] = comum.contar_linhas(caminho)
+    print(f'\nResultado gravado em {comum.gravar_resultado("inicio", parametros, resultados, args.saida)}')
+
+
+if __name__ == '__main__':
+    main()
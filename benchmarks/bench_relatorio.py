@@ -0,0 +1,87 @@
+"""Benchmark do /admin/relatorio: consultas SQL e latência por número de usuários.
+
+Compara o relatório atual (consulta única), nos formatos de linhas e colunar
+(`?format=columnar`, latência e tamanho da resposta), com o laço antigo (3
+consultas por usuário). Usa um banco SQLite temporário, nunca o
+fecart/instance/verdetch.db.
+
+    python benchmarks/bench_relatorio.py --usuarios 100 1000 10000
+"""
+import argparse
+import statistics
+import time
+
+import comum
+import gerar_dados
+
+CAMINHO = comum.banco_temporario()
+m, app = comum.criar_app(CAMINHO)
+
+from app import Feedback, PegadaCarbono, ResultadoQuiz, Usuario, db  # noqa: E402
+
+
+def popular(n_usuarios, atividades_por_usuario=3):
+    db.drop_all()
+    db.create_all()
+    db.session.commit()
+    gerar_dados.popular(CAMINHO, usuarios=n_usuarios, pegadas=n_usuarios * atividades_por_usuario,
+                        quizzes=n_usuarios * atividades_por_usuario, feedbacks=n_usuarios, dias=90,
+                        anonimas=0, agregados=False)
+
+
+def relatorio_legado():
+    """Implementação anterior (N+1), mantida aqui só para comparação."""
+    relatorio = []
+    for u in Usuario.query.all():
+        pegada = (PegadaCarbono.query.filter_by(usuario_id=u.id)
+                  .order_by(PegadaCarbono.data_calculo.desc(), PegadaCarbono.id.desc()).first())
+        quiz = (ResultadoQuiz.query.filter_by(usuario_id=u.id)
+                .order_by(ResultadoQuiz.data_realizacao.desc(), ResultadoQuiz.id.desc()).first())
+        feedback = (Feedback.query.filter_by(usuario_id=u.id)
+                    .order_by(Feedback.data_feedback.desc(), Feedback.id.desc()).first())
+        relatorio.append((u.id, pegada and pegada.total_co2, quiz and quiz.pontuacao,
+                          feedback and feedback.data_feedback))
+    return relatorio
+
+
+def medir(funcao, repeticoes):
+    consultas, tempos = [], []
+    for _ in range(repeticoes):
+        # Sem acertos no cache de respostas: mede a geração do relatório
+        m.invalidar_cache('usuarios')
+        with comum.contar_consultas(db.engine) as contador:
+            inicio = time.perf_counter()
+            funcao()
+            tempos.append(time.perf_counter() - inicio)
+        consultas.append(contador[0])
+        db.session.remove()
+    return max(consultas), statistics.median(tempos) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--usuarios', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--sem-legado', action='store_true', help='não executa o laço N+1 antigo')
+    args = parser.parse_args()
+
+    cliente = app.test_client()
+    print(f'{"usuarios":>9} {"consultas":>10} {"ms":>9} {"ms/1k":>7} {"KB":>8} | {"colunar ms":>10} {"KB":>8} |'
+          f' {"legado cons.":>12} {"legado ms":>10}')
+    with app.app_context():
+        for n in args.usuarios:
+            popular(n)
+            consultas, ms = medir(lambda: cliente.get('/admin/relatorio').get_json(), args.repeticoes)
+            tamanho = len(cliente.get('/admin/relatorio').data) / 1024
+            _, ms_colunar = medir(lambda: cliente.get('/admin/relatorio?format=columnar').get_json(), args.repeticoes)
+            tamanho_colunar = len(cliente.get('/admin/relatorio?format=columnar').data) / 1024
+            linha = (f'{n:>9} {consultas:>10} {ms:>9.1f} {ms / n * 1000:>7.1f} {tamanho:>8.0f} |'
+                     f' {ms_colunar:>10.1f} {tamanho_colunar:>8.0f} |')
+            if not args.sem_legado:
+                consultas_leg, ms_leg = medir(relatorio_legado, 1)
+                linha += f' {consultas_leg:>12} {ms_leg:>10.1f}'
+            print(linha)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Compara dois resultados JSON dos benchmarks (bench_endpoints ou bench_carga).
+
+Mostra, por cenário, p50/p95/p99 e vazão da execução base e da nova, com a
+variação em %. `--limite` faz o script sair com erro se algum p95 piorar
+mais que o limite, para uso em CI.
+
+    python benchmarks/comparar.py benchmarks/resultados/endpoints-antes.json benchmarks/resultados/endpoints-depois.json
+"""
+import argparse
+import json
+import math
+
+METRICAS = ('p50_ms', 'p95_ms', 'p99_ms', 'req_s')
+
+
+def _variacao(base, novo):
+    if not base or math.isnan(base) or math.isnan(novo):
+        return float('nan')
+    return (novo - base) / base * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('base')
+    parser.add_argument('novo')
+    parser.add_argument('--limite', type=float, help='piora máxima aceita no p95, em %%')
+    args = parser.parse_args()
+
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.novo, encoding='utf-8') as f:
+        novo = json.load(f)
+    if base['tipo'] != novo['tipo']:
+        raise SystemExit(f"Resultados de tipos diferentes: {base['tipo']} x {novo['tipo']}")
+    for rotulo, documento in (('base', base), ('novo', novo)):
+        print(f"{rotulo}: {documento['data']} commit {documento['commit']} {documento['parametros'].get('linhas')}")
+
+    print(f'\n{"cenario":<22}' + ''.join(f' {m:>23}' for m in METRICAS))
+    pioras = []
+    for nome in sorted(set(base['resultados']) & set(novo['resultados'])):
+        a, b = base['resultados'][nome], novo['resultados'][nome]
+        linha = f'{nome:<22}'
+        for metrica in METRICAS:
+            linha += f' {a[metrica]:>8.2f} {b[metrica]:>8.2f} {_variacao(a[metrica], b[metrica]):>+4.0f}%'
+        print(linha)
+        if args.limite is not None and _variacao(a['p95_ms'], b['p95_ms']) > args.limite:
+            pioras.append(nome)
+    for nome in sorted(set(base['resultados']) ^ set(novo['resultados'])):
+        print(f'{nome:<22} só em {"base" if nome in base["resultados"] else "novo"}')
+    if pioras:
+        raise SystemExit(f"p95 piorou mais de {args.limite}% em: {', '.join(pioras)}")
+
+
+if __name__ == '__main__':
+    main()
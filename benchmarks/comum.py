@@ -0,0 +1,187 @@
+"""Funções comuns aos benchmarks: banco temporário, criação do app, cenários e resultados.
+
+Os objetos do app.py que não dependem do app (métricas, cache, admissão) leem
+as variáveis de ambiente na importação, então `importar_app` (ou `criar_app`)
+precisa ser chamado antes de qualquer `import app` e só com um banco por processo.
+"""
+import contextlib
+import json
+import logging
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from collections import namedtuple
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA_RESULTADOS = os.path.join(RAIZ, 'benchmarks', 'resultados')
+ADMIN = 'guinavasconi@gmail.com'
+
+
+def banco_temporario(nome='bench.db'):
+    return os.path.join(tempfile.mkdtemp(prefix='verdetech-bench-'), nome)
+
+
+def importar_app(caminho, **ambiente):
+    """Importa o app usando o banco `caminho`; `ambiente` vai para os.environ (ex.: DB_PERFIL)."""
+    url = f'sqlite:///{caminho}'
+    if 'app' in sys.modules:
+        if os.environ.get('DATABASE_URL') != url:
+            raise RuntimeError(f"app já importado com {os.environ.get('DATABASE_URL')}, não com {url}")
+        return sys.modules['app']
+    os.environ['RENDER'] = '1'
+    os.environ['DATABASE_URL'] = url
+    os.environ['METRICAS_DIR'] = os.path.join(os.path.dirname(caminho), 'metricas')
+    os.environ['ARQUIVO_DIR'] = os.path.join(os.path.dirname(caminho), 'arquivo')
+    os.environ['CACHE_DB'] = os.path.join(os.path.dirname(caminho), 'cache.db')
+    os.environ['ADMISSAO_DB'] = os.path.join(os.path.dirname(caminho), 'admissao.db')
+    os.environ.update(ambiente)
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+    logging.disable(logging.WARNING)
+    import app
+    return app
+
+
+_apps = {}
+
+
+def criar_app(caminho, **ambiente):
+    """(módulo app, app Flask) usando o banco `caminho`, com as migrações aplicadas (como o gunicorn faz)."""
+    modulo = importar_app(caminho, **ambiente)
+    if caminho not in _apps:
+        aplicacao = _apps[caminho] = modulo.create_app()
+        with aplicacao.app_context():
+            modulo.inicializar_banco()
+            modulo.db.session.remove()
+    return modulo, _apps[caminho]
+
+
+def copiar_banco(origem, destino):
+    """Cópia consistente (inclui o que ainda está no WAL) para não alterar o banco gerado."""
+    with contextlib.closing(sqlite3.connect(origem)) as fonte, \
+            contextlib.closing(sqlite3.connect(destino)) as copia:
+        fonte.backup(copia)
+
+
+def contar_linhas(caminho):
+    """Tamanho das tabelas principais, gravado junto com o resultado."""
+    with contextlib.closing(sqlite3.connect(caminho)) as conexao:
+        return {tabela: conexao.execute(f'SELECT COUNT(*) FROM {tabela}').fetchone()[0]
+                for tabela in ('usuario', 'pegada_carbono', 'resultado_quiz', 'feedback')}
+
+
+def percentil(ordenados, q):
+    """Percentil por posição mais próxima de uma lista já ordenada."""
+    if not ordenados:
+        return float('nan')
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+
+def resumir(latencias, duracao=None):
+    """Resumo em milissegundos de uma lista de latências em segundos."""
+    ordenados = sorted(latencias)
+    n = len(ordenados)
+    resumo = {
+        'n': n,
+        'media_ms': sum(ordenados) / n * 1000 if n else float('nan'),
+        'p50_ms': percentil(ordenados, 0.50) * 1000,
+        'p95_ms': percentil(ordenados, 0.95) * 1000,
+        'p99_ms': percentil(ordenados, 0.99) * 1000,
+        'max_ms': ordenados[-1] * 1000 if n else float('nan'),
+    }
+    # Sem duração medida de fora, a vazão é a de um cliente em série
+    total = duracao if duracao is not None else sum(ordenados)
+    resumo['req_s'] = n / total if total else float('nan')
+    return resumo
+
+
+@contextlib.contextmanager
+def contar_consultas(*engines):
+    """Conta os comandos SQL executados nos engines; o total fica em `contador[0]`."""
+    from sqlalchemy import event
+
+    contador = [0]
+
+    def contar(*_args):
+        contador[0] += 1
+
+    engines = [e for e in engines if e is not None]
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', contar)
+    try:
+        yield contador
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', contar)
+
+
+# Requisições medidas pelos benchmarks. `perfil` é a sessão usada: anonimo,
+# usuario (conta gerada pelo gerar_dados) ou admin (gerar_dados --admin).
+Cenario = namedtuple('Cenario', 'perfil metodo caminho json form', defaults=(None, None))
+
+PEGADA = {'transporte': 120.0, 'energia': 180.0, 'alimentacao': 7, 'lixo': 4}
+
+CENARIOS = {
+    'health': Cenario('anonimo', 'GET', '/health'),
+    'pagina_inicial': Cenario('anonimo', 'GET', '/'),
+    'pagina_carbono': Cenario('anonimo', 'GET', '/carbono'),
+    'pagina_quiz': Cenario('anonimo', 'GET', '/quiz'),
+    'login': Cenario('anonimo', 'POST', '/login', form={'email': '{email}', 'password': '{senha}'}),
+    'api_me': Cenario('usuario', 'GET', '/api/me'),
+    'bootstrap': Cenario('usuario', 'GET', '/api/bootstrap'),
+    'calcular_pegada': Cenario('usuario', 'POST', '/api/calcular-pegada', json=PEGADA),
+    'calcular_pegada_lote': Cenario('usuario', 'POST', '/api/calcular-pegada/lote', json=[PEGADA] * 50),
+    'salvar_quiz': Cenario('usuario', 'POST', '/api/salvar-quiz', json={'pontuacao': 8, 'total_perguntas': 10}),
+    'feedback_buscar': Cenario('usuario', 'GET', '/api/feedback'),
+    'feedback_salvar': Cenario('usuario', 'POST', '/api/feedback',
+                               json={'rating': 5, 'text': 'Gostei muito do quiz', 'quiz_score': 8, 'quiz_total': 10}),
+    'conquistas': Cenario('usuario', 'GET', '/api/conquistas'),
+    'conquistas_secao': Cenario('usuario', 'POST', '/api/conquistas/secao', json={'secao': 'carbono'}),
+    'ranking': Cenario('usuario', 'GET', '/api/ranking?limit=10'),
+    'historico': Cenario('usuario', 'GET', '/api/historico?tipo=pegada&pontos=60'),
+    'admin_relatorio': Cenario('admin', 'GET', '/admin/relatorio'),
+    'admin_relatorio_colunar': Cenario('admin', 'GET', '/admin/relatorio?format=columnar'),
+    'admin_relatorio_csv': Cenario('admin', 'GET', '/admin/relatorio.csv'),
+    'admin_dados': Cenario('admin', 'GET', '/admin/dados?limit=100'),
+    'admin_dados_colunar': Cenario('admin', 'GET', '/admin/dados?limit=100&format=columnar'),
+    'admin_estatisticas': Cenario('admin', 'GET', '/admin/estatisticas'),
+    'admin_feedbacks': Cenario('admin', 'GET', '/admin/feedbacks'),
+    'admin_feedbacks_colunar': Cenario('admin', 'GET', '/admin/feedbacks?format=columnar'),
+    'admin_feedbacks_busca': Cenario('admin', 'GET', '/admin/feedbacks/search?q=quiz&limit=50'),
+    'admin_fatores': Cenario('admin', 'GET', '/admin/fatores-emissao'),
+}
+
+
+def _commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        sujo = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-sujo' if sujo else '')
+
+
+def gravar_resultado(tipo, parametros, resultados, saida=None):
+    """Grava o JSON da execução (com commit e máquina, para comparar execuções) e devolve o caminho."""
+    agora = datetime.now()
+    if saida is None:
+        os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+        saida = os.path.join(PASTA_RESULTADOS, f'{tipo}-{agora:%Y%m%d-%H%M%S}.json')
+    documento = {
+        'tipo': tipo,
+        'data': agora.isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'maquina': {'python': platform.python_version(), 'plataforma': platform.platform(),
+                    'cpus': os.cpu_count()},
+        'parametros': parametros,
+        'resultados': resultados,
+    }
+    with open(saida, 'w', encoding='utf-8') as f:
+        json.dump(documento, f, ensure_ascii=False, indent=2)
+    return saida
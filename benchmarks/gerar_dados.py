@@ -0,0 +1,178 @@
+"""Gerador de dados sintéticos: usuários, pegadas, quizzes e feedbacks em massa.
+
+Grava em lotes com `executemany` direto no sqlite3 (milhões de linhas em
+minutos, sem passar pelo ORM) e no fim reconstrói as estatísticas e as
+conquistas, como um banco de produção estaria. Os usuários são acrescentados
+depois dos existentes, com login `bench<id>@exemplo.com` e todos com a mesma
+senha (SENHA_PADRAO), para os testes de carga poderem entrar; `--admin` cria
+também a conta de administrador com essa senha, se ainda não existir. Com a
+mesma `--semente` os dados gerados são os mesmos.
+
+O banco padrão é um arquivo no diretório temporário, que os outros
+benchmarks usam como origem (copiando, sem alterá-lo):
+
+    python benchmarks/gerar_dados.py --usuarios 100000 --pegadas 1000000 --quizzes 1000000 --feedbacks 50000
+    python benchmarks/gerar_dados.py --banco fecart/instance/verdetch.db --usuarios 200
+"""
+import argparse
+import contextlib
+import itertools
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import comum
+
+logger = logging.getLogger(__name__)
+
+BANCO_PADRAO = os.path.join(tempfile.gettempdir(), 'verdetech-bench.db')
+SENHA_PADRAO = 'senha123'
+LOTE = 50000
+
+NOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Felipe', 'Gabriela', 'Heitor', 'Isabela', 'João',
+         'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Tiago', 'Vitória', 'Yuri']
+SOBRENOMES = ['Silva', 'Souza', 'Oliveira', 'Santos', 'Pereira', 'Lima', 'Costa', 'Ribeiro', 'Almeida',
+              'Carvalho', 'Gomes', 'Martins', 'Araújo', 'Barbosa', 'Rocha']
+TEXTOS = ['', '', 'Gostei muito!', 'O quiz foi ótimo, aprendi sobre reciclagem.',
+          'A calculadora me ajudou a entender minha pegada de carbono.',
+          'Poderia ter mais perguntas sobre energia.', 'Site muito bonito e fácil de usar.']
+
+
+def _em_lotes(linhas, tamanho=LOTE):
+    linhas = iter(linhas)
+    while lote := list(itertools.islice(linhas, tamanho)):
+        yield lote
+
+
+def _inserir(conexao, tabela, colunas, linhas, total):
+    sql = f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})"
+    gravadas = 0
+    for lote in _em_lotes(linhas):
+        conexao.executemany(sql, lote)
+        conexao.commit()
+        gravadas += len(lote)
+        logger.info(f"{tabela}: {gravadas}/{total}")
+    return gravadas
+
+
+def popular(caminho, usuarios=1000, pegadas=5000, quizzes=5000, feedbacks=500, dias=365, anonimas=0.1,
+            admin=False, senha=SENHA_PADRAO, semente=42, agregados=True):
+    """Acrescenta os registros ao banco `caminho` e devolve {tabela: linhas gravadas}."""
+    m, app = comum.criar_app(caminho)  # cria o esquema (migrações) se o banco for novo
+    if feedbacks > usuarios:
+        raise ValueError('Cada usuário tem no máximo um feedback: use --feedbacks <= --usuarios')
+    rnd = random.Random(semente)
+    agora = datetime.utcnow()
+    segundos = dias * 86400
+    with app.app_context():
+        password_hash = m.servico_senhas.gerar(senha)
+        _, fatores = m.fatores_emissao()
+        m.db.session.remove()
+
+    def data_aleatoria():
+        # Mesmo formato que o SQLAlchemy grava no SQLite (as consultas comparam texto);
+        # isoformat é bem mais rápido que strftime
+        return (agora - timedelta(seconds=rnd.random() * segundos)).isoformat(' ', 'microseconds')
+
+    gravadas = {}
+    with contextlib.closing(sqlite3.connect(caminho)) as conexao:
+        conexao.execute('PRAGMA synchronous=OFF')
+        primeiro = conexao.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM usuario').fetchone()[0]
+        ids = range(primeiro, primeiro + usuarios)
+        if not ids and (pegadas or quizzes):
+            ids = [linha[0] for linha in conexao.execute('SELECT id FROM usuario')]
+            if not ids:
+                raise ValueError('O banco não tem usuários: use --usuarios')
+
+        gravadas['usuario'] = _inserir(conexao, 'usuario', ('id', 'nome', 'email', 'data_cadastro'), (
+            (i, f'{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)}', f'bench{i}@exemplo.com', data_aleatoria())
+            for i in range(primeiro, primeiro + usuarios)
+        ), usuarios)
+        gravadas['auth'] = _inserir(conexao, 'auth', ('usuario_id', 'username', 'password_hash'), (
+            (i, f'bench{i}@exemplo.com', password_hash) for i in range(primeiro, primeiro + usuarios)
+        ), usuarios)
+
+        def pegada():
+            transporte, energia = round(rnd.uniform(0, 400), 1), round(rnd.uniform(50, 400), 1)
+            alimentacao, lixo = rnd.randint(0, 14), rnd.randint(0, 20)
+            total = (transporte * fatores['transporte'] + energia * fatores['energia']
+                     + alimentacao * fatores['alimentacao'] + lixo * fatores['lixo'])
+            # Parte das pegadas é calculada sem login, como na calculadora pública
+            usuario_id = None if rnd.random() < anonimas else rnd.choice(ids)
+            return usuario_id, transporte, energia, alimentacao, lixo, total, data_aleatoria()
+
+        gravadas['pegada_carbono'] = _inserir(
+            conexao, 'pegada_carbono',
+            ('usuario_id', 'transporte', 'energia', 'alimentacao', 'lixo', 'total_co2', 'data_calculo'),
+            (pegada() for _ in range(pegadas)), pegadas)
+        gravadas['resultado_quiz'] = _inserir(
+            conexao, 'resultado_quiz', ('usuario_id', 'pontuacao', 'total_perguntas', 'data_realizacao'),
+            ((rnd.choice(ids), min(10, int(rnd.triangular(0, 11, 7))), 10, data_aleatoria())
+             for _ in range(quizzes)), quizzes)
+
+        def feedback(usuario_id):
+            quiz = rnd.random() < 0.5
+            return (usuario_id, rnd.choices(range(1, 6), (1, 1, 2, 4, 6))[0], rnd.choice(TEXTOS),
+                    rnd.randint(0, 10) if quiz else None, 10 if quiz else None, data_aleatoria())
+
+        gravadas['feedback'] = _inserir(
+            conexao, 'feedback', ('usuario_id', 'rating', 'text', 'quiz_score', 'quiz_total', 'data_feedback'),
+            (feedback(i) for i in sorted(rnd.sample(ids, feedbacks))), feedbacks)
+
+        if admin and not conexao.execute('SELECT 1 FROM auth WHERE username = ?', (comum.ADMIN,)).fetchone():
+            cursor = conexao.execute('INSERT INTO usuario (nome, email, data_cadastro) VALUES (?, ?, ?)',
+                                     ('Administrador', comum.ADMIN, agora.isoformat(' ', 'microseconds')))
+            conexao.execute('INSERT INTO auth (usuario_id, username, password_hash) VALUES (?, ?, ?)',
+                            (cursor.lastrowid, comum.ADMIN, password_hash))
+            conexao.commit()
+
+    if agregados:
+        with app.app_context():
+            logger.info("Reconstruindo estatísticas e conquistas")
+            m.reconstruir_estatisticas()
+            m.reconstruir_conquistas()
+            m.db.session.remove()
+    with contextlib.closing(sqlite3.connect(caminho)) as conexao:
+        conexao.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return gravadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--banco', default=BANCO_PADRAO)
+    parser.add_argument('--substituir', action='store_true', help='apaga o banco antes de gerar')
+    parser.add_argument('--usuarios', type=int, default=1000)
+    parser.add_argument('--pegadas', type=int, default=5000)
+    parser.add_argument('--quizzes', type=int, default=5000)
+    parser.add_argument('--feedbacks', type=int, default=500)
+    parser.add_argument('--dias', type=int, default=365, help='as datas ficam espalhadas nos últimos N dias')
+    parser.add_argument('--anonimas', type=float, default=0.1, help='fração de pegadas sem usuário')
+    parser.add_argument('--admin', action='store_true', help='cria a conta de administrador')
+    parser.add_argument('--senha', default=SENHA_PADRAO)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--sem-agregados', action='store_true',
+                        help='não reconstrói estatísticas e conquistas (rode os comandos depois)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    caminho = os.path.abspath(args.banco)
+    if args.substituir:
+        for sufixo in ('', '-wal', '-shm'):
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(caminho + sufixo)
+    inicio = time.perf_counter()
+    gravadas = popular(caminho, args.usuarios, args.pegadas, args.quizzes, args.feedbacks, args.dias,
+                       args.anonimas, args.admin, args.senha, args.semente, not args.sem_agregados)
+    segundos = time.perf_counter() - inicio
+    total = sum(gravadas.values())
+    print(f"{total} linhas em {segundos:.1f} s ({total / segundos:.0f} linhas/s) em {caminho}")
+    for tabela, linhas in gravadas.items():
+        print(f"  {tabela}: {linhas}")
+
+
+if __name__ == '__main__':
+    main()
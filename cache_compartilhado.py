@@ -0,0 +1,152 @@
+"""Cache de respostas compartilhado entre os workers, em um arquivo SQLite.
+
+Cada entrada guarda o corpo já serializado de uma resposta e as gerações das
+fontes de dados de que ela depende ('atividades', 'feedbacks', 'usuarios').
+As rotas que escrevem chamam `invalidar(fonte)`, que incrementa o contador
+da fonte na tabela `geracao`; como o arquivo é o mesmo para todos os
+processos, a próxima leitura em qualquer worker já vê a geração nova e a
+entrada antiga deixa de valer. Além disso cada entrada expira em `ttl`
+segundos (proteção para escritas feitas por fora do app) e, acima de
+`capacidade` entradas, saem as usadas há mais tempo (LRU).
+
+O arquivo é descartável: apagá-lo só esvazia o cache. A `epoca`, sorteada
+quando o arquivo é criado, entra nas gerações para que contadores que
+recomeçaram do zero não repitam ETags antigos. Cada fonte guarda também
+quando foi invalidada pela última vez, que serve de Last-Modified; uma
+fonte nunca invalidada conta a partir da criação do arquivo.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Entradas usadas há menos que isto não têm o usado_em regravado a cada acerto
+_INTERVALO_TOQUE = 1.0
+
+
+class CacheCompartilhado:
+    def __init__(self, caminho, ttl=300.0, capacidade=256, tamanho_maximo=32 * 1024 * 1024):
+        self.caminho = caminho
+        self.ttl = ttl
+        self.capacidade = capacidade
+        self.tamanho_maximo = tamanho_maximo
+        self._local = threading.local()
+        self._esquema_criado = False
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+
+    def _conexao(self):
+        # Uma conexão por thread; depois de um fork o filho abre a sua
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None or self._local.pid != os.getpid():
+            # isolation_level=None: cada comando é sua própria transação
+            conexao = sqlite3.connect(self.caminho, timeout=5, isolation_level=None, check_same_thread=False)
+            conexao.execute('PRAGMA journal_mode=WAL')
+            # O conteúdo pode ser recalculado: não vale esperar o fsync
+            conexao.execute('PRAGMA synchronous=OFF')
+            self._local.conexao, self._local.pid = conexao, os.getpid()
+            if not self._esquema_criado:
+                # Só no primeiro uso: criar o objeto (na importação do app, antes do fork) não abre o arquivo
+                self._criar_esquema(conexao)
+                self._esquema_criado = True
+        return conexao
+
+    def _criar_esquema(self, conexao):
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            conexao.execute('CREATE TABLE IF NOT EXISTS geracao '
+                            '(fonte TEXT PRIMARY KEY, valor INTEGER NOT NULL, alterado_em REAL NOT NULL)')
+            if 'alterado_em' not in {linha[1] for linha in conexao.execute('PRAGMA table_info(geracao)')}:
+                # Arquivo de uma versão anterior: sem saber quando as fontes mudaram, vale agora
+                conexao.execute('ALTER TABLE geracao ADD COLUMN alterado_em REAL NOT NULL DEFAULT 0')
+                conexao.execute('UPDATE geracao SET alterado_em = ?', (time.time(),))
+            conexao.execute('''
+                CREATE TABLE IF NOT EXISTS entrada (
+                    chave TEXT PRIMARY KEY,
+                    geracoes TEXT NOT NULL,
+                    tipo TEXT NOT NULL,
+                    corpo BLOB NOT NULL,
+                    gravado_em REAL NOT NULL,
+                    usado_em REAL NOT NULL
+                )
+            ''')
+            conexao.execute('CREATE INDEX IF NOT EXISTS ix_entrada_usado_em ON entrada (usado_em)')
+            conexao.execute("INSERT OR IGNORE INTO geracao (fonte, valor, alterado_em) VALUES ('epoca', ?, ?)",
+                            (uuid.uuid4().int >> 80, time.time()))
+            conexao.execute('COMMIT')
+        except Exception:
+            conexao.execute('ROLLBACK')
+            raise
+
+    def geracoes(self, *fontes):
+        """Tupla com a época e a geração atual de cada fonte, na ordem pedida."""
+        return self.versao(*fontes)[0]
+
+    def versao(self, *fontes):
+        """As gerações (como em `geracoes`) e o time.time() da última invalidação entre as fontes."""
+        fontes = ('epoca',) + fontes
+        linhas = self._conexao().execute(
+            f"SELECT fonte, valor, alterado_em FROM geracao WHERE fonte IN ({', '.join('?' * len(fontes))})", fontes
+        ).fetchall()
+        valores = {fonte: valor for fonte, valor, _ in linhas}
+        return tuple(valores.get(fonte, 0) for fonte in fontes), max((a for _, _, a in linhas), default=0.0)
+
+    def invalidar(self, *fontes):
+        """Incrementa a geração das fontes: as entradas que dependem delas deixam de valer."""
+        agora = time.time()
+        self._conexao().executemany(
+            'INSERT INTO geracao (fonte, valor, alterado_em) VALUES (?, 1, ?) '
+            'ON CONFLICT (fonte) DO UPDATE SET valor = valor + 1, alterado_em = excluded.alterado_em',
+            [(fonte, agora) for fonte in fontes]
+        )
+
+    def obter(self, chave, geracoes):
+        """(tipo, corpo) da entrada, se ainda valer para estas gerações; senão None."""
+        conexao = self._conexao()
+        linha = conexao.execute(
+            'SELECT geracoes, tipo, corpo, gravado_em, usado_em FROM entrada WHERE chave = ?', (chave,)
+        ).fetchone()
+        if linha is None:
+            return None
+        geracoes_entrada, tipo, corpo, gravado_em, usado_em = linha
+        agora = time.time()
+        if geracoes_entrada != repr(geracoes) or agora - gravado_em >= self.ttl:
+            return None
+        if agora - usado_em >= _INTERVALO_TOQUE:
+            conexao.execute('UPDATE entrada SET usado_em = ? WHERE chave = ?', (agora, chave))
+        return tipo, corpo
+
+    def gravar(self, chave, geracoes, tipo, corpo):
+        """Guarda a resposta e descarta as expiradas e as excedentes (menos usadas primeiro)."""
+        if len(corpo) > self.tamanho_maximo:
+            return False
+        agora = time.time()
+        conexao = self._conexao()
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            conexao.execute(
+                'INSERT OR REPLACE INTO entrada (chave, geracoes, tipo, corpo, gravado_em, usado_em) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (chave, repr(geracoes), tipo, corpo, agora, agora)
+            )
+            conexao.execute('DELETE FROM entrada WHERE gravado_em < ?', (agora - self.ttl,))
+            conexao.execute(
+                'DELETE FROM entrada WHERE chave IN '
+                '(SELECT chave FROM entrada ORDER BY usado_em DESC LIMIT -1 OFFSET ?)',
+                (self.capacidade,)
+            )
+            conexao.execute('COMMIT')
+        except Exception:
+            conexao.execute('ROLLBACK')
+            raise
+        return True
+
+    def resumo(self):
+        """Entradas, bytes guardados e gerações atuais."""
+        conexao = self._conexao()
+        entradas, tamanho = conexao.execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(corpo)), 0) FROM entrada').fetchone()
+        geracoes = dict(conexao.execute("SELECT fonte, valor FROM geracao WHERE fonte != 'epoca'").fetchall())
+        return {'entradas': entradas, 'bytes': tamanho, 'geracoes': geracoes}
@@ -0,0 +1,56 @@
+"""Formato colunar das respostas em massa do admin (`?format=columnar`).
+
+Em vez de uma lista de objetos, que repete o nome de cada campo em cada
+linha, a resposta traz uma lista por campo:
+
+    {"formato": "colunar", "linhas": 2, "datas": ["data"], "base_datas": 1718000000,
+     "colunas": {"id": [7, 6], "data": [120, 0]}}
+
+Os campos listados em `datas` vêm em segundos desde `base_datas` (a menor
+data da resposta, em segundos Unix UTC); somar os dois dá o epoch. Nulos
+continuam null. As consultas já devolvem as datas em segundos, calculados
+pelo SQLite, então nem objetos do ORM nem datetimes são criados por linha.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import Integer, cast, func, select
+
+EPOCA = datetime(1970, 1, 1)
+_UM_SEGUNDO = timedelta(seconds=1)
+
+
+def epoch(coluna, nome=None):
+    """A coluna de data em segundos Unix (as datas do banco são UTC sem fuso).
+
+    Os microssegundos são cortados antes: o strftime do SQLite arredonda para
+    milissegundos, e 12:00:00.9996 viraria 12:00:01 (o formato de linhas corta).
+    """
+    return cast(func.strftime('%s', func.substr(coluna, 1, 19)), Integer).label(nome or coluna.key)
+
+
+def selecionar(modelo, campos, datas=()):
+    """SELECT das colunas `campos` do modelo, com as de `datas` em segundos."""
+    return select(*(epoch(getattr(modelo, campo)) if campo in datas else getattr(modelo, campo)
+                    for campo in campos))
+
+
+def de_registros(registros, campos, datas=()):
+    """Tuplas na ordem de `campos` a partir de objetos (ORM ou linhas do arquivo), datas em segundos."""
+    def valor(registro, campo):
+        dado = getattr(registro, campo)
+        if campo in datas and dado is not None:
+            return (dado - EPOCA) // _UM_SEGUNDO
+        return dado
+    return [tuple(valor(registro, campo) for campo in campos) for registro in registros]
+
+
+def codificar(linhas, campos, datas=()):
+    """Resposta colunar a partir de linhas (tuplas na ordem de `campos`, datas em segundos)."""
+    valores = zip(*linhas) if linhas else [()] * len(campos)
+    colunas = {campo: list(coluna) for campo, coluna in zip(campos, valores)}
+    base = min((v for campo in datas for v in colunas[campo] if v is not None), default=0)
+    if base:
+        for campo in datas:
+            colunas[campo] = [None if v is None else v - base for v in colunas[campo]]
+    return {'formato': 'colunar', 'linhas': len(linhas), 'datas': list(datas), 'base_datas': base,
+            'colunas': colunas}
@@ -0,0 +1,64 @@
+"""Funções puras para os agregados incrementais de /admin/estatisticas.
+
+O histograma de valores contínuos (como total_co2) usa baldes logarítmicos
+no estilo DDSketch: cada balde cobre valores com erro relativo de até
+ERRO_RELATIVO, então qualquer percentil pode ser estimado só com as
+contagens por balde. As contagens podem ser somadas (entre dias) e
+subtraídas (quando registros são apagados) sem perder precisão.
+"""
+import math
+
+ERRO_RELATIVO = 0.02
+_GAMA = (1 + ERRO_RELATIVO) / (1 - ERRO_RELATIVO)
+_LOG_GAMA = math.log(_GAMA)
+
+# Balde reservado para zero (e valores desprezíveis), que não têm logaritmo
+BALDE_ZERO = -1000000
+_MENOR_VALOR = 1e-9
+
+
+def balde(valor):
+    """Índice do balde logarítmico de um valor não negativo."""
+    if valor < _MENOR_VALOR:
+        return BALDE_ZERO
+    return math.ceil(math.log(valor) / _LOG_GAMA)
+
+
+def valor_do_balde(indice):
+    """Valor representativo do balde (erro relativo <= ERRO_RELATIVO)."""
+    if indice == BALDE_ZERO:
+        return 0.0
+    return 2 * _GAMA ** indice / (_GAMA + 1)
+
+
+def quantis(contagens, qs):
+    """Estima os quantis `qs` (0 a 1) a partir de {balde: quantidade}."""
+    baldes = sorted((i, n) for i, n in contagens.items() if n > 0)
+    total = sum(n for _, n in baldes)
+    if not total:
+        return {q: None for q in qs}
+    resultado = {}
+    for q in qs:
+        posicao = q * (total - 1)
+        acumulado = 0
+        for indice, quantidade in baldes:
+            acumulado += quantidade
+            if acumulado > posicao:
+                resultado[q] = valor_do_balde(indice)
+                break
+    return resultado
+
+
+def faixa_percentual(pontuacao, total_perguntas):
+    """Decil de acerto do quiz (0 a 10); 10 significa 100%."""
+    if not total_perguntas:
+        return 0
+    return max(0, min(10, int(pontuacao * 10 // total_perguntas)))
+
+
+def media_e_desvio(quantidade, soma, soma_quadrados):
+    if not quantidade:
+        return None, None
+    media = soma / quantidade
+    variancia = max(soma_quadrados / quantidade - media * media, 0.0)
+    return media, math.sqrt(variancia)
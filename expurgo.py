@@ -0,0 +1,74 @@
+"""Remoção física, em segundo plano, dos usuários marcados como excluídos.
+
+A exclusão em massa só marca os usuários (um UPDATE rápido). Esta thread os
+apaga de vez em lotes pequenos, cada um na sua transação, com uma pausa
+entre eles, para que as gravações dos usuários não fiquem esperando o lock
+de escrita do SQLite por muito tempo.
+
+O módulo não conhece o banco: quem apaga é a função `purgar_lote()` recebida
+no construtor, que remove um lote e retorna quantos usuários apagou (0
+quando não sobrou nenhum marcado).
+"""
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ExpurgoEmSegundoPlano:
+    def __init__(self, purgar_lote, pausa=0.2, espera_falha=5.0, tentativas=5):
+        self.purgar_lote = purgar_lote
+        self.pausa = pausa
+        self.espera_falha = espera_falha
+        self.tentativas = tentativas
+        self.estatisticas = {'usuarios': 0, 'lotes': 0, 'falhas': 0}
+        self._trava = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._de_novo = False
+
+    def agendar(self):
+        """Começa o expurgo, se ainda não estiver rodando neste processo."""
+        with self._trava:
+            if self._pid != os.getpid():
+                # Depois de um fork a thread do pai não existe no filho
+                self._pid = os.getpid()
+                self._thread = None
+            if self._thread is not None:
+                # Marcações novas durante um lote: confere de novo antes de parar
+                self._de_novo = True
+                return
+            self._de_novo = False
+            self._thread = threading.Thread(target=self._executar, name='expurgo', daemon=True)
+            self._thread.start()
+
+    def rodando(self):
+        return self._pid == os.getpid() and self._thread is not None
+
+    def _executar(self):
+        falhas = 0
+        while True:
+            try:
+                removidos = self.purgar_lote()
+            except Exception as e:
+                falhas += 1
+                self.estatisticas['falhas'] += 1
+                logger.error(f"Erro no expurgo de usuários ({falhas}/{self.tentativas}): {e}")
+                if falhas < self.tentativas:
+                    time.sleep(self.espera_falha)
+                    continue
+                removidos = 0
+            else:
+                falhas = 0
+            if removidos:
+                self.estatisticas['usuarios'] += removidos
+                self.estatisticas['lotes'] += 1
+                time.sleep(self.pausa)
+                continue
+            with self._trava:
+                if not self._de_novo:
+                    self._thread = None
+                    return
+                self._de_novo = False
@@ -24,8 +24,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
 async function checkAdminAccess() {
     try {
-        const response = await fetch('/api/me');
-        const data = await response.json();
+        const data = await window.sessao.obter();
         
         const secretBtn = document.querySelector('.admin-secret-btn');
         if (!secretBtn) return;
@@ -8,12 +8,27 @@ document.addEventListener('DOMContentLoaded', function() {
     // Event listeners
     document.getElementById('refresh-data').addEventListener('click', loadAdminData);
     document.getElementById('export-csv').addEventListener('click', exportToCSV);
+    document.getElementById('load-more-feedbacks').addEventListener('click', () => loadFeedbacks(true));
+    document.getElementById('feedback-search-form').addEventListener('submit', searchFeedbacks);
+    document.getElementById('feedback-search-clear').addEventListener('click', clearFeedbackSearch);
+    document.getElementById('delete-selected').addEventListener('click', deleteSelectedUsers);
+    document.getElementById('bulk-delete-form').addEventListener('submit', deleteUsersByFilter);
+    document.getElementById('select-all-users').addEventListener('change', (event) => {
+        document.querySelectorAll('.user-select').forEach(checkbox => checkbox.checked = event.target.checked);
+        updateSelectedCount();
+    });
+    document.getElementById('participants-tbody').addEventListener('change', updateSelectedCount);
 });
 
+// Cursor da próxima página de feedbacks (null quando não há mais)
+let feedbackCursor = null;
+const FEEDBACK_PAGE_SIZE = 50;
+// Filtros da busca textual ativa (null mostra todos os feedbacks)
+let feedbackSearch = null;
+
 async function checkAdminAccess() {
     try {
-        const response = await fetch('/api/me');
-        const data = await response.json();
+        const data = await window.sessao.obter();
         
         if (!data.authenticated || data.username !== 'guinavasconi@gmail.com') {
             alert('Acesso negado. Esta página é restrita a administradores.');
@@ -26,11 +41,29 @@ async function checkAdminAccess() {
     }
 }
 
+// As listas grandes do admin vêm no formato colunar (?format=columnar): uma
+// lista por campo, com as datas em segundos a partir de base_datas. Volta para
+// a lista de objetos, com as datas como Date.
+function decodeColumnar(payload) {
+    const campos = Object.keys(payload.colunas);
+    const datas = new Set(payload.datas);
+    const linhas = new Array(payload.linhas);
+    for (let i = 0; i < payload.linhas; i++) {
+        const linha = {};
+        for (const campo of campos) {
+            const valor = payload.colunas[campo][i];
+            linha[campo] = datas.has(campo) && valor !== null ? new Date((payload.base_datas + valor) * 1000) : valor;
+        }
+        linhas[i] = linha;
+    }
+    return linhas;
+}
+
 async function loadAdminData() {
     try {
         // Carregar dados do relatório
-        const response = await fetch('/admin/relatorio');
-        const data = await response.json();
+        const response = await fetch('/admin/relatorio?format=columnar');
+        const data = decodeColumnar(await response.json());
         
         // Atualizar estatísticas
         updateStats(data);
@@ -50,19 +83,61 @@ async function loadAdminData() {
     }
 }
 
-async function loadFeedbacks() {
+async function loadFeedbacks(nextPage = false) {
     try {
-        const response = await fetch('/admin/feedbacks');
-        const feedbacks = await response.json();
-        updateFeedbackTable(feedbacks);
+        const params = new URLSearchParams({ limit: FEEDBACK_PAGE_SIZE, ...feedbackSearch });
+        if (nextPage && feedbackCursor) params.set('after', feedbackCursor);
+        // A busca responde sempre em linhas; a listagem, no formato colunar
+        if (!feedbackSearch) params.set('format', 'columnar');
+        const url = feedbackSearch ? '/admin/feedbacks/search' : '/admin/feedbacks';
+        // O servidor responde 304 (ETag) quando nada mudou; o navegador reaproveita o cache
+        const response = await fetch(`${url}?${params}`);
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error);
+        }
+        feedbackCursor = data.proximo;
+        updateFeedbackTable(feedbackSearch ? data.feedbacks : decodeColumnar(data.feedbacks), nextPage);
+        document.getElementById('load-more-feedbacks').style.display = feedbackCursor ? 'inline-block' : 'none';
+        document.getElementById('feedback-search-note').style.display = data.parcial ? 'block' : 'none';
     } catch (error) {
         console.error('Erro ao carregar feedbacks:', error);
     }
 }
 
-function updateFeedbackTable(feedbacks) {
+function searchFeedbacks(event) {
+    event.preventDefault();
+    feedbackSearch = { q: document.getElementById('feedback-search').value.trim() };
+    const campos = { rating_min: 'feedback-rating', de: 'feedback-de', ate: 'feedback-ate' };
+    for (const [param, id] of Object.entries(campos)) {
+        const valor = document.getElementById(id).value;
+        if (valor) {
+            feedbackSearch[param] = valor;
+        }
+    }
+    loadFeedbacks();
+}
+
+function clearFeedbackSearch() {
+    document.getElementById('feedback-search-form').reset();
+    feedbackSearch = null;
+    loadFeedbacks();
+}
+
+function escapeHtml(texto) {
+    const div = document.createElement('div');
+    div.textContent = texto;
+    return div.innerHTML;
+}
+
+// O trecho da busca vem com os termos entre <mark>: escapa o resto do texto
+function highlightSnippet(trecho) {
+    return escapeHtml(trecho).replace(/&lt;(\/?)mark&gt;/g, '<$1mark>');
+}
+
+function updateFeedbackTable(feedbacks, append = false) {
     const tbody = document.getElementById('feedback-tbody');
-    tbody.innerHTML = '';
+    if (!append) tbody.innerHTML = '';
     
     feedbacks.forEach(feedback => {
         const row = document.createElement('tr');
@@ -77,7 +152,8 @@ function updateFeedbackTable(feedbacks) {
         };
         
         const emoji = emojiMap[feedback.rating] || '😐';
-        const comment = feedback.text ? 
+        const comment = feedback.trecho ? highlightSnippet(feedback.trecho) :
+            feedback.text ?
             (feedback.text.length > 50 ? feedback.text.substring(0, 50) + '...' : feedback.text) : 
             'Sem comentário';
         
@@ -109,6 +185,8 @@ function updateFeedbackTable(feedbacks) {
         `;
         tbody.appendChild(row);
     });
+    document.getElementById('select-all-users').checked = false;
+    updateSelectedCount();
 }
 
 function updateStats(data) {
@@ -147,6 +225,7 @@ function updateTable(data) {
         };
         
         row.innerHTML = `
+            <td><input type="checkbox" class="user-select" value="${user.id}"></td>
             <td>${user.id}</td>
             <td>${user.nome}</td>
             <td>${user.email}</td>
@@ -169,6 +248,8 @@ function updateTable(data) {
     });
 }
 
+let carbonChart = null;
+
 function updateChart(data) {
     const ctx = document.getElementById('carbon-chart').getContext('2d');
     
@@ -190,7 +271,11 @@ function updateChart(data) {
         }
     });
     
-    new Chart(ctx, {
+    // Ao atualizar os dados o gráfico anterior precisa ser destruído antes de desenhar no mesmo canvas
+    if (carbonChart) {
+        carbonChart.destroy();
+    }
+    carbonChart = new Chart(ctx, {
         type: 'doughnut',
         data: {
             labels: Object.keys(categories),
@@ -238,7 +323,7 @@ async function deleteUserActivities(userId, userName) {
         
         if (response.ok) {
             alert('Atividades excluídas com sucesso!');
-            loadData();
+            loadAdminData();
             loadFeedbacks();
         } else {
             const error = await response.json();
@@ -261,7 +346,7 @@ async function deleteUser(userId, userName) {
         
         if (response.ok) {
             alert('Usuário excluído com sucesso!');
-            loadData();
+            loadAdminData();
             loadFeedbacks();
         } else {
             const error = await response.json();
@@ -293,3 +378,73 @@ async function deleteFeedback(feedbackId, userName) {
         alert('Erro ao excluir feedback: ' + error.message);
     }
 }
+
+// Exclusão em massa: os usuários somem na hora e são apagados em segundo plano
+function selectedUserIds() {
+    return Array.from(document.querySelectorAll('.user-select:checked'), checkbox => Number(checkbox.value));
+}
+
+function updateSelectedCount() {
+    const count = selectedUserIds().length;
+    document.getElementById('selected-count').textContent = count;
+    document.getElementById('delete-selected').disabled = count === 0;
+}
+
+async function bulkDeleteUsers(body) {
+    const response = await fetch('/admin/usuarios/excluir', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body)
+    });
+    const data = await response.json();
+    if (!response.ok) {
+        throw new Error(data.error);
+    }
+    return data;
+}
+
+async function deleteSelectedUsers() {
+    const ids = selectedUserIds();
+    if (ids.length === 0) {
+        return;
+    }
+    if (!confirm(`⚠️ ATENÇÃO: Tem certeza que deseja excluir COMPLETAMENTE ${ids.length} usuário(s)?\n\nDados, atividades e feedbacks serão excluídos.\n\nEsta ação é IRREVERSÍVEL!`)) {
+        return;
+    }
+    
+    try {
+        const data = await bulkDeleteUsers({ ids });
+        alert(`${data.usuarios} usuário(s) excluído(s) com sucesso!`);
+        loadAdminData();
+    } catch (error) {
+        alert('Erro ao excluir usuários: ' + error.message);
+    }
+}
+
+async function deleteUsersByFilter(event) {
+    event.preventDefault();
+    const filtro = {};
+    for (const campo of ['email', 'nome', 'de', 'ate']) {
+        const valor = document.getElementById(`bulk-${campo}`).value.trim();
+        if (valor) {
+            filtro[campo] = valor;
+        }
+    }
+    
+    try {
+        // Primeiro só conta, para o admin confirmar o tamanho da exclusão
+        const simulacao = await bulkDeleteUsers({ filtro, simular: true });
+        if (simulacao.usuarios === 0) {
+            alert('Nenhum usuário corresponde ao filtro.');
+            return;
+        }
+        if (!confirm(`⚠️ ATENÇÃO: ${simulacao.usuarios} usuário(s) correspondem ao filtro e serão excluídos COMPLETAMENTE.\n\nEsta ação é IRREVERSÍVEL!`)) {
+            return;
+        }
+        const data = await bulkDeleteUsers({ filtro });
+        alert(`${data.usuarios} usuário(s) excluído(s) com sucesso!`);
+        loadAdminData();
+    } catch (error) {
+        alert('Erro ao excluir usuários: ' + error.message);
+    }
+}
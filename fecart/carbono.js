@@ -25,7 +25,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         let name = '';
         try {
-            const me = await fetch('/api/me').then(r=>r.json());
+            const me = await window.sessao.obter();
             if (me && me.authenticated) name = me.nome || me.username || '';
         } catch(e) {}
         if (totalFootprint < 4) {
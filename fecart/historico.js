@@ -0,0 +1,81 @@
+// Gráficos do histórico do usuário logado. Cada <canvas data-historico="pegada|quiz">
+// vira um gráfico de linha com a média e a faixa mínimo-máximo de cada período;
+// a série já vem reduzida do servidor (/api/historico?pontos=N), então o
+// tamanho da resposta não cresce com o número de registros.
+const HISTORY_POINTS = 60;
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('canvas[data-historico]').forEach(loadHistory);
+});
+
+function formatHistoryDate(dateString, resolution) {
+    const date = new Date(dateString.replace(' ', 'T'));
+    // Períodos menores que um dia mostram também a hora
+    const options = resolution < 86400 ?
+        { day: '2-digit', month: '2-digit', hour: '2-digit', minute: '2-digit' } :
+        { day: '2-digit', month: '2-digit', year: '2-digit' };
+    return date.toLocaleString('pt-BR', options);
+}
+
+async function loadHistory(canvas) {
+    const container = canvas.closest('.history-chart');
+    try {
+        const params = new URLSearchParams({ tipo: canvas.dataset.historico, pontos: HISTORY_POINTS });
+        const response = await fetch(`/api/historico?${params}`);
+        if (!response.ok) {
+            // Visitante sem login: o gráfico continua escondido
+            return;
+        }
+        const data = await response.json();
+        container.style.display = 'block';
+        if (data.pontos.length === 0) {
+            canvas.style.display = 'none';
+            container.querySelector('.history-empty').style.display = 'block';
+            return;
+        }
+        const color = canvas.dataset.cor || '#4CAF50';
+        new Chart(canvas, {
+            type: 'line',
+            data: {
+                labels: data.pontos.map(p => formatHistoryDate(p.data, data.resolucao_segundos)),
+                datasets: [{
+                    label: 'Máximo',
+                    data: data.pontos.map(p => p.maximo),
+                    borderWidth: 0,
+                    pointRadius: 0,
+                    backgroundColor: color + '22',
+                    fill: '+1'
+                }, {
+                    label: 'Mínimo',
+                    data: data.pontos.map(p => p.minimo),
+                    borderWidth: 0,
+                    pointRadius: 0,
+                    fill: false
+                }, {
+                    label: canvas.dataset.rotulo || 'Média',
+                    data: data.pontos.map(p => p.media),
+                    borderColor: color,
+                    backgroundColor: color,
+                    tension: 0.3,
+                    fill: false
+                }]
+            },
+            options: {
+                responsive: true,
+                interaction: { mode: 'index', intersect: false },
+                plugins: {
+                    legend: {
+                        labels: { filter: item => item.datasetIndex === 2 }
+                    },
+                    tooltip: {
+                        callbacks: {
+                            afterBody: items => `Registros: ${data.pontos[items[0].dataIndex].quantidade}`
+                        }
+                    }
+                }
+            }
+        });
+    } catch (error) {
+        console.error('Erro ao carregar histórico:', error);
+    }
+}
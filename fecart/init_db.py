@@ -1,14 +1,15 @@
-from app import app, db
-
-
-def initialize_database() -> None:
-    """Create all tables defined in SQLAlchemy models."""
-    with app.app_context():
-        db.create_all()
-        print("Banco de dados inicializado: verdetch.db")
-
-
-if __name__ == "__main__":
-    initialize_database()
-
-
+from app import create_app, inicializar_banco
+from models import db
+
+
+def initialize_database() -> None:
+    """Apply pending schema migrations (creates all tables on a new database)."""
+    app = create_app()
+    with app.app_context():
+        aplicadas = inicializar_banco()
+        db.engine.dispose()
+        print(f"Banco de dados inicializado: verdetch.db (migrações aplicadas: {aplicadas or 'nenhuma'})")
+
+
+if __name__ == "__main__":
+    initialize_database()
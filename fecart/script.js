@@ -37,7 +37,7 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
-    fetch('/api/me').then(r=>r.json()).then(me => {
+    window.sessao.obter().then(me => {
         const nav = document.querySelector('nav');
         if (!nav) return;
         const container = document.getElementById('nav-auth');
@@ -95,7 +95,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 const data = await response.json();
                 
                 if (response.ok) {
-                    const me = await fetch('/api/me').then(r=>r.json()).catch(()=>({}));
+                    const me = await window.sessao.obter().catch(()=>({}));
                     const nome = me && me.authenticated ? me.nome || me.username : '';
                     document.getElementById('resultado-valor').textContent = `${data.total} kg CO₂/ano`;
                     document.getElementById('resultado').style.display = 'block';
@@ -138,8 +138,7 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 async function checkAuthentication() {
     try {
-        const response = await fetch('/api/me');
-        const data = await response.json();
+        const data = await window.sessao.obter();
         
         if (!data.authenticated) {
             // Redirecionar para cadastro se não estiver autenticado
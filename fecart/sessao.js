@@ -0,0 +1,27 @@
+// Dados da sessão compartilhados pelos scripts da página (/api/bootstrap):
+// identidade, última pegada, último quiz, feedback e pontos. A primeira
+// chamada faz a requisição e as outras, mesmo as feitas enquanto ela está em
+// andamento, recebem a mesma resposta. Entre páginas o navegador revalida
+// pelo ETag.
+(function() {
+    let pedido = null;
+
+    function obter(opcoes = {}) {
+        if (opcoes.recarregar) pedido = null;
+        if (!pedido) {
+            pedido = fetch('/api/bootstrap', { credentials: 'same-origin' })
+                .then(response => {
+                    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                    return response.json();
+                })
+                .catch(error => {
+                    // Uma falha não fica guardada: a próxima chamada tenta de novo
+                    pedido = null;
+                    throw error;
+                });
+        }
+        return pedido;
+    }
+
+    window.sessao = { obter };
+})();
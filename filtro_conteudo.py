@@ -0,0 +1,171 @@
+"""Filtro de palavras proibidas para nomes e textos enviados pelos usuários.
+
+A lista de palavras é compilada uma vez em uma única expressão regular em
+forma de trie, e o texto é percorrido uma só vez em vez de uma vez por palavra. Antes da busca o texto é normalizado caractere a caractere
+(minúsculas, sem acentos, leetspeak como `p0rr4` -> `porra`); como a troca é
+de um caractere por um, as posições encontradas valem também no texto
+original, o que permite mascarar só os trechos ofensivos.
+
+Se `arquivo` for informado (uma palavra por linha, `#` para comentários), a
+lista é relida sempre que o arquivo muda, sem reiniciar o servidor.
+"""
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+_LEETSPEAK = {'0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '@': 'a', '$': 's', '!': 'i'}
+
+
+def _tabela_normalizacao():
+    tabela = bytearray(range(256))
+    for codigo in range(256):
+        base = unicodedata.normalize('NFKD', chr(codigo).lower())[0]
+        if ord(base) < 256:
+            tabela[codigo] = ord(base)
+    for origem, destino in _LEETSPEAK.items():
+        tabela[ord(origem)] = ord(destino)
+    return bytes(tabela)
+
+
+_TABELA = _tabela_normalizacao()
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos e sem leetspeak, em bytes latin-1.
+
+    Cada caractere vira exatamente um byte (os de fora do latin-1 viram `?`),
+    então as posições batem com as do texto original. `bytes.translate` com
+    tabela de 256 posições é bem mais rápido que `str.translate` com dict.
+    """
+    return texto.encode('latin-1', 'replace').translate(_TABELA)
+
+
+def _trie(palavras):
+    raiz = {}
+    for palavra in palavras:
+        no = raiz
+        for byte in palavra:
+            no = no.setdefault(byte, {})
+        no[''] = {}  # fim de palavra
+    return raiz
+
+
+def _regex_do_trie(no):
+    alternativas = [re.escape(bytes([c])) + _regex_do_trie(filho)
+                    for c, filho in sorted((c, f) for c, f in no.items() if c != '')]
+    if not alternativas:
+        return b''
+    regex = alternativas[0] if len(alternativas) == 1 else b'(?:' + b'|'.join(alternativas) + b')'
+    # Palavra que termina aqui e também continua: o sufixo vira opcional (guloso,
+    # então em cada posição vence a palavra mais comprida)
+    return b'(?:' + regex + b')?' if '' in no else regex
+
+
+def compilar(palavras):
+    """Regex única com as palavras (já normalizadas) organizadas em trie.
+
+    Em cada posição do texto o `re` desce no máximo um nível da trie por
+    caractere, então o custo por posição é limitado pela maior palavra, e não
+    pelo tamanho da lista: o texto é verificado em tempo linear, no motor em C.
+    """
+    if not palavras:
+        return None
+    return re.compile(_regex_do_trie(_trie(palavras)))
+
+
+class FiltroConteudo:
+    def __init__(self, palavras=(), arquivo=None, palavra_inteira=False, intervalo_recarga=2.0):
+        """`palavra_inteira=False` acusa a palavra mesmo dentro de outra
+        (como em nomes); com True só vale quando não há letra ou dígito colado.
+        """
+        self.palavras_padrao = list(palavras)
+        self.arquivo = arquivo
+        self.palavra_inteira = palavra_inteira
+        self.intervalo_recarga = intervalo_recarga
+        self._recarga = threading.Lock()
+        self._mtime = None
+        self._verificado_em = float('-inf')
+        self._padrao = compilar(self._normalizar_lista(self.palavras_padrao))
+        self._recarregar_se_mudou()
+
+    @staticmethod
+    def _normalizar_lista(palavras):
+        return {normalizar(p.strip()) for p in palavras if p.strip()}
+
+    def _recarregar_se_mudou(self):
+        if not self.arquivo:
+            return
+        agora = time.monotonic()
+        if agora - self._verificado_em < self.intervalo_recarga:
+            return
+        with self._recarga:
+            if agora - self._verificado_em < self.intervalo_recarga:
+                return
+            self._verificado_em = agora
+            try:
+                mtime = os.stat(self.arquivo).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime == self._mtime:
+                return
+            if mtime is None:
+                palavras = self.palavras_padrao
+            else:
+                with open(self.arquivo, encoding='utf-8') as f:
+                    palavras = [linha.split('#', 1)[0] for linha in f]
+            # Troca o padrão inteiro de uma vez; buscas em andamento usam o antigo
+            self._padrao = compilar(self._normalizar_lista(palavras))
+            self._mtime = mtime
+            logger.info(f"Filtro de conteúdo carregado de {self.arquivo or 'lista padrão'}")
+
+    def _buscar(self, texto):
+        self._recarregar_se_mudou()
+        padrao = self._padrao
+        if padrao is None:
+            return
+        normalizado = normalizar(texto)
+        posicao = 0
+        while True:
+            achado = padrao.search(normalizado, posicao)
+            if achado is None:
+                break
+            inicio, fim = achado.span()
+            # A fronteira é conferida no texto original: pontuação usada como
+            # leetspeak ("idiota!" -> "idiotai") não pode grudar na palavra
+            if self.palavra_inteira and (
+                (inicio > 0 and texto[inicio - 1].isalnum())
+                or (fim < len(texto) and texto[fim].isalnum())
+            ):
+                # Recusada: tenta de novo logo após o início, para não perder
+                # uma ocorrência sobreposta que respeite a fronteira
+                posicao = inicio + 1
+                continue
+            posicao = fim
+            yield inicio, fim, achado.group().decode('latin-1')
+
+    def encontrar(self, texto):
+        """Lista de (inicio, fim, palavra) das ocorrências em `texto`, por posição."""
+        return list(self._buscar(texto))
+
+    def primeira(self, texto):
+        """Primeira palavra proibida encontrada, ou None."""
+        for _, _, palavra in self._buscar(texto):
+            return palavra
+        return None
+
+    def mascarar(self, texto, mascara='*'):
+        """Troca por `mascara` cada caractere dos trechos proibidos."""
+        ocorrencias = self.encontrar(texto)
+        if not ocorrencias:
+            return texto
+        caracteres = list(texto)
+        for inicio, fim, _ in ocorrencias:
+            for i in range(inicio, fim):
+                if not caracteres[i].isspace():
+                    caracteres[i] = mascara
+        return ''.join(caracteres)
@@ -0,0 +1,71 @@
+"""Regras das conquistas e pontos, as mesmas do GamificationSystem (fecart/gamification.js).
+
+O estado de um usuário é uma máscara de bits das conquistas desbloqueadas.
+Um registro novo só liga bits, nunca desliga, então a avaliação é
+incremental: basta olhar o registro que acabou de ser gravado e fazer OR com
+a máscara guardada. A pontuação é a soma dos pontos dos bits ligados.
+"""
+from collections import namedtuple
+
+Conquista = namedtuple('Conquista', 'id nome descricao icone pontos')
+
+CONQUISTAS = (
+    Conquista('first_carbon', 'Primeira Pegada', 'Calcule sua primeira pegada de carbono', 'fas fa-leaf', 10),
+    Conquista('carbon_warrior', 'Guerreiro Verde', 'Reduza sua pegada para menos de 10kg CO2', 'fas fa-shield-alt', 25),
+    Conquista('quiz_master', 'Mestre do Quiz', 'Acerte 100% das perguntas do quiz', 'fas fa-trophy', 30),
+    Conquista('eco_explorer', 'Explorador Ecológico', 'Visite todas as seções do site', 'fas fa-compass', 15),
+    Conquista('carbon_zero', 'Carbono Zero', 'Alcance pegada de carbono zero', 'fas fa-star', 50),
+)
+BITS = {c.id: 1 << i for i, c in enumerate(CONQUISTAS)}
+
+LIMITE_GUERREIRO = 10  # kg CO2, como no checkCarbonAchievement
+
+# Seções do visitSection; o eco_explorer pede SECOES_EXPLORADOR delas
+SECOES = ('home', 'curiosidades', 'carbono', 'quiz', 'conta')
+SECOES_EXPLORADOR = 4
+
+
+def avaliar_pegada(total_co2):
+    mascara = BITS['first_carbon']
+    if total_co2 is not None and total_co2 <= LIMITE_GUERREIRO:
+        mascara |= BITS['carbon_warrior']
+    if total_co2 is not None and total_co2 <= 0:
+        mascara |= BITS['carbon_zero']
+    return mascara
+
+
+def avaliar_quiz(pontuacao, total_perguntas):
+    if total_perguntas and pontuacao >= total_perguntas:
+        return BITS['quiz_master']
+    return 0
+
+
+def avaliar_secoes(secoes):
+    """`secoes` é a máscara de bits das seções visitadas (índices de SECOES)."""
+    return BITS['eco_explorer'] if bin(secoes).count('1') >= SECOES_EXPLORADOR else 0
+
+
+def avaliar(tipo, registro):
+    """Máscara das conquistas que um registro ('pegada' ou 'quiz') desbloqueia."""
+    if tipo == 'pegada':
+        return avaliar_pegada(registro['total_co2'])
+    return avaliar_quiz(registro['pontuacao'], registro['total_perguntas'])
+
+
+def bit_secao(secao):
+    return 1 << SECOES.index(secao)
+
+
+def pontos(mascara):
+    return sum(c.pontos for c in CONQUISTAS if mascara & BITS[c.id])
+
+
+def listar(mascara):
+    return [{
+        'id': c.id,
+        'nome': c.nome,
+        'descricao': c.descricao,
+        'icone': c.icone,
+        'pontos': c.pontos,
+        'desbloqueada': bool(mascara & BITS[c.id])
+    } for c in CONQUISTAS]
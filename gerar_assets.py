@@ -0,0 +1,201 @@
+"""Build dos arquivos estáticos do front (fecart/) para produção.
+
+Gera fecart/dist/ com:
+
+- `assets/`: CSS, JS e imagens com hash do conteúdo no nome
+  (`style.3f2a9c1d0b.css`), servidos por /assets/ com cache imutável;
+- variantes pré-comprimidas ao lado de cada arquivo de texto (`.br` e `.gz`)
+  e, para as imagens, `.avif`/`.webp` e versões redimensionadas
+  (`parque.<hash>-320.png`, cada uma com suas próprias variantes);
+- cópia das páginas HTML com as referências trocadas pelos nomes com hash
+  (e `srcset` nas imagens), usada pelo app como pasta de templates e estáticos;
+- `manifest.json` com o nome original -> nome gerado.
+
+Brotli, WebP e AVIF dependem dos pacotes opcionais `brotli` e `Pillow`; sem
+eles essas variantes são puladas. Rode de novo depois de editar o front:
+
+    python gerar_assets.py
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+ORIGEM = os.path.join(RAIZ, 'fecart')
+DESTINO = os.path.join(ORIGEM, 'dist')
+
+EXTENSOES_TEXTO = ('.css', '.js', '.svg', '.json')
+EXTENSOES_IMAGEM = ('.png', '.jpg', '.jpeg')
+# Larguras das versões reduzidas das fotos (maiores que a maior largura)
+LARGURAS = (320, 640)
+# Pastas do fecart/ que nunca são publicadas
+IGNORADOS = {'dist', 'instance'}
+
+
+def _com_hash(caminho, conteudo, sufixo=''):
+    raiz, extensao = os.path.splitext(caminho)
+    return f'{raiz}.{hashlib.sha256(conteudo).hexdigest()[:10]}{sufixo}{extensao}'
+
+
+def _gravar(caminho, conteudo):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, 'wb') as f:
+        f.write(conteudo)
+
+
+def _precomprimir(caminho, conteudo):
+    """Grava `.gz` e `.br` ao lado do arquivo quando ficam menores que ele."""
+    variantes = {'.gz': gzip.compress(conteudo, 9, mtime=0)}
+    if brotli is not None:
+        variantes['.br'] = brotli.compress(conteudo, quality=11)
+    for extensao, comprimido in variantes.items():
+        if len(comprimido) < len(conteudo):
+            _gravar(caminho + extensao, comprimido)
+
+
+def _formatos_imagem():
+    formatos = []
+    if Image is not None:
+        if features.check('avif'):
+            formatos.append(('.avif', {'quality': 60}))
+        if features.check('webp'):
+            formatos.append(('.webp', {'quality': 75, 'method': 6}))
+    return formatos
+
+
+def _variantes_imagem(imagem, caminho, formato_original, formatos):
+    """Grava a imagem em `caminho` e as versões AVIF/WebP ao lado."""
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    imagem.save(caminho, formato_original, optimize=True)
+    for extensao, opcoes in formatos:
+        imagem.save(caminho + extensao, **opcoes)
+        # Só vale a pena servir a variante se ela for menor que o original
+        if os.path.getsize(caminho + extensao) >= os.path.getsize(caminho):
+            os.unlink(caminho + extensao)
+
+
+def processar_imagem(relativo, conteudo, formatos):
+    gerado = _com_hash(relativo, conteudo)
+    destino = os.path.join(DESTINO, 'assets', gerado)
+    entrada = {'arquivo': gerado}
+    if Image is None:
+        _gravar(destino, conteudo)
+        return entrada
+    with Image.open(os.path.join(ORIGEM, relativo)) as imagem:
+        imagem.load()
+        formato = imagem.format
+        _variantes_imagem(imagem, destino, formato, formatos)
+        # A reotimização pode sair maior que o original; nesse caso fica o original
+        if os.path.getsize(destino) > len(conteudo):
+            _gravar(destino, conteudo)
+        entrada['largura'] = imagem.width
+        entrada['larguras'] = {}
+        # Ícones e logos pequenos ficam só no tamanho original
+        for largura in LARGURAS if imagem.width > max(LARGURAS) else ():
+            altura = round(imagem.height * largura / imagem.width)
+            reduzida = imagem.resize((largura, altura), Image.LANCZOS)
+            arquivo = _com_hash(relativo, conteudo, f'-{largura}')
+            _variantes_imagem(reduzida, os.path.join(DESTINO, 'assets', arquivo), formato, formatos)
+            entrada['larguras'][largura] = arquivo
+    return entrada
+
+
+def processar_texto(relativo, conteudo):
+    gerado = _com_hash(relativo, conteudo)
+    destino = os.path.join(DESTINO, 'assets', gerado)
+    _gravar(destino, conteudo)
+    _precomprimir(destino, conteudo)
+    return {'arquivo': gerado}
+
+
+_REFERENCIA = re.compile(r'(<img\b[^>]*?)?\b(src|href)="/?([^"#?:]+)"')
+
+
+def reescrever_html(html, manifest):
+    """Troca as referências a assets conhecidos pelos nomes com hash."""
+    def trocar(achado):
+        tag_img, atributo, referencia = achado.groups()
+        entrada = manifest.get(referencia)
+        if entrada is None:
+            return achado.group(0)
+        novo = f'{tag_img or ""}{atributo}="/assets/{entrada["arquivo"]}"'
+        larguras = entrada.get('larguras')
+        if tag_img is not None and larguras and 'srcset' not in tag_img:
+            candidatos = [f'/assets/{arquivo} {largura}w' for largura, arquivo in sorted(larguras.items())]
+            candidatos.append(f'/assets/{entrada["arquivo"]} {entrada["largura"]}w')
+            novo += f' srcset="{", ".join(candidatos)}" sizes="(max-width: 600px) 100vw, 33vw"'
+        return novo
+    return _REFERENCIA.sub(trocar, html)
+
+
+def arquivos_publicos():
+    for pasta, subpastas, arquivos in os.walk(ORIGEM):
+        subpastas[:] = sorted(s for s in subpastas if s not in IGNORADOS)
+        for nome in sorted(arquivos):
+            relativo = os.path.relpath(os.path.join(pasta, nome), ORIGEM).replace(os.sep, '/')
+            if relativo.endswith(EXTENSOES_TEXTO + EXTENSOES_IMAGEM + ('.html',)):
+                yield relativo
+
+
+def construir():
+    if os.path.isdir(DESTINO):
+        shutil.rmtree(DESTINO)
+    formatos = _formatos_imagem()
+    if brotli is None:
+        logger.warning("Pacote brotli ausente: só serão geradas variantes .gz")
+    if Image is None:
+        logger.warning("Pillow ausente: imagens copiadas sem AVIF/WebP nem redimensionamento")
+
+    manifest, paginas = {}, []
+    for relativo in arquivos_publicos():
+        with open(os.path.join(ORIGEM, relativo), 'rb') as f:
+            conteudo = f.read()
+        # Cópia com o nome original, para referências que o build não reescreve
+        _gravar(os.path.join(DESTINO, relativo), conteudo)
+        if relativo.endswith('.html'):
+            paginas.append(relativo)
+        elif relativo.endswith(EXTENSOES_IMAGEM):
+            manifest[relativo] = processar_imagem(relativo, conteudo, formatos)
+        else:
+            manifest[relativo] = processar_texto(relativo, conteudo)
+        logger.info(f"{relativo} -> {manifest.get(relativo, {}).get('arquivo', relativo)}")
+
+    for relativo in paginas:
+        with open(os.path.join(ORIGEM, relativo), encoding='utf-8') as f:
+            html = f.read()
+        _gravar(os.path.join(DESTINO, relativo), reescrever_html(html, manifest).encode('utf-8'))
+
+    # Gravado por último: o app só usa dist/ quando o manifest existe
+    with open(os.path.join(DESTINO, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-q', '--quieto', action='store_true')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING if args.quieto else logging.INFO, format='%(message)s')
+    manifest = construir()
+    print(f"{len(manifest)} assets gerados em {os.path.relpath(DESTINO, RAIZ)}")
+
+
+if __name__ == '__main__':
+    main()
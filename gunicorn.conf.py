@@ -0,0 +1,55 @@
+"""Configuração do gunicorn, lida automaticamente da pasta de onde ele é iniciado.
+
+Com `preload_app` o app é importado e criado uma vez, no processo mestre, e
+os workers nascem dele por fork, sem repetir a importação: a subida e os
+workers novos ficam mais rápidos. O create_app não abre conexões, e cada
+worker descarta o que herdou antes de atender (post_worker_init).
+
+As migrações pendentes rodam uma vez por subida, no mestre, antes dos
+workers (MIGRAR_AO_INICIAR=0 desliga, para quem roda `flask --app app
+migrar` no deploy). Também ali são apagados os retratos de métricas da
+subida anterior (ver metricas.py).
+
+As threads por worker também ficam aqui (GUNICORN_THREADS, padrão 4), para
+o Procfile, o render.yaml e o Dockerfile rodarem o mesmo modelo. O valor vai
+para o ambiente antes de o app ser importado: é por ele que o app dimensiona
+o pool de senhas e o limite por processo do controle de admissão.
+"""
+import os
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+threads = int(os.environ.setdefault('GUNICORN_THREADS', '4'))
+
+
+def on_starting(server):
+    import metricas
+
+    # Retratos de métricas de uma subida anterior não entram na soma desta
+    server.log.info(f"Retratos de métricas antigos apagados: {metricas.limpar()}")
+    if os.environ.get('MIGRAR_AO_INICIAR', '1') == '0':
+        return
+    import app
+    from models import db
+
+    aplicacao = app.create_app()
+    with aplicacao.app_context():
+        try:
+            aplicadas = app.inicializar_banco()
+            server.log.info(f"Migrações aplicadas: {aplicadas or 'nenhuma'}")
+        except Exception as e:
+            # Como antes do create_app: o app sobe mesmo com erro no banco
+            server.log.error(f"Erro ao inicializar banco de dados: {e}")
+        finally:
+            # O mestre não fica com conexão aberta para os workers herdarem
+            for engine in db.engines.values():
+                engine.dispose()
+
+
+def post_worker_init(worker):
+    import app
+
+    if worker.cfg.threads != threads:
+        # Um --threads na linha de comando passa por cima deste arquivo, mas o app já se dimensionou
+        worker.log.warning(f"--threads {worker.cfg.threads} difere de GUNICORN_THREADS={threads}; "
+                           "use GUNICORN_THREADS para mudar as threads")
+    app.preparar_processo(worker.wsgi)
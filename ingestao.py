@@ -0,0 +1,204 @@
+"""Ingestão em lote (write-behind) para os envios da calculadora e do quiz.
+
+Cada registro é gravado primeiro em um spool local (arquivo append-only) e
+depois colocado em uma fila em memória limitada. Uma thread de fundo esvazia
+a fila em transações agrupadas, por tamanho ou por tempo, e só então apaga o
+trecho do spool correspondente. Se o processo morrer antes disso, o spool é
+reaplicado por `recuperar()` na próxima inicialização.
+
+O módulo não conhece o banco: quem grava é a função `gravar(registros)`
+recebida no construtor, com `registros` sendo uma lista de (tipo, dados).
+Só as falhas que `transitorio(erro)` reconhece (banco ocupado, por exemplo)
+são repetidas até passar. Com qualquer outra, o lote é regravado registro a
+registro e os que falharem vão para `rejeitados.jsonl` no spool, com o erro,
+para que um registro ruim não trave a fila.
+"""
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class IngestaoEmLote:
+    def __init__(self, gravar, diretorio_spool, tamanho_lote=200, intervalo=0.5,
+                 capacidade=5000, fsync=True, transitorio=None):
+        self.gravar = gravar
+        # Sem critério, toda falha é tratada como transitória
+        self.transitorio = transitorio or (lambda erro: True)
+        self.diretorio_spool = diretorio_spool
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self.capacidade = capacidade
+        self.fsync = fsync
+        self.estatisticas = {
+            'enfileirados': 0, 'gravados': 0, 'lotes': 0, 'falhas': 0, 'fila_cheia': 0, 'rejeitados': 0
+        }
+        self._inicio = threading.Lock()
+        self._pid = None
+        os.makedirs(diretorio_spool, exist_ok=True)
+
+    def enfileirar(self, tipo, dados):
+        """Registra `dados` para gravação em lote.
+
+        Retorna False quando a fila está cheia; nesse caso nada foi gravado e
+        o chamador deve fazer a gravação síncrona.
+        """
+        self._garantir_iniciado()
+        with self._cond:
+            if len(self._fila) >= self.capacidade:
+                self.estatisticas['fila_cheia'] += 1
+                return False
+            arquivo = self._segmento[0]
+            arquivo.write(json.dumps([tipo, dados]) + '\n')
+            arquivo.flush()
+            if self.fsync:
+                os.fsync(arquivo.fileno())
+            self._fila.append((tipo, dados))
+            self.estatisticas['enfileirados'] += 1
+            if len(self._fila) >= self.tamanho_lote:
+                self._cond.notify()
+        return True
+
+    def pendentes(self):
+        return len(self._fila) if self._pid == os.getpid() else 0
+
+    def recuperar(self):
+        """Reaplica segmentos de spool deixados por processos que morreram.
+
+        Segmentos de processos vivos estão travados (flock) e são ignorados.
+        """
+        for caminho in sorted(glob.glob(os.path.join(self.diretorio_spool, 'ingestao-*.jsonl'))):
+            try:
+                arquivo = open(caminho, 'r', encoding='utf-8')
+            except FileNotFoundError:
+                continue
+            with arquivo:
+                try:
+                    fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                # Outro processo pode ter reaplicado e apagado o arquivo entre o glob e o flock
+                if os.fstat(arquivo.fileno()).st_nlink == 0:
+                    continue
+                registros = []
+                for linha in arquivo:
+                    try:
+                        tipo, dados = json.loads(linha)
+                    except ValueError:
+                        # Linha incompleta: o processo morreu no meio da escrita
+                        continue
+                    registros.append((tipo, dados))
+                for inicio in range(0, len(registros), self.tamanho_lote):
+                    # Poucas tentativas: quem chama é a subida do worker; o arquivo fica para a próxima
+                    self._gravar_lote(registros[inicio:inicio + self.tamanho_lote], tentativas=3)
+                os.unlink(caminho)
+                if registros:
+                    logger.info(f"Spool reaplicado: {len(registros)} registros de {os.path.basename(caminho)}")
+
+    def parar(self, timeout=5):
+        """Grava o que estiver na fila e encerra a thread de fundo."""
+        if self._pid != os.getpid():
+            return
+        with self._cond:
+            self._parando = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def _garantir_iniciado(self):
+        # Inicialização preguiçosa e por processo: após o fork do gunicorn cada
+        # worker cria sua própria fila, segmento de spool e thread.
+        if self._pid == os.getpid():
+            return
+        with self._inicio:
+            if self._pid == os.getpid():
+                return
+            self._cond = threading.Condition()
+            self._fila = []
+            self._sequencia = 0
+            self._parando = False
+            self._segmento = self._novo_segmento()
+            self._thread = threading.Thread(target=self._executar, name='ingestao-em-lote', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _novo_segmento(self):
+        self._sequencia += 1
+        nome = f'ingestao-{os.getpid()}-{int(time.time() * 1000)}-{self._sequencia}'
+        temporario = os.path.join(self.diretorio_spool, nome + '.tmp')
+        caminho = os.path.join(self.diretorio_spool, nome + '.jsonl')
+        arquivo = open(temporario, 'a', encoding='utf-8')
+        # Trava antes de tornar o arquivo visível para recuperar()
+        fcntl.flock(arquivo, fcntl.LOCK_EX)
+        os.rename(temporario, caminho)
+        return arquivo, caminho
+
+    def _executar(self):
+        while True:
+            with self._cond:
+                if len(self._fila) < self.tamanho_lote and not self._parando:
+                    self._cond.wait(self.intervalo)
+                if not self._fila:
+                    if self._parando:
+                        self._descartar_segmento(self._segmento)
+                        return
+                    continue
+                # Fila e segmento trocam juntos sob o lock: o segmento antigo
+                # contém exatamente os registros do lote.
+                lote, self._fila = self._fila, []
+                segmento, self._segmento = self._segmento, self._novo_segmento()
+
+            self.estatisticas['gravados'] += self._gravar_lote(lote)
+            self.estatisticas['lotes'] += 1
+            self._descartar_segmento(segmento)
+
+    def _gravar_lote(self, lote, tentativas=None):
+        """Grava o lote e retorna quantos registros entraram (os demais foram rejeitados).
+
+        Falhas transitórias são repetidas, sem limite ou até `tentativas`
+        (depois disso o erro sobe); as outras separam os registros ruins.
+        """
+        tentativa = 0
+        while True:
+            try:
+                self.gravar(lote)
+                return len(lote)
+            except Exception as erro:
+                self.estatisticas['falhas'] += 1
+                if not self.transitorio(erro):
+                    if len(lote) == 1:
+                        self._rejeitar(lote[0], erro)
+                        return 0
+                    logger.error(f"Lote de {len(lote)} registros recusado ({erro}); gravando um a um")
+                    return sum(self._gravar_lote([registro], tentativas) for registro in lote)
+                tentativa += 1
+                if tentativas is not None and tentativa >= tentativas:
+                    raise
+                logger.warning(f"Falha ao gravar lote de {len(lote)} registros (tentativa {tentativa}): {erro}")
+                time.sleep(min(0.1 * 2 ** tentativa, 5))
+
+    def _rejeitar(self, registro, erro):
+        """Guarda o registro que não pode ser gravado em rejeitados.jsonl, com o erro."""
+        tipo, dados = registro
+        linha = json.dumps({'tipo': tipo, 'dados': dados, 'erro': repr(erro), 'em': time.time()}) + '\n'
+        # Uma escrita só com O_APPEND: linhas de workers diferentes não se misturam
+        descritor = os.open(os.path.join(self.diretorio_spool, 'rejeitados.jsonl'),
+                            os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(descritor, linha.encode('utf-8'))
+            if self.fsync:
+                os.fsync(descritor)
+        finally:
+            os.close(descritor)
+        self.estatisticas['rejeitados'] += 1
+        logger.error(f"Registro de {tipo} rejeitado e guardado em rejeitados.jsonl: {erro!r}")
+
+    @staticmethod
+    def _descartar_segmento(segmento):
+        arquivo, caminho = segmento
+        os.unlink(caminho)
+        arquivo.close()
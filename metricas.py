@@ -0,0 +1,311 @@
+"""Métricas por requisição e por consulta SQL, exportadas no formato texto do Prometheus.
+
+Cada processo acumula contadores e histogramas em memória (latência, status
+e tamanho da resposta por rota; comandos SQL e tempo de banco por rota) e
+grava um retrato em `pasta/metricas-<pid>-<id>.json` no fim das requisições,
+no máximo a cada `intervalo_gravacao` segundos. O /metrics de qualquer worker
+soma os retratos de todos, então o resultado não depende de qual worker do
+gunicorn atendeu a coleta. Os arquivos de workers que já morreram continuam
+sendo somados (contadores não voltam atrás); o `id`, sorteado a cada processo,
+impede que um worker novo com o pid de um antigo sobrescreva o retrato dele.
+A pasta é esvaziada por `limpar` a cada subida (gunicorn.conf.py), antes de
+os workers nascerem.
+
+Consultas mais lentas que `sql_lenta` segundos vão para o log com os
+parâmetros. Medidores (gauges) não são somados: a função registrada com
+`medir` é chamada na exportação e já devolve o valor do nó.
+"""
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+BALDES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BALDES_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+BALDES_COMANDOS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+# nome: (tipo, ajuda, baldes)
+DEFINICOES = {
+    'verdetech_http_requisicoes_total': ('counter', 'Requisições atendidas por rota, método e status', None),
+    'verdetech_http_duracao_segundos': ('histogram', 'Latência das requisições por rota', BALDES_SEGUNDOS),
+    'verdetech_http_resposta_bytes': ('histogram', 'Tamanho do corpo das respostas por rota', BALDES_BYTES),
+    'verdetech_sql_comandos_por_requisicao': ('histogram', 'Comandos SQL executados por requisição',
+                                              BALDES_COMANDOS),
+    'verdetech_sql_duracao_segundos': ('histogram', 'Duração de cada comando SQL por rota', BALDES_SEGUNDOS),
+    'verdetech_sql_lentas_total': ('counter', 'Comandos SQL acima do limite de consulta lenta', None),
+    'verdetech_cache_consultas_total': ('counter', 'Consultas ao cache de respostas por rota e resultado '
+                                                   '(acerto, falta ou validacao com 304)', None),
+    'verdetech_admissao_recusas_total': ('counter', 'Requisições recusadas pelo controle de admissão por rota '
+                                                    'e motivo (taxa, em_andamento ou processo)', None),
+    'verdetech_admissao_em_andamento': ('gauge', 'Requisições admitidas e em andamento no nó por rota', None),
+}
+
+# Pasta dos retratos, compartilhada pelos workers
+PASTA = os.environ.get('METRICAS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                    'fecart', 'instance', 'metricas'))
+
+FORA_DE_REQUISICAO = 'fora_de_requisicao'
+SEM_ROTA = 'sem_rota'
+_ESPACOS = re.compile(r'\s+')
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(rotulos, extra=''):
+    partes = [f'{k}="{_escapar(v)}"' for k, v in rotulos]
+    if extra:
+        partes.append(extra)
+    return '{' + ','.join(partes) + '}' if partes else ''
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _retrato(nome_arquivo):
+    return nome_arquivo.startswith('metricas-') and nome_arquivo.endswith('.json')
+
+
+def limpar(pasta=PASTA):
+    """Apaga os retratos (e temporários) de processos anteriores; retorna quantos."""
+    removidos = 0
+    for nome_arquivo in os.listdir(pasta) if os.path.isdir(pasta) else ():
+        if _retrato(nome_arquivo) or (nome_arquivo.startswith('metricas-') and nome_arquivo.endswith('.tmp')):
+            try:
+                os.remove(os.path.join(pasta, nome_arquivo))
+                removidos += 1
+            except FileNotFoundError:
+                pass
+    return removidos
+
+
+class Metricas:
+    def __init__(self, pasta, sql_lenta=0.1, intervalo_gravacao=1.0):
+        self.pasta = pasta
+        self.sql_lenta = sql_lenta
+        self.intervalo_gravacao = intervalo_gravacao
+        self._medidores = {}
+        os.makedirs(pasta, exist_ok=True)
+        self._reiniciar()
+
+    def _reiniciar(self):
+        # Estado do processo atual; depois de um fork o filho começa do zero,
+        # porque o que o pai contou já está no arquivo dele
+        self._pid = os.getpid()
+        self._id = uuid.uuid4().hex[:12]
+        self._trava = threading.Lock()
+        self._contadores = {}
+        self._histogramas = {}
+        self._gravado_em = 0.0
+
+    def _estado(self):
+        if self._pid != os.getpid():
+            self._reiniciar()
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        self._estado()
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._trava:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    def observar(self, nome, valor, **rotulos):
+        self._estado()
+        baldes = DEFINICOES[nome][2]
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._trava:
+            histograma = self._histogramas.get(chave)
+            if histograma is None:
+                # Contagem por balde (o último é o +Inf), soma e total
+                histograma = self._histogramas[chave] = [[0] * (len(baldes) + 1), 0, 0]
+            histograma[0][bisect.bisect_left(baldes, valor)] += 1
+            histograma[1] += valor
+            histograma[2] += 1
+
+    def medir(self, nome, funcao):
+        """Registra o medidor `nome`: `funcao()` devolve {rota: valor} e é chamada a cada exportação."""
+        self._medidores[nome] = funcao
+
+    # --- Gravação e agregação entre processos ---
+
+    def _arquivo(self):
+        return os.path.join(self.pasta, f'metricas-{self._pid}-{self._id}.json')
+
+    def gravar(self):
+        """Grava o retrato deste processo (troca atômica do arquivo)."""
+        self._estado()
+        with self._trava:
+            retrato = {
+                'contadores': [[nome, rotulos, valor] for (nome, rotulos), valor in self._contadores.items()],
+                'histogramas': [[nome, rotulos, *h] for (nome, rotulos), h in self._histogramas.items()],
+            }
+            self._gravado_em = time.monotonic()
+        arquivo = self._arquivo()
+        temporario = f'{arquivo}.{threading.get_ident()}.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(retrato, f)
+        os.replace(temporario, arquivo)
+
+    def _gravar_se_preciso(self):
+        if time.monotonic() - self._gravado_em >= self.intervalo_gravacao:
+            try:
+                self.gravar()
+            except OSError as e:
+                logger.error(f"Erro ao gravar métricas: {e}")
+
+    def agregar(self):
+        """Soma os retratos de todos os processos: (contadores, histogramas)."""
+        self.gravar()
+        contadores, histogramas = {}, {}
+        for nome_arquivo in os.listdir(self.pasta):
+            if not _retrato(nome_arquivo):
+                continue
+            try:
+                with open(os.path.join(self.pasta, nome_arquivo), encoding='utf-8') as f:
+                    retrato = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Retrato de métricas ilegível ({nome_arquivo}): {e}")
+                continue
+            for nome, rotulos, valor in retrato['contadores']:
+                chave = (nome, tuple(map(tuple, rotulos)))
+                contadores[chave] = contadores.get(chave, 0) + valor
+            for nome, rotulos, baldes, soma, total in retrato['histogramas']:
+                chave = (nome, tuple(map(tuple, rotulos)))
+                atual = histogramas.setdefault(chave, [[0] * len(baldes), 0, 0])
+                atual[0] = [a + b for a, b in zip(atual[0], baldes)]
+                atual[1] += soma
+                atual[2] += total
+        return contadores, histogramas
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)."""
+        contadores, histogramas = self.agregar()
+        linhas = []
+        for nome, (tipo, ajuda, baldes) in DEFINICOES.items():
+            linhas.append(f'# HELP {nome} {ajuda}')
+            linhas.append(f'# TYPE {nome} {tipo}')
+            if tipo == 'counter':
+                for (n, rotulos), valor in sorted(contadores.items()):
+                    if n == nome:
+                        linhas.append(f'{nome}{_rotulos(rotulos)} {_numero(valor)}')
+                continue
+            if tipo == 'gauge':
+                try:
+                    valores = self._medidores[nome]() if nome in self._medidores else {}
+                except Exception as e:
+                    logger.error(f"Erro ao ler o medidor {nome}: {e}")
+                    valores = {}
+                for rota, valor in sorted(valores.items()):
+                    linhas.append(f'{nome}{_rotulos([("rota", rota)])} {_numero(valor)}')
+                continue
+            for (n, rotulos), (contagens, soma, total) in sorted(histogramas.items()):
+                if n != nome:
+                    continue
+                acumulado = 0
+                for limite, contagem in zip(list(baldes) + ['+Inf'], contagens):
+                    acumulado += contagem
+                    le = f'le="{limite}"'
+                    linhas.append(f'{nome}_bucket{_rotulos(rotulos, le)} {acumulado}')
+                linhas.append(f'{nome}_sum{_rotulos(rotulos)} {_numero(soma)}')
+                linhas.append(f'{nome}_count{_rotulos(rotulos)} {total}')
+        return '\n'.join(linhas) + '\n'
+
+    # --- Instrumentação do Flask e do SQLAlchemy ---
+
+    def instrumentar(self, app, *engines):
+        app.before_request(self._inicio_requisicao)
+        app.after_request(self._fim_requisicao)
+        app.teardown_request(self._erro_requisicao)
+        for engine in engines:
+            if engine is not None:
+                event.listen(engine, 'before_cursor_execute', self._antes_sql)
+                event.listen(engine, 'after_cursor_execute', self._depois_sql)
+                event.listen(engine, 'handle_error', self._erro_sql)
+
+    @staticmethod
+    def _rota():
+        return request.url_rule.rule if request.url_rule is not None else SEM_ROTA
+
+    def _inicio_requisicao(self):
+        g.metricas = {'inicio': time.perf_counter(), 'sql': 0, 'registrada': False}
+
+    def _fim_requisicao(self, response):
+        estado = g.get('metricas')
+        if estado is None:
+            return response
+        rota, metodo, status = self._rota(), request.method, response.status_code
+        estado['registrada'] = True
+        estado['bytes'] = response.content_length
+        if estado['bytes'] is None and response.is_streamed:
+            estado['bytes'] = 0
+            response.response = _contar_bytes(response.response, estado)
+
+        # Registrado no fechamento da resposta, para incluir o tempo (e as
+        # consultas) das respostas em streaming
+        def registrar():
+            self.incrementar('verdetech_http_requisicoes_total', rota=rota, metodo=metodo, status=status)
+            self.observar('verdetech_http_duracao_segundos', time.perf_counter() - estado['inicio'],
+                          rota=rota, metodo=metodo)
+            if estado['bytes'] is not None:
+                self.observar('verdetech_http_resposta_bytes', estado['bytes'], rota=rota)
+            self.observar('verdetech_sql_comandos_por_requisicao', estado['sql'], rota=rota)
+            self._gravar_se_preciso()
+
+        response.call_on_close(registrar)
+        return response
+
+    def _erro_requisicao(self, excecao):
+        estado = g.get('metricas')
+        if excecao is None or estado is None or estado['registrada']:
+            return
+        rota = self._rota()
+        self.incrementar('verdetech_http_requisicoes_total', rota=rota, metodo=request.method, status=500)
+        self.observar('verdetech_http_duracao_segundos', time.perf_counter() - estado['inicio'],
+                      rota=rota, metodo=request.method)
+        self._gravar_se_preciso()
+
+    def _antes_sql(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metricas_inicio', []).append(time.perf_counter())
+
+    def _depois_sql(self, conn, cursor, statement, parameters, context, executemany):
+        duracao = time.perf_counter() - conn.info['metricas_inicio'].pop()
+        rota = FORA_DE_REQUISICAO
+        if has_request_context():
+            rota = self._rota()
+            estado = g.get('metricas')
+            if estado is not None:
+                estado['sql'] += 1
+        self.observar('verdetech_sql_duracao_segundos', duracao, rota=rota)
+        if duracao >= self.sql_lenta:
+            self.incrementar('verdetech_sql_lentas_total', rota=rota)
+            parametros = repr(parameters)
+            if len(parametros) > 500:
+                parametros = parametros[:500] + '...'
+            logger.warning(f"SQL lenta ({duracao * 1000:.0f} ms) em {rota}: "
+                           f"{_ESPACOS.sub(' ', statement).strip()} | parâmetros: {parametros}")
+
+    @staticmethod
+    def _erro_sql(contexto):
+        # O comando falhou: descarta o início guardado pelo _antes_sql
+        if contexto.connection is not None and contexto.connection.info.get('metricas_inicio'):
+            contexto.connection.info['metricas_inicio'].pop()
+
+
+def _contar_bytes(iteravel, estado):
+    try:
+        for parte in iteravel:
+            estado['bytes'] += len(parte)
+            yield parte
+    finally:
+        if hasattr(iteravel, 'close'):
+            iteravel.close()
@@ -0,0 +1,266 @@
+"""Migrações versionadas do banco SQLite.
+
+Cada migração tem um número, um nome e uma função que recebe um cursor
+sqlite3 já dentro de uma transação (BEGIN IMMEDIATE). As versões aplicadas
+ficam na tabela `schema_migracao`; `aplicar()` roda só as pendentes, em
+ordem, e pode ser chamada por vários workers ao mesmo tempo.
+
+A migração 1 cria o esquema da versão 1 congelado em SQL (não os modelos
+atuais) e só as tabelas que faltam: um banco antigo mantém as suas como
+estão até as migrações seguintes, que levam qualquer banco ao esquema dos
+modelos. Elas precisam ser idempotentes (IF NOT EXISTS, checagem de
+colunas etc.).
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import MetaData
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+logger = logging.getLogger(__name__)
+
+MIGRACOES = []
+
+
+def migracao(versao, nome):
+    def registrar(funcao):
+        MIGRACOES.append((versao, nome, funcao))
+        MIGRACOES.sort(key=lambda m: m[0])
+        return funcao
+    return registrar
+
+
+def _indices_existentes(cursor, tabela):
+    return {linha[1] for linha in cursor.execute(f'PRAGMA index_list({tabela})')}
+
+
+# Esquema da versão 1, congelado: não deve acompanhar os modelos. Sem índices
+# além das chaves; o índice único de feedback só vem na migração 3, depois
+# de remover os duplicados que bancos antigos podem ter.
+ESQUEMA_V1 = (
+    """CREATE TABLE IF NOT EXISTS usuario (
+        id INTEGER NOT NULL, nome VARCHAR(100) NOT NULL, email VARCHAR(100) NOT NULL,
+        data_cadastro DATETIME,
+        PRIMARY KEY (id), UNIQUE (email))""",
+    """CREATE TABLE IF NOT EXISTS pegada_carbono (
+        id INTEGER NOT NULL, usuario_id INTEGER, transporte FLOAT NOT NULL,
+        energia FLOAT NOT NULL, alimentacao INTEGER NOT NULL, lixo INTEGER NOT NULL,
+        total_co2 FLOAT NOT NULL, data_calculo DATETIME,
+        PRIMARY KEY (id), FOREIGN KEY(usuario_id) REFERENCES usuario (id))""",
+    """CREATE TABLE IF NOT EXISTS resultado_quiz (
+        id INTEGER NOT NULL, usuario_id INTEGER, pontuacao INTEGER NOT NULL,
+        total_perguntas INTEGER NOT NULL, data_realizacao DATETIME,
+        PRIMARY KEY (id), FOREIGN KEY(usuario_id) REFERENCES usuario (id))""",
+    """CREATE TABLE IF NOT EXISTS auth (
+        id INTEGER NOT NULL, usuario_id INTEGER NOT NULL, username VARCHAR(120) NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        PRIMARY KEY (id), FOREIGN KEY(usuario_id) REFERENCES usuario (id), UNIQUE (username))""",
+    """CREATE TABLE IF NOT EXISTS feedback (
+        id INTEGER NOT NULL, usuario_id INTEGER, rating INTEGER NOT NULL, text TEXT,
+        quiz_score INTEGER, quiz_total INTEGER, data_feedback DATETIME,
+        PRIMARY KEY (id), FOREIGN KEY(usuario_id) REFERENCES usuario (id))""",
+    """CREATE TABLE IF NOT EXISTS fator_emissao (
+        versao INTEGER NOT NULL, transporte FLOAT NOT NULL, energia FLOAT NOT NULL,
+        alimentacao FLOAT NOT NULL, lixo FLOAT NOT NULL, data_criacao DATETIME,
+        PRIMARY KEY (versao))""",
+    """CREATE TABLE IF NOT EXISTS estatistica_diaria (
+        dia DATE NOT NULL, metrica VARCHAR(40) NOT NULL, quantidade INTEGER NOT NULL,
+        soma FLOAT NOT NULL, soma_quadrados FLOAT NOT NULL,
+        PRIMARY KEY (dia, metrica))""",
+    """CREATE TABLE IF NOT EXISTS histograma_diario (
+        dia DATE NOT NULL, metrica VARCHAR(40) NOT NULL, balde INTEGER NOT NULL,
+        quantidade INTEGER NOT NULL,
+        PRIMARY KEY (dia, metrica, balde))""",
+)
+
+
+@migracao(1, 'tabelas iniciais')
+def _tabelas_iniciais(cursor, metadata, dialeto):
+    for comando in ESQUEMA_V1:
+        cursor.execute(comando)
+
+
+@migracao(2, 'índices de atividades por usuário')
+def _indices_atividades(cursor, metadata, dialeto):
+    # Servem as consultas "mais recente por usuário" do relatório, da conta e do feedback
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_pegada_carbono_usuario_data '
+                   'ON pegada_carbono (usuario_id, data_calculo DESC, id DESC)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_resultado_quiz_usuario_data '
+                   'ON resultado_quiz (usuario_id, data_realizacao DESC, id DESC)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_feedback_usuario_data '
+                   'ON feedback (usuario_id, data_feedback DESC, id DESC)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_auth_usuario_id ON auth (usuario_id)')
+
+
+@migracao(3, 'um feedback por usuário')
+def _feedback_unico(cursor, metadata, dialeto):
+    if 'ux_feedback_usuario_id' in _indices_existentes(cursor, 'feedback'):
+        return
+    # Mantém só o feedback mais recente de cada usuário antes de criar o índice único
+    removidos = cursor.execute('''
+        DELETE FROM feedback WHERE usuario_id IS NOT NULL AND id NOT IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY usuario_id ORDER BY data_feedback DESC, id DESC
+                ) AS ordem
+                FROM feedback WHERE usuario_id IS NOT NULL
+            ) WHERE ordem = 1
+        )
+    ''').rowcount
+    if removidos:
+        logger.warning(f"Migração 3: {removidos} feedbacks duplicados removidos")
+    cursor.execute('CREATE UNIQUE INDEX ux_feedback_usuario_id ON feedback (usuario_id)')
+
+
+def _criar_tabelas(cursor, metadata, dialeto, nomes):
+    """Cria tabelas (e seus índices) declaradas nos modelos, se ainda não existirem.
+
+    Tabelas que já existem ficam como estão: um índice novo (talvez único)
+    sobre elas é assunto de uma migração própria.
+    """
+    for nome in nomes:
+        tabela = metadata.tables[nome]
+        if cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (nome,)).fetchone():
+            continue
+        cursor.execute(str(CreateTable(tabela, if_not_exists=True).compile(dialect=dialeto)))
+        for indice in tabela.indexes:
+            cursor.execute(str(CreateIndex(indice, if_not_exists=True).compile(dialect=dialeto)))
+
+
+@migracao(4, 'conquistas e ranking')
+def _conquistas(cursor, metadata, dialeto):
+    # Preenchidas por `flask --app app reconstruir-conquistas`
+    _criar_tabelas(cursor, metadata, dialeto, ['pontuacao_usuario', 'distribuicao_pontos'])
+
+
+# Tabelas com chave estrangeira para usuario, apagadas junto com ele (ON DELETE CASCADE)
+TABELAS_DO_USUARIO = ('auth', 'pegada_carbono', 'resultado_quiz', 'feedback', 'pontuacao_usuario')
+
+
+def _recriar_tabela(cursor, metadata, dialeto, nome):
+    """Recria a tabela com o esquema atual do modelo, copiando as linhas.
+
+    O SQLite não altera chaves estrangeiras de uma tabela existente: cria-se
+    a nova, copia-se, apaga-se a antiga e renomeia-se a nova. Linhas que
+    apontam para usuários que não existem mais ficam de fora.
+    """
+    tabela = metadata.tables[nome]
+    temporaria = f'{nome}_nova'
+    copia = MetaData()
+    metadata.tables['usuario'].to_metadata(copia)
+    cursor.execute(str(CreateTable(tabela.to_metadata(copia, name=temporaria)).compile(dialect=dialeto)))
+    existentes = {linha[1] for linha in cursor.execute(f'PRAGMA table_info({nome})')}
+    colunas = ', '.join(c.name for c in tabela.columns if c.name in existentes)
+    total = cursor.execute(f'SELECT COUNT(*) FROM {nome}').fetchone()[0]
+    copiadas = cursor.execute(
+        f'INSERT INTO {temporaria} ({colunas}) SELECT {colunas} FROM {nome} '
+        'WHERE usuario_id IS NULL OR usuario_id IN (SELECT id FROM usuario)'
+    ).rowcount
+    if copiadas != total:
+        logger.warning(f"Migração 5: {total - copiadas} linhas órfãs de {nome} removidas")
+    cursor.execute(f'DROP TABLE {nome}')
+    cursor.execute(f'ALTER TABLE {temporaria} RENAME TO {nome}')
+    for indice in tabela.indexes:
+        cursor.execute(str(CreateIndex(indice, if_not_exists=True).compile(dialect=dialeto)))
+
+
+@migracao(5, 'exclusão em cascata e exclusão lógica de usuários')
+def _exclusao_em_cascata(cursor, metadata, dialeto):
+    colunas = {linha[1] for linha in cursor.execute('PRAGMA table_info(usuario)')}
+    if 'excluido_em' not in colunas:
+        cursor.execute('ALTER TABLE usuario ADD COLUMN excluido_em DATETIME')
+    # Índice parcial com só os usuários à espera do expurgo: fica vazio no dia a dia
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_usuario_excluido ON usuario (id) WHERE excluido_em IS NOT NULL')
+    for nome in TABELAS_DO_USUARIO:
+        # Colunas de PRAGMA foreign_key_list: id, seq, table, from, to, on_update, on_delete, match
+        chaves = cursor.execute(f'PRAGMA foreign_key_list({nome})').fetchall()
+        if chaves and all(chave[6] == 'CASCADE' for chave in chaves):
+            continue
+        _recriar_tabela(cursor, metadata, dialeto, nome)
+
+
+@migracao(6, 'resumo mensal do histórico arquivado')
+def _agregado_mensal(cursor, metadata, dialeto):
+    _criar_tabelas(cursor, metadata, dialeto, ['agregado_mensal'])
+
+
+@migracao(7, 'busca textual nos feedbacks')
+def _busca_feedbacks(cursor, metadata, dialeto):
+    # Índice FTS5 de conteúdo externo: guarda só os termos, o texto continua em
+    # feedback. remove_diacritics faz "acao" achar "ação" e o prefix
+    # acelera as buscas por prefixo de 2 e 3 letras. Os gatilhos somem se a
+    # tabela feedback for recriada (ver _recriar_tabela): uma migração que a
+    # recrie precisa recriá-los e reconstruir o índice.
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS feedback_fts USING fts5(
+            text, content='feedback', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS feedback_fts_insercao AFTER INSERT ON feedback BEGIN
+            INSERT INTO feedback_fts (rowid, text) VALUES (new.id, new.text);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS feedback_fts_exclusao AFTER DELETE ON feedback BEGIN
+            INSERT INTO feedback_fts (feedback_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS feedback_fts_alteracao AFTER UPDATE OF text ON feedback BEGIN
+            INSERT INTO feedback_fts (feedback_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            INSERT INTO feedback_fts (rowid, text) VALUES (new.id, new.text);
+        END
+    ''')
+    cursor.execute("INSERT INTO feedback_fts (feedback_fts) VALUES ('rebuild')")
+
+
+def _garantir_tabela_controle(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migracao (
+            versao INTEGER PRIMARY KEY,
+            nome VARCHAR(200) NOT NULL,
+            aplicada_em DATETIME NOT NULL
+        )
+    ''')
+
+
+def versoes_aplicadas(cursor):
+    _garantir_tabela_controle(cursor)
+    return {linha[0] for linha in cursor.execute('SELECT versao FROM schema_migracao')}
+
+
+def aplicar(engine, metadata):
+    """Aplica as migrações pendentes e retorna as versões aplicadas agora."""
+    conexao = engine.raw_connection()
+    try:
+        driver = conexao.driver_connection
+        nivel_anterior = driver.isolation_level
+        # Controle manual da transação: BEGIN IMMEDIATE trava a escrita antes de
+        # ler as versões, então dois workers nunca aplicam a mesma migração.
+        driver.isolation_level = None
+        cursor = driver.cursor()
+        aplicadas_agora = []
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            aplicadas = versoes_aplicadas(cursor)
+            for versao, nome, funcao in MIGRACOES:
+                if versao in aplicadas:
+                    continue
+                funcao(cursor, metadata, engine.dialect)
+                cursor.execute('INSERT INTO schema_migracao (versao, nome, aplicada_em) VALUES (?, ?, ?)',
+                               (versao, nome, datetime.utcnow().isoformat(sep=' ')))
+                aplicadas_agora.append(versao)
+                logger.info(f"Migração {versao} aplicada: {nome}")
+            cursor.execute('COMMIT')
+        except Exception:
+            if driver.in_transaction:
+                cursor.execute('ROLLBACK')
+            raise
+        finally:
+            cursor.close()
+            driver.isolation_level = nivel_anterior
+    finally:
+        conexao.close()
+    return aplicadas_agora
@@ -0,0 +1,154 @@
+"""Modelos do banco (Flask-SQLAlchemy).
+
+O `db` não é ligado a nenhum app aqui: o `create_app` do app.py chama
+`db.init_app`. O esquema não é criado na importação; ele vem das migrações
+(migracoes.py), aplicadas por `flask --app app migrar` ou pelo gunicorn.conf.py.
+"""
+from datetime import datetime
+
+from flask_sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+
+
+class Usuario(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(100), nullable=False)
+    email = db.Column(db.String(100), unique=True, nullable=False)
+    data_cadastro = db.Column(db.DateTime, default=datetime.utcnow)
+    # Exclusão lógica: marcado na exclusão em massa, apagado depois pelo expurgo
+    excluido_em = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<Usuario {self.nome}>'
+
+
+class Auth(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id', ondelete='CASCADE'), nullable=False)
+    username = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
+    usuario = db.relationship('Usuario', backref=db.backref('auth', uselist=False, passive_deletes=True))
+
+
+class PegadaCarbono(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id', ondelete='CASCADE'))
+    transporte = db.Column(db.Float, nullable=False)
+    energia = db.Column(db.Float, nullable=False)
+    alimentacao = db.Column(db.Integer, nullable=False)
+    lixo = db.Column(db.Integer, nullable=False)
+    total_co2 = db.Column(db.Float, nullable=False)
+    data_calculo = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<PegadaCarbono {self.total_co2} kg CO2>'
+
+
+class ResultadoQuiz(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id', ondelete='CASCADE'))
+    pontuacao = db.Column(db.Integer, nullable=False)
+    total_perguntas = db.Column(db.Integer, nullable=False)
+    data_realizacao = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ResultadoQuiz {self.pontuacao}/{self.total_perguntas}>'
+
+
+class Feedback(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id', ondelete='CASCADE'))
+    rating = db.Column(db.Integer, nullable=False)  # 1-5
+    text = db.Column(db.Text)
+    quiz_score = db.Column(db.Integer)
+    quiz_total = db.Column(db.Integer)
+    data_feedback = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Feedback {self.rating}/5 - {self.data_feedback}>'
+
+
+# Índices das consultas "mais recente por usuário" (ver migracoes.py)
+db.Index('ix_pegada_carbono_usuario_data', PegadaCarbono.usuario_id,
+         PegadaCarbono.data_calculo.desc(), PegadaCarbono.id.desc())
+db.Index('ix_resultado_quiz_usuario_data', ResultadoQuiz.usuario_id,
+         ResultadoQuiz.data_realizacao.desc(), ResultadoQuiz.id.desc())
+db.Index('ix_feedback_usuario_data', Feedback.usuario_id,
+         Feedback.data_feedback.desc(), Feedback.id.desc())
+db.Index('ux_feedback_usuario_id', Feedback.usuario_id, unique=True)
+db.Index('ix_auth_usuario_id', Auth.usuario_id)
+
+
+class FatorEmissao(db.Model):
+    """Fatores de emissão (kg CO2 por unidade); cada alteração cria uma nova versão."""
+    versao = db.Column(db.Integer, primary_key=True)
+    transporte = db.Column(db.Float, nullable=False)
+    energia = db.Column(db.Float, nullable=False)
+    alimentacao = db.Column(db.Float, nullable=False)
+    lixo = db.Column(db.Float, nullable=False)
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<FatorEmissao v{self.versao}>'
+
+
+class EstatisticaDiaria(db.Model):
+    """Agregado diário de uma métrica (ex.: 'pegada.total_co2'), mantido a cada gravação."""
+    dia = db.Column(db.Date, primary_key=True)
+    metrica = db.Column(db.String(40), primary_key=True)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    soma = db.Column(db.Float, nullable=False, default=0)
+    soma_quadrados = db.Column(db.Float, nullable=False, default=0)
+
+
+class HistogramaDiario(db.Model):
+    """Contagem diária por balde de histograma de uma métrica (ver estatisticas.py)."""
+    dia = db.Column(db.Date, primary_key=True)
+    metrica = db.Column(db.String(40), primary_key=True)
+    balde = db.Column(db.Integer, primary_key=True)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+
+
+class PontuacaoUsuario(db.Model):
+    """Conquistas (máscara de bits, ver gamificacao.py) e pontos de cada usuário."""
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id', ondelete='CASCADE'), primary_key=True)
+    conquistas = db.Column(db.Integer, nullable=False, default=0)
+    secoes = db.Column(db.Integer, nullable=False, default=0)
+    pontos = db.Column(db.Integer, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class DistribuicaoPontos(db.Model):
+    """Quantos usuários têm cada pontuação; a posição no ranking sai daqui.
+
+    Os pontos são somas de um conjunto fixo de conquistas, então há no máximo
+    2^5 pontuações distintas: a posição de qualquer usuário é uma soma sobre
+    uma tabela minúscula, não uma contagem sobre todos os usuários.
+    """
+    pontos = db.Column(db.Integer, primary_key=True)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+
+
+class AgregadoMensal(db.Model):
+    """Resumo mensal por usuário de uma métrica das atividades já arquivadas.
+
+    Uma métrica por tipo (METRICA_MENSAL), com os mesmos nomes da
+    EstatisticaDiaria; `usuario_id` nulo soma os envios anônimos. Preenchida
+    por `flask compactar-historico`.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id', ondelete='CASCADE'))
+    mes = db.Column(db.Date, nullable=False)
+    metrica = db.Column(db.String(40), nullable=False)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    soma = db.Column(db.Float, nullable=False, default=0)
+    soma_quadrados = db.Column(db.Float, nullable=False, default=0)
+    minimo = db.Column(db.Float)
+    maximo = db.Column(db.Float)
+
+
+db.Index('ux_agregado_mensal', AgregadoMensal.usuario_id, AgregadoMensal.mes, AgregadoMensal.metrica, unique=True)
+
+# Top-K do ranking: percorre o índice do maior para o menor e para no LIMIT
+db.Index('ix_pontuacao_usuario_ranking', PontuacaoUsuario.pontos.desc(), PontuacaoUsuario.usuario_id)
@@ -0,0 +1,95 @@
+"""Hash e verificação de senhas fora da thread da requisição.
+
+`generate_password_hash` e `check_password_hash` são caros de propósito. Aqui
+eles rodam em um pool de threads limitado (o scrypt e o pbkdf2 do hashlib
+liberam o GIL, então as threads usam núcleos de verdade). Quando todas as
+vagas do pool e da fila estão ocupadas, `PoolSaturado` é lançado na hora em
+vez de empilhar requisições, e a rota responde 503 com Retry-After.
+
+O método de hash (e o fator de trabalho) vem de SENHA_METODO; hashes gravados
+com outro método são refeitos no próximo login bem-sucedido.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturado(Exception):
+    def __init__(self, retry_after=1):
+        super().__init__('Pool de senhas saturado')
+        self.retry_after = retry_after
+
+
+def normalizar_metodo(metodo):
+    """Forma completa do método, como o Werkzeug grava no prefixo do hash."""
+    nome, *args = metodo.split(':')
+    if nome == 'scrypt':
+        n, r, p = args or (2 ** 15, 8, 1)
+        return f'scrypt:{int(n)}:{int(r)}:{int(p)}'
+    if nome == 'pbkdf2':
+        hash_nome = args[0] if args else 'sha256'
+        iteracoes = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_nome}:{iteracoes}'
+    raise ValueError(f"SENHA_METODO inválido: {metodo!r} (use scrypt ou pbkdf2)")
+
+
+class ServicoSenhas:
+    def __init__(self, metodo='scrypt', trabalhadores=2, fila=8, retry_after=1):
+        self.metodo = normalizar_metodo(metodo)
+        self.trabalhadores = trabalhadores
+        self.retry_after = retry_after
+        self.estatisticas = {'hashes': 0, 'verificacoes': 0, 'atualizados': 0, 'rejeitados': 0}
+        # Vagas = threads ocupadas + tarefas esperando na fila do executor
+        self._vagas = threading.BoundedSemaphore(trabalhadores + fila)
+        self._inicio = threading.Lock()
+        self._pid = None
+
+    def gerar(self, senha):
+        self.estatisticas['hashes'] += 1
+        return self._executar(generate_password_hash, senha, self.metodo)
+
+    def verificar(self, password_hash, senha):
+        self.estatisticas['verificacoes'] += 1
+        return self._executar(check_password_hash, password_hash, senha)
+
+    def precisa_atualizar(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.metodo
+
+    def atualizar(self, password_hash, senha):
+        """Novo hash se o atual usa outro método, ou None.
+
+        A atualização é oportunista: com o pool saturado o login segue com o
+        hash antigo e tenta de novo na próxima vez.
+        """
+        if not self.precisa_atualizar(password_hash):
+            return None
+        try:
+            novo = self.gerar(senha)
+        except PoolSaturado:
+            return None
+        self.estatisticas['atualizados'] += 1
+        return novo
+
+    def _executar(self, funcao, *args):
+        if not self._vagas.acquire(blocking=False):
+            self.estatisticas['rejeitados'] += 1
+            logger.warning("Pool de senhas saturado, requisição rejeitada")
+            raise PoolSaturado(self.retry_after)
+        try:
+            return self._executor().submit(funcao, *args).result()
+        finally:
+            self._vagas.release()
+
+    def _executor(self):
+        # Um executor por processo: threads não sobrevivem ao fork do gunicorn
+        if self._pid != os.getpid():
+            with self._inicio:
+                if self._pid != os.getpid():
+                    self._pool = ThreadPoolExecutor(self.trabalhadores, thread_name_prefix='senhas')
+                    self._pid = os.getpid()
+        return self._pool
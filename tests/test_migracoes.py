@@ -0,0 +1,57 @@
+"""Migrações aplicadas sobre um banco novo e sobre um banco da versão sem controle."""
+import sqlite3
+
+from sqlalchemy import create_engine
+
+import migracoes
+from models import db
+
+# Esquema do banco antes das migrações versionadas, como criado pelo db.create_all() antigo
+ESQUEMA_LEGADO = migracoes.ESQUEMA_V1[:5]
+
+
+def _engine(caminho):
+    return create_engine(f'sqlite:///{caminho}')
+
+
+def _indices(conexao, tabela):
+    return {linha[1] for linha in conexao.execute(f'PRAGMA index_list({tabela})')}
+
+
+def test_banco_legado_com_feedbacks_duplicados(tmp_path):
+    caminho = tmp_path / 'legado.db'
+    conexao = sqlite3.connect(caminho)
+    for comando in ESQUEMA_LEGADO:
+        conexao.execute(comando)
+    conexao.execute("INSERT INTO usuario (id, nome, email) VALUES (1, 'Ana', 'ana@exemplo.com')")
+    conexao.executemany(
+        'INSERT INTO feedback (id, usuario_id, rating, text, data_feedback) VALUES (?, 1, ?, ?, ?)',
+        [(1, 3, 'primeiro', '2024-01-01 10:00:00'), (2, 5, 'segundo', '2024-02-01 10:00:00')],
+    )
+    conexao.commit()
+    conexao.close()
+
+    aplicadas = migracoes.aplicar(_engine(caminho), db.metadata)
+
+    assert aplicadas == [versao for versao, _, _ in migracoes.MIGRACOES]
+    conexao = sqlite3.connect(caminho)
+    assert conexao.execute('SELECT id, text FROM feedback').fetchall() == [(2, 'segundo')]
+    assert 'ux_feedback_usuario_id' in _indices(conexao, 'feedback')
+    assert conexao.execute("SELECT rowid FROM feedback_fts WHERE feedback_fts MATCH 'segundo'").fetchall() == [(2,)]
+
+
+def test_banco_novo_chega_ao_esquema_dos_modelos(tmp_path):
+    migrado = _engine(tmp_path / 'migrado.db')
+    migracoes.aplicar(migrado, db.metadata)
+    assert migracoes.aplicar(migrado, db.metadata) == []
+
+    criado = _engine(tmp_path / 'criado.db')
+    db.metadata.create_all(criado)
+
+    conexao_migrado = sqlite3.connect(tmp_path / 'migrado.db')
+    conexao_criado = sqlite3.connect(tmp_path / 'criado.db')
+    for tabela in db.metadata.tables:
+        for pragma in ('table_info', 'foreign_key_list'):
+            assert (conexao_migrado.execute(f'PRAGMA {pragma}({tabela})').fetchall()
+                    == conexao_criado.execute(f'PRAGMA {pragma}({tabela})').fetchall()), (tabela, pragma)
+        assert _indices(conexao_criado, tabela) <= _indices(conexao_migrado, tabela), tabela